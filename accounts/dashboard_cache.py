@@ -0,0 +1,134 @@
+"""
+Cache for the student dashboard payload.
+
+The payload (modules, exams with their per-student status) is cached per
+student and stamped with the version counters it was built from:
+
+    accounts:dash-ver:student:{student_id}   bumped on enrollment changes and
+                                             attempt state transitions
+    accounts:dash-ver:module:{module_id}     bumped when an exam of the module
+                                             is created, edited or deleted
+
+A cached payload is used only while every version it was built from is
+still current, so invalidation is a single counter bump (see
+accounts/signals.py) and nothing has to find and delete dashboard entries.
+
+Statuses that change with the clock alone (Not Started -> Missed at
+closes_at) are handled by ``valid_until``: the earliest such moment is
+computed when the payload is built and the payload is rebuilt once it has
+passed.
+"""
+import time
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from exams.models import Exam, StudentExamAttempt
+
+DASHBOARD_KEY = 'accounts:dashboard:{student_id}'
+STUDENT_VERSION_KEY = 'accounts:dash-ver:student:{student_id}'
+MODULE_VERSION_KEY = 'accounts:dash-ver:module:{module_id}'
+
+DASHBOARD_TIMEOUT = 60 * 60
+# versions must outlive the payloads stamped with them
+VERSION_TIMEOUT = 7 * 24 * 60 * 60
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # start from the clock so a version recreated after eviction never
+        # matches a payload stamped with an older one
+        cache.set(key, time.time_ns(), VERSION_TIMEOUT)
+
+
+def bump_student(student_id):
+    _bump(STUDENT_VERSION_KEY.format(student_id=student_id))
+
+
+def bump_students(student_ids):
+    for student_id in set(student_ids):
+        bump_student(student_id)
+
+
+def bump_module(module_id):
+    _bump(MODULE_VERSION_KEY.format(module_id=module_id))
+
+
+def _versions(student_id, module_ids):
+    """Current {version key: value} for the student and modules, creating missing ones."""
+    keys = [STUDENT_VERSION_KEY.format(student_id=student_id)]
+    keys += [MODULE_VERSION_KEY.format(module_id=m) for m in module_ids]
+    found = cache.get_many(keys)
+    missing = {k: time.time_ns() for k in keys if k not in found}
+    if missing:
+        cache.set_many(missing, VERSION_TIMEOUT)
+        found.update(missing)
+    return found
+
+
+def build_dashboard(student, modules):
+    """Compute the dashboard payload for the student's `modules` from the database."""
+    now = timezone.now()
+
+    # Active exams across student's modules
+    exams = list(Exam.objects
+                 .filter(module__in=modules, is_active=True)
+                 .select_related('module')
+                 .order_by('module__code', 'title'))
+
+    # Fetch attempts (both completed and not); pre-provisioned ones that were
+    # never started count as no attempt
+    attempt_map = {
+        a['exam_id']: a
+        for a in (StudentExamAttempt.objects
+                  .started()
+                  .filter(student=student, exam__in=[e.id for e in exams])
+                  .values('exam_id', 'id', 'completed'))
+    }
+
+    # Attach status + attempt_id to each exam
+    valid_until = None
+    for e in exams:
+        att = attempt_map.get(e.id)
+        if att:
+            e.status = 'Completed' if att['completed'] else 'In Progress'
+            e.attempt_id = att['id']
+        else:
+            if e.closes_at and now > e.closes_at:
+                e.status = 'Missed'
+            else:
+                e.status = 'Not Started'
+                if e.closes_at and (valid_until is None or e.closes_at < valid_until):
+                    valid_until = e.closes_at
+            e.attempt_id = None
+
+    return {
+        'modules': modules,
+        'exams': exams,
+        'valid_until': valid_until,
+    }
+
+
+def get_dashboard(student):
+    """Cached dashboard payload for the student (rebuilt when stale)."""
+    key = DASHBOARD_KEY.format(student_id=student.pk)
+    cached = cache.get(key)
+    if cached is not None:
+        current = _versions(student.pk, cached['module_ids'])
+        expired = cached['valid_until'] and timezone.now() > cached['valid_until']
+        if current == cached['versions'] and not expired:
+            return cached
+
+    # versions are read before the data they cover: a bump that races the
+    # build leaves this entry stamped with the older version, so the next
+    # load rebuilds it
+    student_version = _versions(student.pk, [])
+    modules = list(student.modules.all().order_by('code', 'name'))
+    module_ids = [m.pk for m in modules]
+    versions = {**_versions(student.pk, module_ids), **student_version}
+    payload = build_dashboard(student, modules)
+    payload.update(module_ids=module_ids, versions=versions)
+    cache.set(key, payload, DASHBOARD_TIMEOUT)
+    return payload
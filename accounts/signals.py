@@ -0,0 +1,41 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from exams.models import Exam, StudentExamAttempt
+from . import dashboard_cache
+from .models import CustomUser
+
+
+@receiver(pre_save, sender=Exam)
+def remember_exam_module(sender, instance, **kwargs):
+    # an exam moved to another module must disappear from the old module's dashboards
+    instance._previous_module_id = (Exam.objects
+                                    .filter(pk=instance.pk)
+                                    .values_list('module_id', flat=True)
+                                    .first() if instance.pk else None)
+
+
+@receiver([post_save, post_delete], sender=Exam)
+def bump_exam_module(sender, instance, **kwargs):
+    dashboard_cache.bump_module(instance.module_id)
+    previous = getattr(instance, '_previous_module_id', None)
+    if previous and previous != instance.module_id:
+        dashboard_cache.bump_module(previous)
+
+
+@receiver(m2m_changed, sender=CustomUser.modules.through)
+def bump_enrollment(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        # user.modules.add/remove/clear(...)
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            dashboard_cache.bump_student(instance.pk)
+    elif action in ('post_add', 'post_remove'):
+        # module.students.add/remove(...)
+        dashboard_cache.bump_students(pk_set)
+    elif action == 'pre_clear':
+        dashboard_cache.bump_students(instance.students.values_list('pk', flat=True))
+
+
+@receiver([post_save, post_delete], sender=StudentExamAttempt)
+def bump_attempt_student(sender, instance, **kwargs):
+    dashboard_cache.bump_student(instance.student_id)
@@ -0,0 +1,76 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import Module
+from exams.models import Exam, StudentExamAttempt
+
+User = get_user_model()
+
+
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.module = Module.objects.create(code="CS101", name="Intro to CS")
+        self.student = User.objects.create_user(
+            username="CSSS251001",
+            email="csss251001@csss.com",
+            password="Stu1234!",
+            role="student",
+        )
+        self.student.modules.add(self.module)
+        now = timezone.now()
+        self.exam = Exam.objects.create(
+            title="Sample Exam",
+            module=self.module,
+            opens_at=now - timedelta(hours=1),
+            closes_at=now + timedelta(hours=1),
+        )
+        self.client.login(username="CSSS251001", password="Stu1234!")
+        self.url = reverse("student_dashboard")
+
+    def statuses(self):
+        return {e.title: e.status for e in self.client.get(self.url).context["exams"]}
+
+    def test_second_load_is_served_from_cache(self):
+        self.assertEqual(self.statuses(), {"Sample Exam": "Not Started"})
+        # session + user only
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+
+    def test_changes_invalidate_the_cached_dashboard(self):
+        self.statuses()
+
+        other = Module.objects.create(code="CS102", name="Data Structures")
+        Exam.objects.create(title="Second Exam", module=other)
+        other.students.add(self.student)
+        self.assertIn("Second Exam", self.statuses())
+
+        self.exam.title = "Renamed Exam"
+        self.exam.save()
+        self.assertIn("Renamed Exam", self.statuses())
+
+        # a pre-provisioned attempt is stamped with a bare UPDATE when started
+        StudentExamAttempt.objects.create(student=self.student, exam=self.exam)
+        self.assertEqual(self.statuses()["Renamed Exam"], "Not Started")
+        self.client.post(reverse("take_exam_start", args=[self.exam.id]))
+        self.assertEqual(self.statuses()["Renamed Exam"], "In Progress")
+
+        self.client.post(reverse("submit_exam", args=[self.exam.id]))
+        self.assertEqual(self.statuses()["Renamed Exam"], "Completed")
+
+        self.student.modules.remove(other)
+        self.assertNotIn("Second Exam", self.statuses())
+
+    def test_not_started_becomes_missed_when_exam_closes(self):
+        self.statuses()
+        # moved without signals, as if the payload had just been cached before closing time
+        Exam.objects.filter(pk=self.exam.pk).update(closes_at=timezone.now() - timedelta(minutes=1))
+        payload = cache.get(f"accounts:dashboard:{self.student.pk}")
+        payload["valid_until"] = timezone.now() - timedelta(seconds=1)
+        cache.set(f"accounts:dashboard:{self.student.pk}", payload)
+        self.assertEqual(self.statuses(), {"Sample Exam": "Missed"})
@@ -2,8 +2,9 @@ from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect
 from .forms import RegistrationForm, LoginForm
+from . import dashboard_cache
 from django.utils import timezone
-from exams.models import Exam, StudentExamAttempt
+from exams.models import Exam
 
 
 def register_view(request):
@@ -41,43 +42,12 @@ def student_dashboard(request):
     if getattr(request.user, 'role', None) != 'student':
         return redirect('login')
 
-    student = request.user
-    modules = student.modules.all().order_by('code', 'name')
-
-    # Active exams across student's modules
-    exams_qs = (Exam.objects
-                .filter(module__in=modules, is_active=True)
-                .select_related('module')
-                .order_by('module__code', 'title'))
-
-    # Fetch attempts (both completed and not)
-    attempts = (StudentExamAttempt.objects
-                .filter(student=student, exam__in=exams_qs)
-                .values('exam_id', 'id', 'completed'))
-    attempt_map = {a['exam_id']: a for a in attempts}
-
-    # Attach status + attempt_id to each exam
-    exams = []
-    for e in exams_qs:
-        att = attempt_map.get(e.id)
-        if att:
-            if att['completed']:
-                e.status = 'Completed'
-                e.attempt_id = att['id']
-            else:
-                e.status = 'In Progress'
-                e.attempt_id = att['id']
-        else:
-            if not e.is_open_now() and e.closes_at and timezone.now() > e.closes_at:
-                e.status = 'Missed'
-            else:
-                e.status = 'Not Started'
-            e.attempt_id = None
-        exams.append(e)
+    # modules, exams and per-exam status are cached; see accounts/dashboard_cache.py
+    dashboard = dashboard_cache.get_dashboard(request.user)
 
     return render(request, 'accounts/student_dashboard.html', {
-        'modules': modules,
-        'exams': exams,
+        'modules': dashboard['modules'],
+        'exams': dashboard['exams'],
         'now': timezone.now(),
     })
 
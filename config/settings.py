@@ -31,6 +31,8 @@ INSTALLED_APPS = [
 
 # --- Middleware ---
 MIDDLEWARE = [
+    # first, so its timings and query counts cover the other middleware too
+    'exams.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -45,7 +47,8 @@ ROOT_URLCONF = 'config.urls'
 # --- Templates ---
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that also reports render time to exams.metrics
+        'BACKEND': 'exams.metrics.InstrumentedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -74,10 +77,68 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'password123'),
         'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
         'PORT': os.getenv('POSTGRES_PORT', '5432'),
-        'CONN_MAX_AGE': 60,  # keep connections open for reuse
+        # keep connections open for reuse; set DB_CONN_MAX_AGE=0 under ASGI, where
+        # every request runs in a fresh thread and persistent connections pile up
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
     }
 }
 
+# --- Cache ---
+# Exam-taking state is cached per attempt (see exams/attempt_cache.py).
+# Point REDIS_URL at a shared Redis when running more than one worker.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# --- Exam answer writes (see exams/answer_store.py) ---
+# 'through' writes every answer immediately; 'behind' buffers answers per
+# attempt in the cache and flushes them in bulk (needs a shared, persistent
+# cache such as Redis).
+EXAM_ANSWER_WRITE_MODE = os.getenv('EXAM_ANSWER_WRITE_MODE', 'through')
+EXAM_ANSWER_FLUSH_SECONDS = int(os.getenv('EXAM_ANSWER_FLUSH_SECONDS', '30'))
+# 'rows' keeps one StudentAnswer row per answer; 'packed' keeps all of an
+# attempt's answers in one column of the attempt (see exams/packed_answers.py).
+# Applies to attempts that start after the switch.
+EXAM_ANSWER_STORAGE = os.getenv('EXAM_ANSWER_STORAGE', 'rows')
+
+# --- Async exam-taking views (see exams/views_async.py) ---
+# Serve the student exam pages with async views; only worth it under an ASGI
+# server (see "ASGI Deployment" in the README).
+EXAM_ASYNC_VIEWS = os.getenv('EXAM_ASYNC_VIEWS', '0') == '1'
+# How often exam pages re-sync their countdown with the server clock; with
+# async views on they get a server-sent event stream at this interval instead
+# of polling (see exams/clock.py).
+EXAM_CLOCK_SECONDS = int(os.getenv('EXAM_CLOCK_SECONDS', '30'))
+
+# --- Cold storage (see exams/archive.py) ---
+# Where ``manage.py archive_exams`` writes exam bundles; staff result pages of
+# archived exams read them back from here.
+EXAM_ARCHIVE_DIR = os.getenv('EXAM_ARCHIVE_DIR', str(BASE_DIR / 'archive'))
+
+# --- Question order per attempt (see exams/papers.py) ---
+# 'stored' saves each attempt's shuffled question list; 'seeded' saves only a
+# seed and derives question and MCQ option order from it deterministically.
+EXAM_QUESTION_ORDER_MODE = os.getenv('EXAM_QUESTION_ORDER_MODE', 'stored')
+
+# --- Request metrics (see exams/metrics.py) ---
+# Share of requests whose latency, query count, DB time and template time are
+# recorded (0 turns the middleware off entirely). Workers publish their
+# histograms to the cache every METRICS_PUBLISH_SECONDS; METRICS_TOKEN, when
+# set, lets a scraper read /staff/metrics/ with "Authorization: Bearer <token>".
+METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', '0'))
+METRICS_PUBLISH_SECONDS = int(os.getenv('METRICS_PUBLISH_SECONDS', '10'))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
 # --- Password validation ---
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
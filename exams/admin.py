@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Exam, ExamQuestion, StudentExamAttempt, StudentAnswer
+from django.utils.html import format_html_join
+from django.utils.safestring import mark_safe
+from . import packed_answers
+from .models import ArchivedExam, Exam, ExamPaper, ExamQuestion, ExamStats, StudentExamAttempt, StudentAnswer
 
 class ExamQuestionInline(admin.TabularInline):  # or StackedInline
     model = ExamQuestion
@@ -18,10 +21,42 @@ class ExamQuestionAdmin(admin.ModelAdmin):
     list_display = ('exam', 'question')
     list_filter = ('exam',)
 
+@admin.register(ExamPaper)
+class ExamPaperAdmin(admin.ModelAdmin):
+    list_display = ('exam', 'version', 'created_at')
+    list_filter = ('exam',)
+    readonly_fields = ('exam', 'version', 'checksum', 'content', 'created_at')
+
+@admin.register(ExamStats)
+class ExamStatsAdmin(admin.ModelAdmin):
+    list_display = ('exam', 'attempts_total', 'attempts_completed', 'avg_score', 'updated_at')
+    readonly_fields = ('exam', 'attempts_total', 'attempts_completed', 'score_sum', 'score_sq_sum', 'updated_at')
+
+@admin.register(ArchivedExam)
+class ArchivedExamAdmin(admin.ModelAdmin):
+    list_display = ('title', 'module', 'closes_at', 'attempts_total', 'archived_at')
+    list_filter = ('module',)
+    readonly_fields = ('exam_id', 'module', 'title', 'opens_at', 'closes_at', 'attempts_total',
+                       'attempts_completed', 'avg_score', 'answers', 'path', 'sha256', 'archived_at')
+
 @admin.register(StudentExamAttempt)
 class StudentExamAttemptAdmin(admin.ModelAdmin):
     list_display = ('student', 'exam', 'started_at', 'completed', 'score')
     list_filter = ('exam', 'completed')
+    exclude = ('packed_answers',)
+    readonly_fields = ('answers',)
+
+    @admin.display(description='Packed answers')
+    def answers(self, obj):
+        # per-answer view of EXAM_ANSWER_STORAGE='packed' attempts; row-stored
+        # answers are listed under Student answers
+        if obj.packed_answers is None:
+            return '-'
+        return format_html_join(
+            mark_safe('<br>'), 'Q{}: {} ({})',
+            ((a.question_id, a.selected_answer, 'correct' if a.is_correct else 'wrong')
+             for a in packed_answers.attempt_answers(obj)),
+        )
 
 @admin.register(StudentAnswer)
 class StudentAnswerAdmin(admin.ModelAdmin):
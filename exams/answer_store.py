@@ -0,0 +1,253 @@
+"""
+Answer writes for the exam-taking path.
+
+Every answer save goes through ``save_answers`` so that a page POST (one
+answer) and a single-page sync (a batch of answers) cost the same: one
+INSERT ... ON CONFLICT (exam, attempt, question) DO UPDATE, relying on the
+uniq_exam_attempt_answer constraint. Unchanged answers are filtered out against
+the cached attempt state (exams/attempt_cache.py), so no SELECT is needed
+first and concurrent saves of the same question cannot create duplicates.
+
+settings.EXAM_ANSWER_WRITE_MODE picks how answers reach the database:
+
+    'through'  written immediately (default)
+    'behind'   graded and buffered per attempt in the cache, then flushed in
+               bulk when the buffer is older than EXAM_ANSWER_FLUSH_SECONDS,
+               synchronously on submit, and by ``manage.py flush_answer_buffers``
+               (run it from cron, and after a crash or restart, to recover
+               buffers that never reached the database)
+
+Both modes keep the per-question counters (ExamQuestionStats) in step: the
+deltas are applied with the write, or carried in the buffer until its flush.
+
+Write-behind is only as durable as the cache: use a shared, persistent
+backend such as Redis (REDIS_URL) when enabling it. Run
+flush_answer_buffers before switching back to write-through.
+
+Attempts stored packed (EXAM_ANSWER_STORAGE='packed', see
+exams/packed_answers.py) are always written through: each save rewrites
+the attempt's one packed value with a single-row UPDATE.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from . import attempt_cache, packed_answers, papers, stats
+from .models import StudentAnswer, StudentExamAttempt
+
+MAX_ANSWER_LENGTH = StudentAnswer._meta.get_field('selected_answer').max_length
+
+BUFFER_KEY = 'exams:answer-buffer:{attempt_id}'
+# a buffer taken out for writing; it stays until the write has succeeded
+FLUSHING_KEY = 'exams:answer-buffer-flushing:{attempt_id}'
+# held while a buffer is changed or taken out: saves never race a flush's delete
+BUFFER_LOCK_KEY = 'exams:answer-buffer-edit:{attempt_id}'
+# held for a whole flush: flushes of one attempt run one at a time, oldest first
+FLUSH_LOCK_KEY = 'exams:answer-buffer-lock:{attempt_id}'
+# buffers must outlive any exam sitting; flush_answer_buffers drains them well before
+BUFFER_TIMEOUT = 24 * 60 * 60
+BUFFER_LOCK_TIMEOUT = 5
+FLUSH_LOCK_TIMEOUT = 30
+
+
+def write_mode():
+    return getattr(settings, 'EXAM_ANSWER_WRITE_MODE', 'through')
+
+
+def clean_answer(value):
+    return str(value if value is not None else '').strip()[:MAX_ANSWER_LENGTH]
+
+
+def save_answers(state, paper, submitted):
+    """Save {question_id: selected_answer} for the attempt in `state`.
+
+    MCQ letters arrive as displayed; with a seeded option order they are
+    mapped back to the paper's own letters before grading and storing.
+    Unchanged answers are skipped. Updates the cached state and returns the
+    number of answers saved (written or buffered).
+    """
+    existing = state['answers']
+    order_seed = state.get('order_seed')
+    changes = {}
+    deltas = {}
+    for question_id, selected in submitted.items():
+        selected = clean_answer(selected)
+        question = None
+        if order_seed is not None:
+            question = papers.paper_question(paper, question_id)
+            if question['question_type'] == 'MCQ':
+                selected = papers.to_canonical_option(order_seed, question_id, selected)
+        if question_id in existing and existing[question_id] == selected:
+            continue
+        question = question or papers.paper_question(paper, question_id)
+        is_correct = papers.normalize_answer(selected) == question['key']
+        changes[question_id] = (selected, is_correct)
+        deltas[question_id] = stats.answer_deltas(question, existing.get(question_id), selected, is_correct)
+    if not changes:
+        return 0
+
+    for question_id, (selected, _) in changes.items():
+        existing[question_id] = selected
+
+    if state.get('packed'):
+        _write_packed(state['attempt_id'], paper or papers.get_paper(state['paper_id']), existing)
+        stats.apply_answer_deltas(state['exam_id'], deltas)
+    elif write_mode() == 'behind':
+        _buffer_answers(state['attempt_id'], state['exam_id'], changes, deltas)
+    else:
+        _write_answers(state['attempt_id'], state['exam_id'], changes)
+        stats.apply_answer_deltas(state['exam_id'], deltas)
+    attempt_cache.save_attempt_state(state)
+    return len(changes)
+
+
+def _write_answers(attempt_id, exam_id, changes):
+    """Upsert {question_id: (selected, is_correct)} in one statement."""
+    StudentAnswer.objects.bulk_create(
+        [StudentAnswer(attempt_id=attempt_id, exam_id=exam_id, question_id=qid, selected_answer=sel,
+                       is_correct=ok)
+         for qid, (sel, ok) in changes.items()],
+        update_conflicts=True,
+        unique_fields=['exam', 'attempt', 'question'],
+        update_fields=['selected_answer', 'is_correct'],
+    )
+
+
+def _write_packed(attempt_id, paper, answers):
+    """Store every answer of a packed attempt ({question_id: selected}) in one UPDATE."""
+    StudentExamAttempt.objects.filter(pk=attempt_id).update(
+        packed_answers=packed_answers.pack(paper, answers))
+
+
+# ---------- write-behind buffer ----------
+#
+# A save merges its answers into the attempt's live buffer under a short
+# per-attempt lock. A flush takes the same lock only to move the live
+# buffer into the attempt's flushing slot, then writes that slot to the
+# database and deletes it. An answer saved meanwhile starts a new live
+# buffer, so no delete can drop it, and a failed write leaves the slot
+# for the next flush (which merges newer answers over it).
+
+def buffer_key(attempt_id):
+    return BUFFER_KEY.format(attempt_id=attempt_id)
+
+
+def flushing_key(attempt_id):
+    return FLUSHING_KEY.format(attempt_id=attempt_id)
+
+
+def _acquire_lock(lock, wait, timeout):
+    # waiting for longer than the lock lives means a crashed holder cannot block us
+    deadline = time.monotonic() + 2 * timeout
+    while not cache.add(lock, 1, timeout):
+        if not wait or time.monotonic() >= deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def _merge_buffer(into, buf):
+    into['answers'].update(buf['answers'])
+    into['exam_id'] = buf['exam_id']
+    stats.merge_deltas(into.setdefault('deltas', {}), buf.get('deltas') or {})
+    return into
+
+
+def _buffer_answers(attempt_id, exam_id, changes, deltas):
+    key = buffer_key(attempt_id)
+    lock = BUFFER_LOCK_KEY.format(attempt_id=attempt_id)
+    if not _acquire_lock(lock, True, BUFFER_LOCK_TIMEOUT):
+        raise TimeoutError(f"Answer buffer of attempt {attempt_id} stayed locked; answers not saved.")
+    try:
+        buf = cache.get(key) or {'since': time.time(), 'answers': {}, 'deltas': {}}
+        _merge_buffer(buf, {'answers': changes, 'exam_id': exam_id, 'deltas': deltas})
+        cache.set(key, buf, BUFFER_TIMEOUT)
+    finally:
+        cache.delete(lock)
+
+    interval = getattr(settings, 'EXAM_ANSWER_FLUSH_SECONDS', 30)
+    if time.time() - buf['since'] >= interval:
+        flush_attempt(attempt_id)
+
+
+def _take_buffer(attempt_id):
+    """Move the live buffer into the flushing slot; returns what is to be written, or None."""
+    key, slot = buffer_key(attempt_id), flushing_key(attempt_id)
+    lock = BUFFER_LOCK_KEY.format(attempt_id=attempt_id)
+    if not _acquire_lock(lock, True, BUFFER_LOCK_TIMEOUT):
+        return None
+    try:
+        found = cache.get_many([slot, key])
+        live, pending = found.get(key), found.get(slot)
+        if live is None:
+            return pending
+        # a slot left by a failed flush is older: newer answers win
+        pending = _merge_buffer(pending, live) if pending is not None else live
+        cache.set(slot, pending, BUFFER_TIMEOUT)
+        cache.delete(key)
+        return pending
+    finally:
+        cache.delete(lock)
+
+
+def pending_answers(attempt_id):
+    """{question_id: selected_answer} buffered for an attempt and not yet in the database."""
+    found = cache.get_many([flushing_key(attempt_id), buffer_key(attempt_id)])
+    answers = {}
+    for key in (flushing_key(attempt_id), buffer_key(attempt_id)):
+        if key in found:
+            answers.update({qid: selected for qid, (selected, _) in found[key]['answers'].items()})
+    return answers
+
+
+def discard_buffers(attempt_ids):
+    """Drop the buffers of attempts that are being deleted, unwritten."""
+    cache.delete_many([key for attempt_id in attempt_ids
+                       for key in (buffer_key(attempt_id), flushing_key(attempt_id))])
+
+
+def flush_attempt(attempt_id, wait=False):
+    """Write an attempt's buffered answers to the database. Returns the number flushed.
+
+    With wait=True (used on submit) a flush already running elsewhere is
+    waited for instead of skipped, so the caller sees every answer.
+    """
+    return flush_buffers([attempt_id], wait=wait)
+
+
+def flush_buffers(attempt_ids, wait=False):
+    """Flush buffered answers for the given attempts (one cache round trip to find them)."""
+    attempt_ids = list(dict.fromkeys(attempt_ids))
+    keys = {}
+    for attempt_id in attempt_ids:
+        keys[buffer_key(attempt_id)] = keys[flushing_key(attempt_id)] = attempt_id
+    buffered = {keys[key] for key in cache.get_many(list(keys))}
+    flushed = 0
+    for attempt_id in attempt_ids:
+        if attempt_id not in buffered:
+            continue
+        lock = FLUSH_LOCK_KEY.format(attempt_id=attempt_id)
+        if not _acquire_lock(lock, wait, FLUSH_LOCK_TIMEOUT):
+            continue  # another worker is flushing this attempt
+        try:
+            buf = _take_buffer(attempt_id)
+            if buf is None:
+                continue  # the flush we waited for drained it
+            try:
+                with transaction.atomic():
+                    _write_answers(attempt_id, buf['exam_id'], buf['answers'])
+            except IntegrityError:
+                if StudentExamAttempt.objects.filter(pk=attempt_id).exists():
+                    raise
+                # purged while answers were still being saved: nothing to write them to
+                discard_buffers([attempt_id])
+                continue
+            if buf.get('deltas'):
+                stats.apply_answer_deltas(buf['exam_id'], buf['deltas'])
+            cache.delete(flushing_key(attempt_id))
+            flushed += len(buf['answers'])
+        finally:
+            cache.delete(lock)
+    return flushed
@@ -0,0 +1,229 @@
+"""
+Cold storage for closed exams.
+
+``archive_exam`` writes one exam with its questions, attempts and answers
+to a gzip-compressed JSON Lines bundle, checks that the file reads back
+complete, records an ArchivedExam row, and only then deletes the live rows:
+attempts and answers through the batched purge (exams/purge.py), then the
+exam itself, which takes its question links, papers and stats with it.
+
+A bundle holds one JSON object per line, in this order:
+
+    {"kind": "exam", "format": 1, "id": 7, "title": ..., "module_code": ..., ...}
+    {"kind": "question", "id": 4, "question_text": ..., "correct_answer": ...}
+    {"kind": "attempt", "id": 12, "username": ..., "score": "75.00", ...}
+    {"kind": "answer", "attempt_id": 12, "question_id": 4, "selected_answer": "b", "is_correct": true}
+
+Bundles are read back on demand so staff can still open an archived exam's
+results (``archived_results``); the parsed attempt list is cached.
+"""
+import gzip
+import hashlib
+import json
+import os
+import time
+from collections import Counter, namedtuple
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from questions.models import Question
+from . import packed_answers, papers, purge, stats
+from .models import ArchivedExam, Exam, StudentAnswer, StudentExamAttempt
+
+FORMAT = 1
+CHUNK_SIZE = 2000
+RESULTS_KEY = 'exams:archive-results:{exam_id}'
+RESULTS_TIMEOUT = 60 * 60
+
+ArchiveReport = namedtuple('ArchiveReport', ['archived', 'attempts', 'answers', 'bytes', 'seconds'])
+
+
+def archive_dir():
+    return Path(getattr(settings, 'EXAM_ARCHIVE_DIR', None) or Path(settings.BASE_DIR) / 'archive')
+
+
+def archivable_exams(before):
+    """Exams that closed before `before` (never later than now)."""
+    return Exam.objects.filter(closes_at__lt=min(before, timezone.now()))
+
+
+def bundle_path(exam_id, directory):
+    return Path(directory) / f'exam-{exam_id}.jsonl.gz'
+
+
+def _records(exam):
+    yield {
+        'kind': 'exam', 'format': FORMAT, 'id': exam.pk, 'title': exam.title,
+        'description': exam.description, 'module_id': exam.module_id, 'module_code': exam.module.code,
+        'created_at': exam.created_at, 'opens_at': exam.opens_at, 'closes_at': exam.closes_at,
+        'duration_minutes': exam.duration_minutes, 'delivery_mode': exam.delivery_mode,
+    }
+    questions = (Question.objects
+                 .filter(examquestion__exam=exam)
+                 .order_by('id')
+                 .values(*papers.QUESTION_FIELDS))
+    for row in questions:
+        yield {'kind': 'question', **row}
+
+    attempts = (StudentExamAttempt.objects
+                .filter(exam=exam)
+                .order_by('id')
+                .values('id', 'student_id', 'student__username', 'started_at', 'ends_at',
+                        'submitted_at', 'completed', 'score', 'paper_id'))
+    for row in attempts.iterator(chunk_size=CHUNK_SIZE):
+        row['username'] = row.pop('student__username')
+        yield {'kind': 'attempt', **row}
+
+    answers = (StudentAnswer.objects
+               .filter(exam=exam)
+               .order_by('attempt_id', 'question_id')
+               .values('attempt_id', 'question_id', 'selected_answer', 'is_correct'))
+    for row in answers.iterator(chunk_size=CHUNK_SIZE):
+        yield {'kind': 'answer', **row}
+    packed = (packed_answers.packed_attempts(exam.pk)
+              .order_by('id')
+              .values('id', 'paper_id', 'packed_answers'))
+    for _, a in packed_answers.iter_answers(packed.iterator(chunk_size=CHUNK_SIZE)):
+        yield {'kind': 'answer', 'attempt_id': a.attempt_id, 'question_id': a.question_id,
+               'selected_answer': a.selected_answer, 'is_correct': a.is_correct}
+
+
+def write_bundle(exam, path):
+    """Write the exam's bundle to `path` (atomically); returns ({kind: lines}, sha256)."""
+    path = Path(path)
+    partial = path.with_name(path.name + '.partial')
+    counts = Counter()
+    with open(partial, 'wb') as raw:
+        with gzip.open(raw, 'wt', encoding='utf-8') as out:
+            for record in _records(exam):
+                out.write(json.dumps(record, cls=DjangoJSONEncoder, separators=(',', ':')) + '\n')
+                counts[record['kind']] += 1
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(partial, path)
+    # make the rename itself durable before any live row is deleted
+    directory = os.open(path.parent, os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+    return counts, file_sha256(path)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_bundle(path):
+    """Yield the records of a bundle, in file order."""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def _verified_bundle(exam, archived):
+    """Counts of an earlier run's bundle, once it is known to hold every row still live."""
+    path = Path(archived.path)
+    if not path.exists() or file_sha256(path) != archived.sha256:
+        raise OSError(f'{path} is missing or changed since exam {exam.pk} was archived; nothing was deleted.')
+    counts = Counter()
+    bundled = set()
+    for record in read_bundle(path):
+        counts[record['kind']] += 1
+        if record['kind'] == 'attempt':
+            bundled.add(record['id'])
+    live = set(StudentExamAttempt.objects.filter(exam=exam).values_list('id', flat=True))
+    if not live <= bundled:
+        raise OSError(f'Exam {exam.pk} has {len(live - bundled)} attempts that are not in {path}; '
+                      f'nothing was deleted.')
+    return path, counts
+
+
+def archive_exam(exam, directory=None, batch_size=1000, pause=0.0):
+    """Move one exam to a bundle in `directory` and delete it from the live tables.
+
+    If an earlier run already archived the exam and stopped part-way
+    through the purge, its bundle is the only complete copy: it is
+    verified and the purge resumed, never rewritten from what is left.
+    """
+    started = time.monotonic()
+    archived = ArchivedExam.objects.filter(pk=exam.pk).first()
+    if archived is not None:
+        path, counts = _verified_bundle(exam, archived)
+        purge.purge_attempts(purge.scoped_attempts([exam.pk]), batch_size=batch_size, pause=pause,
+                             refresh_stats=False)
+        exam.delete()
+        cache.delete(RESULTS_KEY.format(exam_id=archived.pk))
+        return ArchiveReport(archived, counts['attempt'], counts['answer'], path.stat().st_size,
+                             time.monotonic() - started)
+
+    directory = Path(directory or archive_dir())
+    directory.mkdir(parents=True, exist_ok=True)
+    path = bundle_path(exam.pk, directory)
+
+    counts, sha256 = write_bundle(exam, path)
+    if Counter(r['kind'] for r in read_bundle(path)) != counts:
+        raise OSError(f'{path} did not read back complete; nothing was deleted.')
+
+    exam_stats = stats.get_stats([exam.pk])[exam.pk]
+    archived = ArchivedExam.objects.create(
+        exam_id=exam.pk,
+        module_id=exam.module_id, title=exam.title,
+        opens_at=exam.opens_at, closes_at=exam.closes_at,
+        attempts_total=exam_stats.attempts_total,
+        attempts_completed=exam_stats.attempts_completed,
+        avg_score=exam_stats.avg_score,
+        answers=counts['answer'], path=str(path), sha256=sha256,
+    )
+    purge.purge_attempts(purge.scoped_attempts([exam.pk]), batch_size=batch_size, pause=pause,
+                         refresh_stats=False)
+    exam.delete()
+    cache.delete(RESULTS_KEY.format(exam_id=archived.pk))
+    return ArchiveReport(archived, counts['attempt'], counts['answer'], path.stat().st_size,
+                         time.monotonic() - started)
+
+
+def _time_taken(started_at, submitted_at):
+    if not (started_at and submitted_at):
+        return None
+    h, rem = divmod(int((submitted_at - started_at).total_seconds()), 3600)
+    m, s = divmod(rem, 60)
+    return f'{h:02d}:{m:02d}:{s:02d}'
+
+
+def archived_results(archived):
+    """Attempt rows of an archived exam, newest submission first (read from its bundle, then cached)."""
+    key = RESULTS_KEY.format(exam_id=archived.pk)
+    rows = cache.get(key)
+    if rows is not None:
+        return rows
+    rows = []
+    for record in read_bundle(archived.path):
+        if record['kind'] == 'answer':
+            break  # answers come after every attempt
+        if record['kind'] != 'attempt':
+            continue
+        started_at = parse_datetime(record['started_at']) if record['started_at'] else None
+        submitted_at = parse_datetime(record['submitted_at']) if record['submitted_at'] else None
+        completed = record['completed'] and record['score'] is not None
+        rows.append({
+            'id': record['id'],
+            'username': record['username'],
+            'score': float(record['score']) if completed else None,
+            'started_at': started_at,
+            'submitted_at': submitted_at,
+            'time_taken': _time_taken(started_at, submitted_at),
+            'status': 'Completed' if record['completed'] else 'Not submitted',
+        })
+    rows.sort(key=lambda r: (r['submitted_at'] is not None, r['submitted_at'] or r['started_at']), reverse=True)
+    cache.set(key, rows, RESULTS_TIMEOUT)
+    return rows
@@ -0,0 +1,176 @@
+"""
+Cache layer for the exam-taking hot path.
+
+A student has at most one in-progress attempt per exam, so the
+(student, exam) pair is used as the attempt's cache key. The cached state
+holds everything the question pages need between clicks:
+
+    {
+        'attempt_id': 12,
+        'student_id': 5,
+        'exam_id': 7,
+        'paper_id': 3,                    # compiled paper, see exams/papers.py
+        'enrolled': True,                 # dropped when the student's modules change
+        'question_order': [4, 9, 2],     # stored, or derived from order_seed
+        'order_seed': None,               # set in 'seeded' order mode
+        'ends_at': datetime,
+        'answers': {4: 'b', 9: 'True'},   # question_id -> selected answer
+        'packed': False,                  # answers kept in attempt.packed_answers
+    }
+
+Exams are cached separately (one entry shared by every student) and are
+dropped by the signal handlers in ``exams.signals`` whenever they change.
+"""
+from django.core.cache import cache
+from django.http import Http404
+from django.utils import timezone
+
+from . import packed_answers, papers
+from .models import Exam, StudentExamAttempt, StudentAnswer
+
+EXAM_KEY = 'exams:exam:{exam_id}'
+ATTEMPT_KEY = 'exams:attempt:{student_id}:{exam_id}'
+
+EXAM_TIMEOUT = 60 * 60
+# keep attempt state a little past ends_at so the final submit still hits
+ATTEMPT_GRACE_SECONDS = 5 * 60
+ATTEMPT_DEFAULT_TIMEOUT = 2 * 60 * 60
+
+
+def exam_key(exam_id):
+    return EXAM_KEY.format(exam_id=exam_id)
+
+
+def attempt_key(student_id, exam_id):
+    return ATTEMPT_KEY.format(student_id=student_id, exam_id=exam_id)
+
+
+def get_exam(exam_id):
+    """Return the Exam (cached) or None if it does not exist."""
+    key = exam_key(exam_id)
+    exam = cache.get(key)
+    if exam is None:
+        exam = Exam.objects.filter(pk=exam_id).first()
+        if exam is None:
+            return None
+        cache.set(key, exam, EXAM_TIMEOUT)
+    return exam
+
+
+def get_active_exam_or_404(exam_id):
+    exam = get_exam(exam_id)
+    if exam is None or not exam.is_active:
+        raise Http404("No Exam matches the given query.")
+    return exam
+
+
+def invalidate_exam(exam_id):
+    cache.delete(exam_key(exam_id))
+
+
+def _attempt_timeout(ends_at):
+    if not ends_at:
+        return ATTEMPT_DEFAULT_TIMEOUT
+    remaining = int((ends_at - timezone.now()).total_seconds())
+    return max(remaining, 0) + ATTEMPT_GRACE_SECONDS
+
+
+def _question_order(attempt):
+    if attempt.question_order or attempt.order_seed is None or not attempt.paper_id:
+        return attempt.question_order or []
+    return papers.attempt_question_order(papers.get_paper(attempt.paper_id), None, attempt.order_seed)
+
+
+def _packs(attempt):
+    # positions in the packed value come from the paper
+    return bool(attempt.paper_id) and packed_answers.storage_mode() == 'packed'
+
+
+def build_attempt_state(student, exam):
+    """Load the in-progress attempt for student+exam from the database."""
+    attempt = (StudentExamAttempt.objects
+               .filter(student=student, exam=exam, completed=False)
+               .first())
+    if attempt is None:
+        return None
+
+    if attempt.packed_answers is not None:
+        paper = papers.get_paper(attempt.paper_id)
+        answers = {qid: sel for qid, (sel, _) in packed_answers.unpack(paper, attempt.packed_answers).items()}
+        packed = True
+    else:
+        answers = dict(StudentAnswer.objects
+                       .filter(attempt=attempt, exam_id=attempt.exam_id)
+                       .values_list('question_id', 'selected_answer'))
+        # write-behind answers not flushed yet are newer than the rows
+        from .answer_store import pending_answers  # answer_store imports this module
+        answers.update(pending_answers(attempt.id))
+        # an attempt with no answer rows yet can still start out packed
+        packed = not answers and _packs(attempt)
+    return {
+        'attempt_id': attempt.id,
+        'student_id': attempt.student_id,
+        'exam_id': attempt.exam_id,
+        'paper_id': attempt.paper_id,
+        'enrolled': student.modules.filter(pk=exam.module_id).exists(),
+        'question_order': _question_order(attempt),
+        'order_seed': attempt.order_seed,
+        'ends_at': attempt.ends_at,
+        'answers': answers,
+        'packed': packed,
+    }
+
+
+def prime_attempt_state(attempt):
+    """Cache the state of an attempt that was just created (no answers yet)."""
+    state = {
+        'attempt_id': attempt.id,
+        'student_id': attempt.student_id,
+        'exam_id': attempt.exam_id,
+        'paper_id': attempt.paper_id,
+        'enrolled': True,
+        'question_order': _question_order(attempt),
+        'order_seed': attempt.order_seed,
+        'ends_at': attempt.ends_at,
+        'answers': {},
+        'packed': _packs(attempt),
+    }
+    save_attempt_state(state)
+    return state
+
+
+def get_attempt_state(student, exam):
+    """Return cached state for the student's in-progress attempt, or None."""
+    key = attempt_key(student.pk, exam.pk)
+    state = cache.get(key)
+    if state is None:
+        state = build_attempt_state(student, exam)
+        if state is None:
+            return None
+        cache.set(key, state, _attempt_timeout(state['ends_at']))
+    return state
+
+
+def save_attempt_state(state):
+    cache.set(attempt_key(state['student_id'], state['exam_id']), state, _attempt_timeout(state['ends_at']))
+
+
+def invalidate_attempt(student_id, exam_id):
+    cache.delete(attempt_key(student_id, exam_id))
+
+
+def invalidate_attempts(pairs):
+    """Drop cached state for many (student_id, exam_id) pairs in one round trip."""
+    cache.delete_many([attempt_key(student_id, exam_id) for student_id, exam_id in pairs])
+
+
+def is_time_over(state):
+    ends_at = state['ends_at']
+    return bool(ends_at and timezone.now() >= ends_at)
+
+
+def remaining_seconds(state):
+    ends_at = state['ends_at']
+    if not ends_at:
+        return None
+    return max(0, int((ends_at - timezone.now()).total_seconds()))
@@ -0,0 +1,148 @@
+"""
+Server clock for the exam-taking pages.
+
+The countdown on a question page used to be seeded from the page render
+only; now the page keeps itself in step with the server:
+
+    GET  clock/<token>/          JSON reading, polled every EXAM_CLOCK_SECONDS
+    GET  clock/<token>/stream/   the same readings pushed as server-sent events
+                                 (ASGI only), ending with a 'submit' event
+
+A reading is built from the cached exam and attempt state (one
+``get_many``) and never from the database while those entries are warm:
+
+    {
+        'server_now': '2026-10-18T09:41:07.120+00:00',
+        'ends_at': ...,                 # the attempt's own time budget
+        'closes_at': ...,               # the exam window
+        'deadline': ...,                # the earlier of the two
+        'remaining_seconds': 1432,
+        'submit': False,                # True once the deadline has passed
+        'poll_seconds': 30,
+    }
+
+Pages pass a signed token naming (student, exam) in the clock URL instead
+of relying on the session, since loading the session and user would cost
+two queries per tick. The token only unlocks the timing of that one
+attempt. Staff changes reach the clients on the next reading: saving an
+exam drops its cache entry (see exams/signals.py).
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+
+from . import attempt_cache
+
+TOKEN_SALT = 'exams.clock'
+TOKEN_MAX_AGE = 24 * 60 * 60
+# a stream ends after this long and the browser reconnects, so streams left
+# behind by closed tabs do not tick until the deadline
+STREAM_LIFETIME = 5 * 60
+RETRY_MS = 3000
+
+
+def poll_seconds():
+    return getattr(settings, 'EXAM_CLOCK_SECONDS', 30)
+
+
+def make_token(state):
+    return signing.dumps([state['student_id'], state['exam_id']], salt=TOKEN_SALT)
+
+
+def read_token(token):
+    """(student_id, exam_id) of a clock token, or None if it is forged or stale."""
+    try:
+        student_id, exam_id = signing.loads(token, salt=TOKEN_SALT, max_age=TOKEN_MAX_AGE)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    return student_id, exam_id
+
+
+def page_urls(state):
+    """Template context for the countdown: the attempt's clock URLs."""
+    args = [state['exam_id'], make_token(state)]
+    return {
+        'clock_url': reverse('exam_clock', args=args),
+        # streaming holds a connection per student: only worth it under ASGI
+        'clock_stream_url': reverse('exam_clock_stream', args=args) if settings.EXAM_ASYNC_VIEWS else '',
+    }
+
+
+def cached(student_id, exam_id):
+    """(exam, attempt state) from the cache in one round trip; either may be None."""
+    exam_key = attempt_cache.exam_key(exam_id)
+    state_key = attempt_cache.attempt_key(student_id, exam_id)
+    found = cache.get_many([exam_key, state_key])
+    return found.get(exam_key), found.get(state_key)
+
+
+def load(student_id, exam_id):
+    """(exam, attempt state), reading the database only for what the cache lacks."""
+    exam, state = cached(student_id, exam_id)
+    if exam is None:
+        exam = attempt_cache.get_exam(exam_id)
+    if state is None and exam is not None:
+        student = get_user_model().objects.filter(pk=student_id).first()
+        if student is not None:
+            state = attempt_cache.get_attempt_state(student, exam)
+    return exam, state
+
+
+def deadline(exam, state):
+    ends = [d for d in (state['ends_at'], exam.closes_at) if d]
+    return min(ends) if ends else None
+
+
+def reading(exam, state, now=None):
+    now = now or timezone.now()
+    end = deadline(exam, state)
+    return {
+        'server_now': now.isoformat(),
+        'ends_at': state['ends_at'].isoformat() if state['ends_at'] else None,
+        'closes_at': exam.closes_at.isoformat() if exam.closes_at else None,
+        'deadline': end.isoformat() if end else None,
+        'remaining_seconds': max(0, int((end - now).total_seconds())) if end else None,
+        'submit': not exam.is_active or (end is not None and now >= end),
+        'poll_seconds': poll_seconds(),
+    }
+
+
+def _event(name, data):
+    return f'event: {name}\ndata: {json.dumps(data)}\n\n'
+
+
+async def events(student_id, exam_id):
+    """Server-sent events for one attempt: a 'clock' reading every poll interval and
+    at the deadline, then 'submit' once it has passed (or the attempt is gone)."""
+    yield f'retry: {RETRY_MS}\n\n'
+    # cache reads need no particular thread; keep them off the per-request one
+    read_cache = sync_to_async(cached, thread_sensitive=False)
+    started = timezone.now()
+    while True:
+        exam, state = await read_cache(student_id, exam_id)
+        if exam is None or state is None:
+            exam, state = await sync_to_async(load)(student_id, exam_id)
+        if exam is None or state is None or state['ends_at'] is None:
+            yield _event('submit', {'submit': True, 'server_now': timezone.now().isoformat()})
+            return
+        now = timezone.now()
+        data = reading(exam, state, now)
+        if data['submit']:
+            yield _event('submit', data)
+            return
+        yield _event('clock', data)
+        if (now - started).total_seconds() >= STREAM_LIFETIME:
+            return
+        wait = poll_seconds()
+        end = deadline(exam, state)
+        if end is not None:
+            # wake just after the deadline so the submit event is on time
+            wait = min(wait, (end - now).total_seconds() + 0.05)
+        await asyncio.sleep(wait)
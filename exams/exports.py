@@ -0,0 +1,129 @@
+"""
+Streaming exports of exam results.
+
+Rows are read with ``.iterator()`` (a server-side cursor on PostgreSQL)
+over ``values_list`` of just the exported columns, and written out one
+chunk at a time through StreamingHttpResponse, so memory stays flat no
+matter how many attempts or answers an exam has.
+
+Datasets:
+
+    results   one row per completed attempt
+    answers   one row per answer of a completed attempt (long format)
+
+Formats: 'csv' (RFC 4180 quoting via the csv module) and 'ndjson' (one JSON
+object per line).
+"""
+import csv
+import json
+from itertools import chain
+
+from django.http import StreamingHttpResponse
+
+from . import packed_answers
+from .models import StudentAnswer, StudentExamAttempt
+
+CHUNK_SIZE = 2000
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def result_rows(exam):
+    """(header, rows) for the per-attempt results export."""
+    header = ['username', 'full_name', 'score', 'started_at', 'submitted_at', 'time_taken_secs']
+    qs = (StudentExamAttempt.objects
+          .filter(exam=exam, completed=True)
+          .order_by('student__username')
+          .values_list('student__username', 'student__first_name', 'student__last_name',
+                       'score', 'started_at', 'submitted_at'))
+
+    def rows():
+        for username, first, last, score, started_at, submitted_at in qs.iterator(chunk_size=CHUNK_SIZE):
+            secs = None
+            if submitted_at and started_at:
+                secs = int((submitted_at - started_at).total_seconds())
+            yield [username, f"{first} {last}".strip(), score, started_at, submitted_at, secs]
+
+    return header, rows()
+
+
+def answer_rows(exam):
+    """(header, rows) for the long-format export: one row per answer.
+
+    Attempts stored as rows come first, then packed attempts (one row read each).
+    """
+    header = ['attempt_id', 'username', 'question_id', 'question_type', 'selected_answer', 'is_correct']
+    qs = (StudentAnswer.objects
+          .filter(exam=exam, attempt__completed=True)
+          .order_by('attempt_id', 'question_id')
+          .values_list('attempt_id', 'attempt__student__username', 'question_id',
+                       'question__question_type', 'selected_answer', 'is_correct'))
+    packed = (packed_answers.packed_attempts(exam.pk)
+              .filter(completed=True)
+              .order_by('id')
+              .values('id', 'student__username', 'paper_id', 'packed_answers'))
+    unpacked = (
+        [a.attempt_id, row['student__username'], a.question_id, a.question['question_type'],
+         a.selected_answer, a.is_correct]
+        for row, a in packed_answers.iter_answers(packed.iterator(chunk_size=CHUNK_SIZE))
+    )
+    return header, chain((list(row) for row in qs.iterator(chunk_size=CHUNK_SIZE)), unpacked)
+
+
+DATASETS = {
+    'results': result_rows,
+    'answers': answer_rows,
+}
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller."""
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    return '' if value is None else value
+
+
+def _json_value(value):
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return float(value)  # Decimal scores
+
+
+def _csv_lines(header, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([_csv_value(v) for v in row])
+
+
+def _ndjson_lines(header, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(header, (_json_value(v) for v in row)))) + '\n'
+
+
+def _batched(lines, size=CHUNK_SIZE):
+    # one write per chunk of rows rather than per row
+    buf = []
+    for line in lines:
+        buf.append(line)
+        if len(buf) >= size:
+            yield ''.join(buf)
+            buf = []
+    if buf:
+        yield ''.join(buf)
+
+
+def stream_export(exam, dataset, fmt):
+    header, rows = DATASETS[dataset](exam)
+    lines = _csv_lines(header, rows) if fmt == 'csv' else _ndjson_lines(header, rows)
+    resp = StreamingHttpResponse(_batched(lines), content_type=CONTENT_TYPES[fmt])
+    resp['Content-Disposition'] = f'attachment; filename="exam_{exam.id}_{dataset}.{fmt}"'
+    return resp
@@ -7,7 +7,7 @@ from questions.models import Question
 class ExamCreationForm(forms.ModelForm):
     class Meta:
         model = Exam
-        fields = ["title", "description", "opens_at", "closes_at", "duration_minutes"]
+        fields = ["title", "description", "opens_at", "closes_at", "duration_minutes", "delivery_mode"]
         widgets = {
             "opens_at": forms.DateTimeInput(attrs={"type": "datetime-local"}),
             "closes_at": forms.DateTimeInput(attrs={"type": "datetime-local"}),
@@ -19,6 +19,8 @@ class ExamCreationForm(forms.ModelForm):
         self.fields["opens_at"].initial = now
         self.fields["closes_at"].initial = now + timezone.timedelta(days=7)
         self.fields["duration_minutes"].initial = 60
+        # omitted from the POST -> keep the model default / current value
+        self.fields["delivery_mode"].required = False
 
     def clean(self):
         data = super().clean()
@@ -0,0 +1,244 @@
+"""
+Scoring, finalization and regrading of attempts.
+
+``finalize_attempt`` is the single-attempt path used by submit_exam_view;
+``finalize_expired_attempts`` is the bulk path used by the
+finalize_expired_attempts command to close attempts whose time ran out or
+whose exam closed without the student ever submitting.
+
+``regrade_question`` re-applies a question's (changed) answer key to the
+answers already given and rescores only the attempts that answered it.
+"""
+import time
+from collections import namedtuple
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from accounts import dashboard_cache
+from . import answer_store, attempt_cache, packed_answers, papers, stats
+from .models import ExamQuestion, StudentAnswer, StudentExamAttempt
+
+
+def score_percent(correct, total):
+    return round((correct / total) * 100, 2) if total else 0
+
+
+def _question_totals(rows):
+    """{attempt_id: number of questions} for rows with 'id', 'exam_id', 'paper_id'."""
+    totals = {}
+    unpinned_exams = set()
+    for row in rows:
+        if row['paper_id']:
+            totals[row['id']] = len(papers.get_paper(row['paper_id'])['questions'])
+        else:
+            unpinned_exams.add(row['exam_id'])
+    if unpinned_exams:
+        per_exam = dict(ExamQuestion.objects
+                        .filter(exam_id__in=unpinned_exams)
+                        .values('exam_id')
+                        .annotate(n=Count('id'))
+                        .values_list('exam_id', 'n'))
+        for row in rows:
+            if not row['paper_id']:
+                totals[row['id']] = per_exam.get(row['exam_id'], 0)
+    return totals
+
+
+def _correct_counts(rows):
+    """{attempt_id: correct answers} for rows with 'id', 'exam_id', 'packed_answers'."""
+    counts = {r['id']: packed_answers.correct_count(r['packed_answers'])
+              for r in rows if r['packed_answers'] is not None}
+    unpacked = [r for r in rows if r['packed_answers'] is None]
+    if unpacked:
+        counts.update(StudentAnswer.objects
+                      .filter(attempt_id__in=[r['id'] for r in unpacked],
+                              exam_id__in={r['exam_id'] for r in unpacked}, is_correct=True)
+                      .values('attempt_id')
+                      .annotate(n=Count('id'))
+                      .values_list('attempt_id', 'n'))
+    return counts
+
+
+def finalize_attempt(attempt):
+    """Score and complete one in-progress attempt (the student's own submit)."""
+    # buffered (write-behind) answers must be in the database before scoring
+    answer_store.flush_attempt(attempt.id, wait=True)
+
+    if attempt.packed_answers is not None:
+        correct = packed_answers.correct_count(attempt.packed_answers)
+    else:
+        correct = StudentAnswer.objects.filter(attempt=attempt, exam_id=attempt.exam_id, is_correct=True).count()
+    total_q = _question_totals([{'id': attempt.id, 'exam_id': attempt.exam_id,
+                                 'paper_id': attempt.paper_id}])[attempt.id]
+
+    score = score_percent(correct, total_q)
+    submitted_at = timezone.now()
+    with transaction.atomic():
+        # only the first of a double submit (or a submit racing the sweeper) completes it
+        completed = (StudentExamAttempt.objects
+                     .filter(pk=attempt.pk, completed=False)
+                     .update(score=score, completed=True, submitted_at=submitted_at))
+        if completed:
+            stats.record_completed(attempt.exam_id, [score])
+    attempt_cache.invalidate_attempt(attempt.student_id, attempt.exam_id)
+    if completed:
+        attempt.score, attempt.completed, attempt.submitted_at = score, True, submitted_at
+        # update() sends no post_save
+        dashboard_cache.bump_student(attempt.student_id)
+    else:
+        attempt.refresh_from_db(fields=['score', 'completed', 'submitted_at'])
+    return attempt
+
+
+def expired_attempts(now=None):
+    """In-progress attempts whose time budget ran out or whose exam has closed.
+
+    Dormant (pre-provisioned, never started) attempts are left alone: the
+    student missed the exam rather than scoring zero on it.
+    """
+    now = now or timezone.now()
+    return (StudentExamAttempt.objects
+            .started()
+            .filter(completed=False)
+            .filter(Q(ends_at__lte=now) | Q(exam__closes_at__lte=now)))
+
+
+def finalize_expired_attempts(batch_size=1000, now=None, on_batch=None):
+    """Finalize every expired attempt in keyset-ordered batches.
+
+    Each batch costs one id/metadata read, one grouped COUNT of correct
+    answers, one locking re-read of the rows still open and one bulk
+    UPDATE, so a run scales to tens of thousands of attempts. Returns the
+    number of attempts finalized.
+    """
+    now = now or timezone.now()
+    qs = (expired_attempts(now)
+          .order_by('id')
+          .values('id', 'student_id', 'exam_id', 'paper_id', 'packed_answers', 'ends_at', 'exam__closes_at'))
+
+    finalized = 0
+    last_id = 0
+    while True:
+        rows = list(qs.filter(id__gt=last_id)[:batch_size])
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+        ids = [r['id'] for r in rows]
+
+        answer_store.flush_buffers(ids, wait=True)
+        correct = _correct_counts(rows)
+        totals = _question_totals(rows)
+
+        with transaction.atomic():
+            # rows a submit completed since they were read are left to it; the lock
+            # makes a concurrent submit wait and then find the attempt completed
+            still_open = set(StudentExamAttempt.objects
+                             .select_for_update()
+                             .filter(id__in=ids, completed=False)
+                             .values_list('id', flat=True))
+            updates = []
+            for row in rows:
+                if row['id'] not in still_open:
+                    continue
+                # submitted at the moment time actually ran out, not when we noticed
+                deadlines = [d for d in (row['ends_at'], row['exam__closes_at']) if d and d <= now]
+                updates.append((row['exam_id'], StudentExamAttempt(
+                    id=row['id'],
+                    score=score_percent(correct.get(row['id'], 0), totals[row['id']]),
+                    completed=True,
+                    submitted_at=min(deadlines) if deadlines else now,
+                )))
+            StudentExamAttempt.objects.bulk_update([u for _, u in updates], ['score', 'completed', 'submitted_at'])
+            stats.record_completed_many((exam_id, u.score) for exam_id, u in updates)
+
+        attempt_cache.invalidate_attempts((r['student_id'], r['exam_id']) for r in rows)
+        # bulk_update sends no post_save
+        dashboard_cache.bump_students(r['student_id'] for r in rows)
+        finalized += len(updates)
+        if on_batch:
+            on_batch(finalized)
+    return finalized
+
+
+RESCORE_CHUNK = 1000
+
+RegradeReport = namedtuple('RegradeReport', ['answers_changed', 'attempts_rescored', 'seconds'])
+
+
+def regrade_question(question):
+    """Re-mark every answer to `question` against its current correct_answer.
+
+    Flags are flipped with two set-based UPDATEs (only rows whose flag is
+    wrong are touched), and in the packed answers of attempts that store
+    them that way; the completed attempts behind those rows are then
+    rescored with one grouped aggregate and one bulk_update.
+
+    The key is also rewritten in every paper holding the question, so
+    attempts still in progress mark the answers they save from now on
+    against it; answers they have buffered (write-behind) are flushed
+    first so their old flags are re-marked too.
+    """
+    started = time.monotonic()
+    key = papers.normalize_answer(question.correct_answer)
+    exam_ids = set(papers.exams_using_question(question.pk))
+    holding = papers.papers_holding(question.pk)
+    answer_store.flush_buffers(StudentExamAttempt.objects
+                               .filter(Q(exam_id__in=exam_ids) | Q(paper_id__in=list(holding)), completed=False)
+                               .values_list('id', flat=True), wait=True)
+    answers = StudentAnswer.objects.filter(question_id=question.pk)
+    # stored answers are already stripped, so iexact matches normalize_answer()
+    now_correct = answers.filter(selected_answer__iexact=key, is_correct=False)
+    now_wrong = answers.filter(is_correct=True).exclude(selected_answer__iexact=key)
+
+    with transaction.atomic():
+        affected = set(now_correct.values_list('attempt_id', flat=True))
+        affected |= set(now_wrong.values_list('attempt_id', flat=True))
+        answers_changed = now_correct.update(is_correct=True)
+        answers_changed += now_wrong.update(is_correct=False)
+        papers.rekey_question(question.pk, question.correct_answer, list(holding))
+        packed_changed = packed_answers.regrade(question.pk, key, list(holding))
+        affected.update(packed_changed)
+        answers_changed += len(packed_changed)
+        rescored = rescore_attempts(affected)
+        if answers_changed:
+            exam_ids.update(holding.values())
+            exam_ids.update(StudentExamAttempt.objects.filter(id__in=affected).values_list('exam_id', flat=True))
+            for exam_id in sorted(exam_ids):
+                stats.rebuild_question_stats(exam_id, [question.pk])
+
+    return RegradeReport(answers_changed, rescored, round(time.monotonic() - started, 3))
+
+
+def rescore_attempts(attempt_ids):
+    """Recompute scores of completed attempts from their stored answer flags.
+
+    Per chunk of RESCORE_CHUNK attempts, one grouped aggregate reads the
+    correct counts and one bulk_update writes the scores that actually
+    changed. Returns the number of attempts rescored.
+    """
+    attempt_ids = sorted(attempt_ids)
+    rescored = 0
+    for start in range(0, len(attempt_ids), RESCORE_CHUNK):
+        chunk = attempt_ids[start:start + RESCORE_CHUNK]
+        rows = list(StudentExamAttempt.objects
+                    .filter(id__in=chunk, completed=True)
+                    .annotate(correct=Count('studentanswer', filter=Q(studentanswer__is_correct=True)))
+                    .values('id', 'exam_id', 'paper_id', 'score', 'correct', 'packed_answers'))
+        totals = _question_totals(rows)
+
+        updates = []
+        changes = []
+        for row in rows:
+            correct = row['correct']
+            if row['packed_answers'] is not None:
+                correct = packed_answers.correct_count(row['packed_answers'])
+            score = score_percent(correct, totals[row['id']])
+            if row['score'] is None or float(row['score']) != float(score):
+                updates.append(StudentExamAttempt(id=row['id'], score=score))
+                changes.append((row['exam_id'], row['score'], score))
+        StudentExamAttempt.objects.bulk_update(updates, ['score'])
+        stats.record_rescored(changes)
+        rescored += len(updates)
+    return rescored
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from exams import archive
+from exams.management.commands.purge_attempts import Command as PurgeAttemptsCommand
+
+
+class Command(BaseCommand):
+    help = ("Move exams that closed before a cutoff, with their attempts and answers, into gzip JSONL "
+            "bundles on disk and delete them from the live tables in batches. Staff can still open "
+            "their results, read from the bundle.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--before", required=True, metavar="DATE",
+                            help="Archive exams that closed before this date or datetime (ISO 8601).")
+        parser.add_argument("--exam", type=int, action="append", dest="exam_ids", metavar="EXAM_ID",
+                            help="Only these exams (repeatable); they must still have closed before --before.")
+        parser.add_argument("--dir", help="Bundle directory (default settings.EXAM_ARCHIVE_DIR).")
+        parser.add_argument("--batch-size", type=int, default=1000,
+                            help="Attempts deleted per transaction (default 1000).")
+        parser.add_argument("--pause", type=float, default=0.0, metavar="SECONDS",
+                            help="Sleep between delete batches to leave room for live traffic (default 0).")
+        parser.add_argument("--dry-run", action="store_true", help="Only list the exams that would be archived.")
+
+    def handle(self, *args, **opts):
+        before = PurgeAttemptsCommand.parse_before(opts["before"])
+        exams = archive.archivable_exams(before).select_related("module").order_by("closes_at", "id")
+        if opts["exam_ids"]:
+            exams = exams.filter(id__in=opts["exam_ids"])
+        exams = list(exams.annotate(n_attempts=Count("studentexamattempt")))
+        if not exams:
+            self.stdout.write("No closed exams to archive.")
+            return
+        directory = opts["dir"] or archive.archive_dir()
+
+        if opts["dry_run"]:
+            for exam in exams:
+                self.stdout.write(f"  {exam.pk:>6}  {exam.module.code:<10} {exam.title} "
+                                  f"(closed {exam.closes_at:%Y-%m-%d}, {exam.n_attempts} attempts)")
+            self.stdout.write(f"Would archive {len(exams)} exams to {directory}.")
+            return
+
+        total_attempts = total_answers = 0
+        for exam in exams:
+            try:
+                report = archive.archive_exam(exam, directory, batch_size=opts["batch_size"], pause=opts["pause"])
+            except OSError as exc:
+                raise CommandError(f"Archiving '{exam.title}' failed: {exc}")
+            total_attempts += report.attempts
+            total_answers += report.answers
+            self.stdout.write(f"  {exam.title}: {report.attempts} attempts, {report.answers} answers, "
+                              f"{report.bytes / 1024:.0f} KiB in {report.seconds:.2f}s")
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {len(exams)} exams ({total_attempts} attempts, {total_answers} answers) to {directory}."))
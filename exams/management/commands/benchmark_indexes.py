@@ -0,0 +1,140 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from accounts.models import Module
+from exams.grading import expired_attempts
+from exams.models import Exam, ExamQuestion, StudentAnswer, StudentExamAttempt
+from questions.models import Question
+
+# models whose Meta indexes/constraints are measured (see migration 0009)
+INDEXED_MODELS = (ExamQuestion, StudentExamAttempt, StudentAnswer)
+
+
+class Command(BaseCommand):
+    help = ("Seed a throwaway dataset and compare query plans and latency of the exam hot "
+            "lookups with and without the composite/partial indexes. PostgreSQL only; "
+            "everything runs in one transaction that is rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--answers", type=int, default=1_000_000,
+                            help="Approximate number of StudentAnswer rows to seed (default 1,000,000).")
+        parser.add_argument("--questions", type=int, default=50,
+                            help="Questions per exam; students = answers / questions (default 50).")
+        parser.add_argument("--repeat", type=int, default=50,
+                            help="Timed runs per query; the median is reported (default 50).")
+
+    def handle(self, *args, **opts):
+        if connection.vendor != "postgresql":
+            raise CommandError("benchmark_indexes needs PostgreSQL (it relies on EXPLAIN ANALYZE and transactional DDL).")
+
+        with transaction.atomic():
+            queries = self.seed(opts["answers"], opts["questions"])
+            with_idx = self.measure(queries, opts["repeat"])
+            self.drop_indexes()
+            without_idx = self.measure(queries, opts["repeat"])
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"\n{'query':<28}{'indexed':>12}{'unindexed':>12}  plan (indexed / unindexed)")
+        for label in queries:
+            (ms_on, plan_on), (ms_off, plan_off) = with_idx[label], without_idx[label]
+            self.stdout.write(f"{label:<28}{ms_on:>10.3f}ms{ms_off:>10.3f}ms  {plan_on} / {plan_off}")
+        self.stdout.write(self.style.SUCCESS("Done; seeded data and index changes were rolled back."))
+
+    def seed(self, n_answers, n_questions):
+        started = time.monotonic()
+        now = timezone.now()
+        n_students = max(1, n_answers // n_questions)
+
+        module = Module.objects.create(code="BENCH-IDX", name="Index benchmark")
+        exam = Exam.objects.create(
+            title="Index benchmark", module=module,
+            opens_at=now - timedelta(hours=1), closes_at=now + timedelta(hours=1),
+        )
+        questions = Question.objects.bulk_create([
+            Question(module=module, question_text=f"Q{i}", question_type="FILL", correct_answer="x")
+            for i in range(n_questions)
+        ])
+        ExamQuestion.objects.bulk_create([ExamQuestion(exam=exam, question=q) for q in questions])
+
+        User = get_user_model()
+        students = User.objects.bulk_create(
+            [User(username=f"bench{i:07d}", role="student", password="!") for i in range(n_students)],
+            batch_size=5000,
+        )
+        # one in ten still in progress, half of those already past their deadline
+        attempts = StudentExamAttempt.objects.bulk_create(
+            [StudentExamAttempt(
+                student=s, exam=exam, completed=i % 10 != 0, score=50 if i % 10 else None,
+                ends_at=now + timedelta(minutes=30 if i % 20 else -5),
+            ) for i, s in enumerate(students)],
+            batch_size=5000,
+        )
+
+        # answers in one set-based INSERT: every attempt x every question
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {StudentAnswer._meta.db_table} (attempt_id, exam_id, question_id, selected_answer, is_correct)
+                SELECT a.id, a.exam_id, q.question_id, 'x', (a.id + q.question_id) % 3 = 0
+                FROM {StudentExamAttempt._meta.db_table} a
+                JOIN {ExamQuestion._meta.db_table} q ON q.exam_id = a.exam_id
+                WHERE a.exam_id = %s
+                """,
+                [exam.id],
+            )
+            cursor.execute(f"ANALYZE {StudentAnswer._meta.db_table}")
+            cursor.execute(f"ANALYZE {StudentExamAttempt._meta.db_table}")
+            cursor.execute(f"ANALYZE {ExamQuestion._meta.db_table}")
+        self.stdout.write(f"Seeded {n_students} attempts x {n_questions} questions "
+                          f"in {time.monotonic() - started:.1f}s.")
+
+        student, attempt, question = students[len(students) // 2], attempts[len(attempts) // 2], questions[0]
+        return {
+            "open attempt lookup": StudentExamAttempt.objects.filter(student=student, exam=exam, completed=False),
+            "result attempt lookup": StudentExamAttempt.objects.filter(student=student, exam=exam, completed=True),
+            "attempt answers": (StudentAnswer.objects.filter(attempt=attempt, exam=exam)
+                                .values_list("question_id", "selected_answer")),
+            "question correct count": StudentAnswer.objects.filter(question=question, is_correct=True).values("id"),
+            "expired sweep batch": expired_attempts(now).order_by("id").values("id")[:1000],
+            "exam question link": ExamQuestion.objects.filter(exam=exam, question=question),
+        }
+
+    def measure(self, queries, repeat):
+        results = {}
+        for label, qs in queries.items():
+            plan = qs.explain()
+            if self.verbosity >= 2:
+                self.stdout.write(f"-- {label}\n{qs.explain(analyze=True)}\n")
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(qs.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            results[label] = (statistics.median(timings), self.plan_summary(plan))
+        return results
+
+    @staticmethod
+    def plan_summary(plan):
+        """Top scan node of a text EXPLAIN, e.g. 'Index Scan using uniq_open_attempt'."""
+        for line in plan.splitlines():
+            line = line.strip().lstrip("->").strip()
+            if "Scan" in line:
+                return line.split("  (")[0]
+        return plan.splitlines()[0].split("  (")[0]
+
+    def drop_indexes(self):
+        with connection.schema_editor(atomic=False) as editor:
+            for model in INDEXED_MODELS:
+                for index in model._meta.indexes:
+                    editor.remove_index(model, index)
+                for constraint in model._meta.constraints:
+                    editor.remove_constraint(model, constraint)
+        with connection.cursor() as cursor:
+            for model in INDEXED_MODELS:
+                cursor.execute(f"ANALYZE {model._meta.db_table}")
@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand
+from exams.grading import finalize_expired_attempts
+
+
+class Command(BaseCommand):
+    help = "Score and complete attempts whose time ran out or whose exam has closed."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000,
+                            help="Attempts finalized per bulk update (default 1000).")
+        parser.add_argument("--every", type=int, default=0, metavar="SECONDS",
+                            help="Keep running and sweep again every SECONDS (in-process scheduler). "
+                                 "Default: sweep once and exit.")
+
+    def handle(self, *args, **opts):
+        while True:
+            started = time.monotonic()
+            total = finalize_expired_attempts(
+                batch_size=opts["batch_size"],
+                on_batch=lambda n: self.stdout.write(f"  … {n} finalized"),
+            )
+            elapsed = time.monotonic() - started
+            self.stdout.write(self.style.SUCCESS(
+                f"Finalized {total} expired attempts in {elapsed:.2f}s."
+            ))
+            if not opts["every"]:
+                break
+            time.sleep(opts["every"])
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from exams.answer_store import flush_buffers
+from exams.models import StudentExamAttempt
+
+
+class Command(BaseCommand):
+    help = "Write buffered (write-behind) answers to the database. Run from cron and after a restart."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000,
+                            help="Attempts looked up in the cache per round trip (default 1000).")
+
+    def handle(self, *args, **opts):
+        batch_size = opts["batch_size"]
+        # in-progress attempts are the only ones that can still hold a buffer;
+        # submit and the finalize sweeper flush before completing an attempt
+        attempt_ids = (StudentExamAttempt.objects
+                       .filter(completed=False)
+                       .order_by("id")
+                       .values_list("id", flat=True))
+
+        flushed = checked = 0
+        batch = []
+        for attempt_id in attempt_ids.iterator(chunk_size=batch_size):
+            batch.append(attempt_id)
+            if len(batch) >= batch_size:
+                flushed += flush_buffers(batch)
+                checked += len(batch)
+                batch = []
+        if batch:
+            flushed += flush_buffers(batch)
+            checked += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {checked} in-progress attempts, flushed {flushed} buffered answers."
+        ))
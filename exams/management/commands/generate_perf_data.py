@@ -0,0 +1,255 @@
+import io
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from accounts.models import Module
+from exams import papers
+from exams.grading import score_percent
+from exams.models import Exam, ExamQuestion, StudentAnswer, StudentExamAttempt
+from questions.models import Question
+
+# sizes at --scale 1: 50k students, 2k exams, 500k attempts, 10M answers
+MODULES = 100
+STUDENTS = 50_000
+EXAMS = 2_000
+QUESTIONS_PER_EXAM = 20
+ATTEMPTS_PER_EXAM = 250
+# each module's question bank holds this many papers' worth of questions
+BANK_FACTOR = 5
+
+
+@contextmanager
+def generated_start_times():
+    """Let bulk_create keep the started_at values we set instead of stamping auto_now_add."""
+    field = StudentExamAttempt._meta.get_field("started_at")
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = ("Generate a large, reproducible performance dataset (modules, staff, students, "
+            "enrollments, questions, exams, attempts, answers) with bulk inserts. "
+            "--scale 1 is 50k students, 2k exams and 10M answers.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", type=float, default=0.01,
+                            help="Size relative to the full dataset (default 0.01: 500 students, 20 exams, 100k answers).")
+        parser.add_argument("--seed", type=int, default=1, help="Random seed; same seed and scale, same data.")
+        parser.add_argument("--prefix", default="perf",
+                            help="Prefix for usernames and module codes, so runs do not collide (default 'perf').")
+        parser.add_argument("--password", default="Stu1234!", help="Password for every generated user.")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per INSERT (default 5000).")
+        parser.add_argument("--copy", action="store_true",
+                            help="Load answers with COPY instead of INSERT (PostgreSQL only).")
+        parser.add_argument("--skip-stats", action="store_true",
+                            help="Do not run rebuild_exam_stats afterwards.")
+
+    def handle(self, *args, **opts):
+        if opts["copy"] and connection.vendor != "postgresql":
+            raise CommandError("--copy needs PostgreSQL.")
+        prefix = opts["prefix"]
+        if Module.objects.filter(code__startswith=f"{prefix.upper()}-").exists():
+            raise CommandError(f"Data with prefix '{prefix}' already exists; pick another --prefix.")
+
+        scale = opts["scale"]
+        self.rng = random.Random(opts["seed"])
+        self.batch_size = opts["batch_size"]
+        self.use_copy = opts["copy"]
+        self.started = time.monotonic()
+        n_modules = max(1, round(MODULES * scale))
+        n_students = max(1, round(STUDENTS * scale))
+        n_exams = max(1, round(EXAMS * scale))
+
+        modules = self.create_modules(prefix, n_modules)
+        # one hash for every user: hashing per user would take longer than the rest
+        hashed = make_password(opts["password"])
+        self.create_staff(prefix, modules, hashed)
+        enrolled = self.create_students(prefix, n_students, modules, hashed)
+        banks = self.create_questions(modules)
+        exams = self.create_exams(prefix, n_exams, modules, banks, enrolled)
+
+        if not opts["skip_stats"]:
+            call_command("rebuild_exam_stats", exam_ids=[e.id for e in exams], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f"Done in {self.elapsed()}."))
+
+    def elapsed(self):
+        return f"{time.monotonic() - self.started:.1f}s"
+
+    def log(self, message):
+        self.stdout.write(f"[{self.elapsed():>7}] {message}")
+
+    # ---------- people and modules ----------
+
+    def create_modules(self, prefix, count):
+        modules = Module.objects.bulk_create([
+            Module(code=f"{prefix.upper()}-{m:04d}", name=f"{prefix} module {m:04d}") for m in range(count)
+        ])
+        self.log(f"{len(modules)} modules")
+        return modules
+
+    def create_staff(self, prefix, modules, hashed):
+        User = get_user_model()
+        User.objects.bulk_create([
+            User(username=f"{prefix}staff{m:04d}", email=f"{prefix}staff{m:04d}@perf.example",
+                 role="staff", module=module, password=hashed)
+            for m, module in enumerate(modules)
+        ], batch_size=self.batch_size)
+        self.log(f"{len(modules)} staff")
+
+    def create_students(self, prefix, count, modules, hashed):
+        """Create students enrolled in two modules each; returns {module_id: [student ids]}."""
+        User = get_user_model()
+        students = User.objects.bulk_create([
+            User(username=f"{prefix}{n:07d}", email=f"{prefix}{n:07d}@perf.example",
+                 first_name="Perf", last_name=f"Student {n}", role="student", password=hashed)
+            for n in range(count)
+        ], batch_size=self.batch_size)
+
+        enrolled = {m.id: [] for m in modules}
+        links = []
+        Enrollment = User.modules.through
+        for n, student in enumerate(students):
+            for module in (modules[m] for m in sorted({n % len(modules), (n * 7 + 3) % len(modules)})):
+                enrolled[module.id].append(student.id)
+                links.append(Enrollment(customuser_id=student.id, module_id=module.id))
+        Enrollment.objects.bulk_create(links, batch_size=self.batch_size)
+        self.log(f"{len(students)} students, {len(links)} enrollments")
+        return enrolled
+
+    # ---------- questions and exams ----------
+
+    def question_kind(self, n):
+        kind = ("MCQ", "TF", "FILL")[n % 3]
+        if kind == "MCQ":
+            return {"question_type": "MCQ", "option_a": "Alpha", "option_b": "Bravo", "option_c": "Charlie",
+                    "option_d": "Delta", "correct_answer": self.rng.choice("abcd")}
+        if kind == "TF":
+            return {"question_type": "TF", "correct_answer": self.rng.choice(("True", "False"))}
+        return {"question_type": "FILL", "correct_answer": f"answer{n}"}
+
+    def create_questions(self, modules):
+        """Question bank per module; returns {module_id: [Question]}."""
+        per_module = QUESTIONS_PER_EXAM * BANK_FACTOR
+        questions = Question.objects.bulk_create([
+            Question(module=module, question_text=f"{module.code} question {n}", **self.question_kind(n))
+            for module in modules for n in range(per_module)
+        ], batch_size=self.batch_size)
+        banks = {m.id: [] for m in modules}
+        for q in questions:
+            banks[q.module_id].append(q)
+        self.log(f"{len(questions)} questions")
+        return banks
+
+    @staticmethod
+    def wrong_answer(question):
+        if question.question_type == "MCQ":
+            return "a" if question.correct_answer != "a" else "b"
+        if question.question_type == "TF":
+            return "False" if question.correct_answer == "True" else "True"
+        return "wrong"
+
+    def create_exams(self, prefix, count, modules, banks, enrolled):
+        now = timezone.now()
+        exams = []
+        for n in range(count):
+            module = modules[n % len(modules)]
+            if n % 10 == 0:      # open right now, attempts in progress
+                opens = now - timedelta(hours=1)
+            elif n % 10 == 1:    # upcoming, no attempts
+                opens = now + timedelta(days=1 + n % 30)
+            else:                # closed, all attempts graded
+                opens = now - timedelta(days=1 + n % 365, hours=n % 24)
+            exams.append(Exam(title=f"{prefix} exam {n:05d}", module=module, opens_at=opens,
+                              closes_at=opens + timedelta(hours=3), duration_minutes=60))
+        exams = Exam.objects.bulk_create(exams, batch_size=self.batch_size)
+
+        links, exam_questions = [], {}
+        for exam in exams:
+            exam_questions[exam.id] = self.rng.sample(banks[exam.module_id], QUESTIONS_PER_EXAM)
+            links += [ExamQuestion(exam=exam, question=q) for q in exam_questions[exam.id]]
+        ExamQuestion.objects.bulk_create(links, batch_size=self.batch_size)
+        self.log(f"{len(exams)} exams, {len(links)} exam questions")
+
+        answers, n_attempts, n_answers = [], 0, 0
+        for i, exam in enumerate(exams, 1):
+            if exam.opens_at > now:
+                continue
+            questions = exam_questions[exam.id]
+            paper_id = papers.current_paper_id(exam)
+            pool = enrolled[exam.module_id]
+            takers = self.rng.sample(pool, min(ATTEMPTS_PER_EXAM, len(pool)))
+            in_progress = exam.closes_at > now
+
+            attempts, attempt_answers = [], []
+            for student_id in takers:
+                ability = self.rng.random()
+                started = exam.opens_at + timedelta(minutes=self.rng.randint(0, 60))
+                picked = []
+                answered = questions if not in_progress else questions[:self.rng.randint(0, len(questions))]
+                for q in answered:
+                    correct = self.rng.random() < 0.3 + 0.6 * ability
+                    picked.append((q.id, q.correct_answer if correct else self.wrong_answer(q), correct))
+                order = [q.id for q in questions]
+                self.rng.shuffle(order)
+                done = not in_progress
+                attempts.append(StudentExamAttempt(
+                    student_id=student_id, exam=exam, paper_id=paper_id, question_order=order,
+                    started_at=started, ends_at=started + timedelta(minutes=exam.duration_minutes),
+                    completed=done,
+                    submitted_at=started + timedelta(minutes=self.rng.randint(10, 59)) if done else None,
+                    score=score_percent(sum(c for _, _, c in picked), len(questions)) if done else None,
+                ))
+                attempt_answers.append(picked)
+
+            with generated_start_times():
+                attempts = StudentExamAttempt.objects.bulk_create(attempts, batch_size=self.batch_size)
+            for attempt, picked in zip(attempts, attempt_answers):
+                answers += [(attempt.id, exam.id, qid, value, correct) for qid, value, correct in picked]
+            if len(answers) >= self.batch_size:
+                n_answers += self.insert_answers(answers)
+                answers = []
+            n_attempts += len(attempts)
+            if i % 100 == 0:
+                self.log(f"{i}/{len(exams)} exams: {n_attempts} attempts, {n_answers} answers")
+        n_answers += self.insert_answers(answers)
+        self.log(f"{n_attempts} attempts, {n_answers} answers")
+        return exams
+
+    def insert_answers(self, rows):
+        if not rows:
+            return 0
+        if self.use_copy:
+            return self.copy_answers(rows)
+        StudentAnswer.objects.bulk_create([
+            StudentAnswer(attempt_id=a, exam_id=e, question_id=q, selected_answer=v, is_correct=c)
+            for a, e, q, v, c in rows
+        ], batch_size=self.batch_size)
+        return len(rows)
+
+    def copy_answers(self, rows):
+        buf = io.StringIO()
+        for attempt_id, exam_id, question_id, value, correct in rows:
+            buf.write(f"{attempt_id}\t{exam_id}\t{question_id}\t{value}\t{'t' if correct else 'f'}\n")
+        sql = (f"COPY {StudentAnswer._meta.db_table} (attempt_id, exam_id, question_id, selected_answer, is_correct) "
+               f"FROM STDIN")
+        with transaction.atomic(), connection.cursor() as cursor:
+            raw = cursor.cursor
+            if hasattr(raw, "copy_expert"):      # psycopg2
+                buf.seek(0)
+                raw.copy_expert(sql, buf)
+            else:                                # psycopg 3
+                with raw.copy(sql) as copy:
+                    copy.write(buf.getvalue())
+        return len(rows)
@@ -0,0 +1,203 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Max
+
+from exams.models import Exam, StudentAnswer
+from exams.purge import open_exams
+
+TABLE = StudentAnswer._meta.db_table
+OLD_TABLE = f"{TABLE}_unpartitioned"
+SEQUENCE = f"{TABLE}_part_id_seq"
+DEFAULT_PARTITION = f"{TABLE}_default"
+_BOUNDS = re.compile(r"FROM \('?(-?\d+)'?\) TO \('?(-?\d+)'?\)")
+
+
+def _renamed(name):
+    # PostgreSQL truncates identifiers at 63 bytes
+    return f"{name[:59]}_old"
+
+
+class Command(BaseCommand):
+    help = ("Range-partition the answers table by exam id on PostgreSQL, so per-exam queries touch "
+            "one partition and old terms can be detached without deleting rows. "
+            "Actions: status, convert, extend, detach.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=("status", "convert", "extend", "detach"))
+        parser.add_argument("--term-size", type=int, default=500, metavar="EXAMS",
+                            help="convert: exam ids per partition, roughly one term's exams (default 500).")
+        parser.add_argument("--ahead", type=int, default=2, metavar="PARTITIONS",
+                            help="convert/extend: empty partitions to keep beyond the newest exam (default 2).")
+        parser.add_argument("--below", type=int, metavar="EXAM_ID",
+                            help="detach: detach every partition holding only exams with smaller ids.")
+        parser.add_argument("--drop", action="store_true", help="detach: drop the detached partitions too.")
+        parser.add_argument("--force", action="store_true", help="convert: run even while an exam is open.")
+
+    def handle(self, *args, **opts):
+        if connection.vendor != "postgresql":
+            raise CommandError("partition_answers needs PostgreSQL (declarative partitioning).")
+        action = opts["action"]
+        if action in ("extend", "detach") and not self.is_partitioned():
+            raise CommandError(f"{TABLE} is not partitioned yet; run 'partition_answers convert' first.")
+        try:
+            getattr(self, action)(opts)
+        except DatabaseError as exc:
+            raise CommandError(f"{action} failed: {exc}")
+
+    # ---------- introspection ----------
+
+    def is_partitioned(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass", [TABLE])
+            return cursor.fetchone()[0] == "p"
+
+    def partitions(self):
+        """[(name, low, high, estimated rows)] of the range partitions, lowest first; default excluded."""
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint
+                FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = %s::regclass
+            """, [TABLE])
+            rows = cursor.fetchall()
+        parts = []
+        for name, bound, estimate in rows:
+            match = _BOUNDS.search(bound)
+            if match:
+                parts.append((name, int(match.group(1)), int(match.group(2)), max(estimate, 0)))
+        return sorted(parts, key=lambda p: p[1])
+
+    @staticmethod
+    def newest_exam_id():
+        return Exam.objects.aggregate(m=Max("id"))["m"] or 0
+
+    # ---------- actions ----------
+
+    def status(self, opts):
+        if not self.is_partitioned():
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [TABLE])
+                estimate = max(cursor.fetchone()[0], 0)
+            self.stdout.write(f"{TABLE} is not partitioned (~{estimate} rows).")
+            return
+        self.stdout.write(f"{'partition':<40}{'exam ids':>20}{'rows (est.)':>14}")
+        for name, low, high, estimate in self.partitions():
+            self.stdout.write(f"{name:<40}{f'{low}-{high - 1}':>20}{estimate:>14}")
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {DEFAULT_PARTITION}")
+            stray = cursor.fetchone()[0]
+        self.stdout.write(f"{DEFAULT_PARTITION:<40}{'other':>20}{stray:>14}")
+        if stray:
+            self.stdout.write(self.style.WARNING(
+                "Answers of newer exams are landing in the default partition; run 'partition_answers extend'."))
+
+    def convert(self, opts):
+        """Copy the table into a partitioned one and swap the two in one transaction.
+
+        The old table is held in SHARE mode throughout: exam pages keep reading,
+        answer writes wait until the swap commits. It is kept as
+        <table>_unpartitioned (without foreign keys) until dropped by hand.
+        """
+        if self.is_partitioned():
+            raise CommandError(f"{TABLE} is already partitioned.")
+        size = opts["term_size"]
+        if size < 1:
+            raise CommandError("--term-size must be positive.")
+        if not opts["force"] and open_exams().exists():
+            raise CommandError("Exams are open; answer writes would block until the copy finishes. "
+                               "Run between sittings or pass --force.")
+
+        new = f"{TABLE}_part"
+        top = self.newest_exam_id() + opts["ahead"] * size
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {TABLE} IN SHARE MODE")
+            cursor.execute("""
+                SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint
+                WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'f', 'c')
+            """, [TABLE])
+            constraints = cursor.fetchall()
+            cursor.execute("""
+                SELECT c.relname, pg_get_indexdef(c.oid) FROM pg_index x JOIN pg_class c ON c.oid = x.indexrelid
+                WHERE x.indrelid = %s::regclass
+                  AND NOT EXISTS (SELECT 1 FROM pg_constraint k WHERE k.conindid = x.indexrelid)
+            """, [TABLE])
+            indexes = cursor.fetchall()
+
+            cursor.execute(f"CREATE TABLE {new} (LIKE {TABLE} INCLUDING DEFAULTS) PARTITION BY RANGE (exam_id)")
+            for low in range(0, top + 1, size):
+                cursor.execute(f"CREATE TABLE {TABLE}_e{low} PARTITION OF {new} "
+                               f"FOR VALUES FROM ({low}) TO ({low + size})")
+            cursor.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {new} DEFAULT")
+            cursor.execute(f"INSERT INTO {new} SELECT * FROM {TABLE}")
+            copied = cursor.rowcount
+
+            # free the names, then rebuild keys and indexes on the new table under them
+            for name, kind, _ in constraints:
+                if kind == "f":
+                    cursor.execute(f"ALTER TABLE {TABLE} DROP CONSTRAINT {name}")
+                else:
+                    cursor.execute(f"ALTER TABLE {TABLE} RENAME CONSTRAINT {name} TO {_renamed(name)}")
+            for name, _ in indexes:
+                cursor.execute(f"ALTER INDEX {name} RENAME TO {_renamed(name)}")
+            for name, kind, definition in constraints:
+                if kind == "p":
+                    # a primary key on a partitioned table must include the partition key
+                    definition = "PRIMARY KEY (id, exam_id)"
+                cursor.execute(f"ALTER TABLE {new} ADD CONSTRAINT {name} {definition}")
+            for name, definition in indexes:
+                unique, using = re.match(r"CREATE (UNIQUE )?INDEX \S+ ON (?:ONLY )?\S+ (USING .*)", definition).groups()
+                cursor.execute(f"CREATE {unique or ''}INDEX {name} ON {new} {using}")
+
+            # ids continue from the old table's identity sequence
+            cursor.execute(f"CREATE SEQUENCE {SEQUENCE} OWNED BY {new}.id")
+            cursor.execute(f"SELECT setval('{SEQUENCE}', COALESCE((SELECT max(id) FROM {new}), 0) + 1, false)")
+            cursor.execute(f"ALTER TABLE {new} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')")
+            cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}")
+            cursor.execute(f"ALTER TABLE {new} RENAME TO {TABLE}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{TABLE} partitioned by exam id in blocks of {size} ({copied} answers copied). "
+            f"The previous table is kept as {OLD_TABLE}; drop it once you have checked the new one."))
+
+    def extend(self, opts):
+        """Add empty partitions up to `--ahead` blocks beyond the newest exam."""
+        parts = self.partitions()
+        if not parts:
+            raise CommandError(f"{TABLE} has no range partitions.")
+        size = parts[-1][2] - parts[-1][1]
+        low = parts[-1][2]
+        top = self.newest_exam_id() + opts["ahead"] * size
+        created = []
+        with transaction.atomic(), connection.cursor() as cursor:
+            while low <= top:
+                # fails if the default partition already holds answers in this range
+                cursor.execute(f"CREATE TABLE {TABLE}_e{low} PARTITION OF {TABLE} "
+                               f"FOR VALUES FROM ({low}) TO ({low + size})")
+                created.append(f"{TABLE}_e{low}")
+                low += size
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {', '.join(created)}." if created else "Partitions already cover the upcoming exams."))
+
+    def detach(self, opts):
+        """Detach (metadata only, no rows are touched) the partitions entirely below `--below`."""
+        if opts["below"] is None:
+            raise CommandError("detach needs --below EXAM_ID.")
+        victims = [p for p in self.partitions() if p[2] <= opts["below"]]
+        if not victims:
+            raise CommandError(f"No partition lies entirely below exam id {opts['below']}.")
+        for name, low, high, estimate in victims:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {name}")
+                if opts["drop"]:
+                    cursor.execute(f"DROP TABLE {name}")
+                else:
+                    # a detached term must not stop its attempts being purged later
+                    cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+                                   [name])
+                    for (constraint,) in cursor.fetchall():
+                        cursor.execute(f"ALTER TABLE {name} DROP CONSTRAINT {constraint}")
+            verb = "dropped" if opts["drop"] else "detached"
+            self.stdout.write(f"{name} (exams {low}-{high - 1}, ~{estimate} answers) {verb}")
+        if not opts["drop"]:
+            self.stdout.write("Detached partitions are plain tables now: dump or drop them when done.")
@@ -0,0 +1,87 @@
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from exams import papers
+from exams.models import Exam, StudentExamAttempt
+
+
+class Command(BaseCommand):
+    help = ("Pre-create dormant attempts (paper + question order) for every enrolled student "
+            "of exams opening soon, so the start view only has to stamp the clock.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--within", type=int, default=120, metavar="MINUTES",
+                            help="Provision exams whose opens_at is within the next MINUTES (default 120).")
+        parser.add_argument("--exam", type=int, action="append", dest="exam_ids", metavar="EXAM_ID",
+                            help="Provision these exams regardless of opens_at (repeatable).")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--prune", action="store_true",
+                            help="Also delete dormant attempts left on exams that have closed.")
+
+    def handle(self, *args, **opts):
+        User = get_user_model()
+        now = timezone.now()
+        batch_size = opts["batch_size"]
+
+        exams = Exam.objects.filter(is_active=True)
+        if opts["exam_ids"]:
+            exams = exams.filter(id__in=opts["exam_ids"])
+        else:
+            exams = exams.filter(opens_at__gt=now, opens_at__lte=now + timedelta(minutes=opts["within"]))
+
+        total = 0
+        for exam in exams:
+            # compiling here also means nobody pays for it at opens_at
+            paper_id = papers.current_paper_id(exam)
+            if not papers.get_paper(paper_id)["order"]:
+                self.stdout.write(self.style.WARNING(f"[skip] {exam.title}: no questions"))
+                continue
+
+            already = StudentExamAttempt.objects.filter(exam=exam).values("student_id")
+            student_ids = (User.objects
+                           .filter(role="student", modules=exam.module_id)
+                           .exclude(id__in=already)
+                           .order_by("id")
+                           .values_list("id", flat=True))
+
+            created = 0
+            batch = []
+            for student_id in student_ids.iterator(chunk_size=batch_size):
+                batch.append(StudentExamAttempt(
+                    student_id=student_id, exam=exam, completed=False,
+                    paper_id=paper_id, **papers.new_order_fields(paper_id),
+                ))
+                if len(batch) >= batch_size:
+                    created += self.insert(exam, batch)
+                    batch = []
+            if batch:
+                created += self.insert(exam, batch)
+
+            total += created
+            self.stdout.write(self.style.SUCCESS(f"[OK] {exam.title}: {created} dormant attempts"))
+
+        if opts["prune"]:
+            pruned, _ = (StudentExamAttempt.objects
+                         .dormant()
+                         .filter(exam__closes_at__lte=now)
+                         .delete())
+            self.stdout.write(f"Pruned {pruned} unused dormant attempts on closed exams.")
+
+        self.stdout.write(self.style.SUCCESS(f"Provisioning done. Created {total} attempts."))
+
+    @staticmethod
+    def insert(exam, batch):
+        """Create the batch's dormant attempts; returns how many were actually created.
+
+        A student may start the exam between the lookup above and this insert
+        (--exam runs even after opens_at); uniq_open_attempt then rejects our
+        row and the student keeps the attempt they started.
+        """
+        StudentExamAttempt.objects.bulk_create(batch, ignore_conflicts=True)
+        # a started attempt has its clock set, so the dormant rows are ours
+        return (StudentExamAttempt.objects
+                .dormant()
+                .filter(exam=exam, student_id__in=[a.student_id for a in batch])
+                .count())
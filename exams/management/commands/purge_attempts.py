@@ -0,0 +1,87 @@
+from datetime import datetime, time as dtime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from accounts.models import Module
+from exams import purge
+from exams.models import StudentAnswer
+
+
+class Command(BaseCommand):
+    help = ("Delete attempts and their answers in small batches (short transactions, bounded memory), "
+            "scoped by exam, module or start date. --truncate empties everything at once when no exam is open.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--exam", type=int, action="append", dest="exam_ids", metavar="EXAM_ID",
+                            help="Only attempts of these exams (repeatable).")
+        parser.add_argument("--module", action="append", dest="modules", metavar="CODE",
+                            help="Only attempts of exams in these modules, by code (repeatable).")
+        parser.add_argument("--before", metavar="DATE",
+                            help="Only attempts started before this date or datetime (ISO 8601).")
+        parser.add_argument("--all", action="store_true",
+                            help="Purge every attempt; required when no scope is given.")
+        parser.add_argument("--batch-size", type=int, default=1000,
+                            help="Attempts deleted per transaction (default 1000).")
+        parser.add_argument("--pause", type=float, default=0.0, metavar="SECONDS",
+                            help="Sleep between batches to leave room for live traffic (default 0).")
+        parser.add_argument("--truncate", action="store_true",
+                            help="With --all on PostgreSQL: TRUNCATE instead of batched deletes. "
+                                 "Refused while any exam is open.")
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be deleted.")
+
+    def handle(self, *args, **opts):
+        scoped = opts["exam_ids"] or opts["modules"] or opts["before"]
+        if not scoped and not opts["all"]:
+            raise CommandError("Give --exam, --module or --before to scope the purge, or --all.")
+        if opts["truncate"] and (scoped or not opts["all"]):
+            raise CommandError("--truncate only applies to --all without other scopes.")
+
+        module_ids = None
+        if opts["modules"]:
+            found = dict(Module.objects.filter(code__in=opts["modules"]).values_list("code", "id"))
+            missing = set(opts["modules"]) - set(found)
+            if missing:
+                raise CommandError(f"Unknown module code(s): {', '.join(sorted(missing))}")
+            module_ids = list(found.values())
+        attempts = purge.scoped_attempts(opts["exam_ids"], module_ids, self.parse_before(opts["before"]))
+
+        if opts["dry_run"]:
+            n_attempts = attempts.count()
+            n_answers = StudentAnswer.objects.filter(attempt__in=attempts).count()
+            self.stdout.write(f"Would delete {n_attempts} attempts and {n_answers} answers.")
+            return
+
+        if opts["truncate"]:
+            if connection.vendor != "postgresql":
+                raise CommandError("--truncate needs PostgreSQL; drop it to delete in batches.")
+            if purge.open_exams().exists():
+                raise CommandError("An exam is open right now; TRUNCATE would lock students out. "
+                                   "Drop --truncate to delete in batches.")
+            seconds = purge.truncate_attempts()
+            self.stdout.write(self.style.SUCCESS(f"Truncated attempts and answers in {seconds:.2f}s."))
+            return
+
+        report = purge.purge_attempts(
+            attempts, batch_size=opts["batch_size"], pause=opts["pause"],
+            on_batch=lambda a, n: self.stdout.write(f"  … {a} attempts, {n} answers deleted"),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {report.attempts} attempts and {report.answers} answers in {report.seconds:.2f}s."
+        ))
+
+    @staticmethod
+    def parse_before(value):
+        if not value:
+            return None
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                raise CommandError(f"--before: '{value}' is not an ISO date or datetime.")
+            moment = datetime.combine(day, dtime.min)
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return moment
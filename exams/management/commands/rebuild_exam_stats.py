@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from exams import stats
+from exams.models import Exam
+
+
+class Command(BaseCommand):
+    help = ("Recompute the materialized statistics (ExamStats and the per-question "
+            "ExamQuestionStats counters) from the attempts and answers tables.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--exam", type=int, action="append", dest="exam_ids", metavar="EXAM_ID",
+                            help="Only rebuild these exams (repeatable). Default: all exams.")
+        parser.add_argument("--batch-size", type=int, default=500,
+                            help="Exams recomputed per grouped query (default 500).")
+
+    def handle(self, *args, **opts):
+        exam_ids = opts["exam_ids"] or list(Exam.objects.order_by("id").values_list("id", flat=True))
+        size = opts["batch_size"]
+        for start in range(0, len(exam_ids), size):
+            stats.rebuild(exam_ids[start:start + size])
+        for exam_id in exam_ids:
+            stats.rebuild_question_stats(exam_id)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt statistics for {len(exam_ids)} exams."))
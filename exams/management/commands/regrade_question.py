@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from exams.grading import regrade_question
+from questions.models import Question
+
+
+class Command(BaseCommand):
+    help = "Re-mark stored answers against the current answer key and rescore affected attempts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("question_ids", nargs="+", type=int)
+
+    def handle(self, *args, **opts):
+        for qid in opts["question_ids"]:
+            question = Question.objects.filter(pk=qid).first()
+            if question is None:
+                raise CommandError(f"Question {qid} does not exist.")
+            report = regrade_question(question)
+            self.stdout.write(self.style.SUCCESS(
+                f"[Q{qid}] {report.answers_changed} answers re-marked, "
+                f"{report.attempts_rescored} attempts rescored in {report.seconds}s."
+            ))
@@ -1,10 +1,14 @@
 from django.core.management.base import BaseCommand
-from exams.models import StudentExamAttempt, StudentAnswer
+from exams import purge
+from exams.models import ExamQuestionStats, ExamStats, StudentExamAttempt
 
 class Command(BaseCommand):
     help = "Clear all student attempts and answers (for reseeding)."
 
     def handle(self, *args, **options):
-        StudentAnswer.objects.all().delete()
-        StudentExamAttempt.objects.all().delete()
-        self.stdout.write(self.style.SUCCESS("✅ Cleared all student attempts and answers"))
\ No newline at end of file
+        # batched, so large tables are not loaded into memory (see exams/purge.py)
+        purge.purge_attempts(StudentExamAttempt.objects.all(), refresh_stats=False)
+        ExamStats.objects.all().delete()  # recomputed on next read
+        ExamQuestionStats.objects.update(answered=0, correct=0, pick_a=0, pick_b=0, pick_c=0, pick_d=0,
+                                         pick_true=0, pick_false=0)
+        self.stdout.write(self.style.SUCCESS("✅ Cleared all student attempts and answers"))
@@ -4,6 +4,7 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 
+from exams import stats
 from exams.models import Exam, ExamQuestion, StudentExamAttempt, StudentAnswer
 
 class Command(BaseCommand):
@@ -82,7 +83,7 @@ class Command(BaseCommand):
                                 correct_count += 1
 
                             StudentAnswer.objects.update_or_create(
-                                attempt=attempt, question=q,
+                                attempt=attempt, exam=exam, question=q,
                                 defaults={"selected_answer": pick, "is_correct": is_corr}
                             )
 
@@ -153,7 +154,7 @@ class Command(BaseCommand):
 
                             StudentAnswer.objects.update_or_create(
 
-                                attempt=attempt, question=q,
+                                attempt=attempt, exam=exam, question=q,
 
                                 defaults={"selected_answer": pick, "is_correct": is_corr}
 
@@ -174,7 +175,8 @@ class Command(BaseCommand):
 
                             student=stu, exam=exam,
 
-                            defaults={"completed": False, "started_at": now}
+                            defaults={"completed": False, "started_at": now,
+                                      "ends_at": now + timedelta(minutes=exam.duration_minutes)}
 
                         )
 
@@ -182,6 +184,12 @@ class Command(BaseCommand):
 
                 open_count += 1
 
+        # attempts were written directly, so recompute the per-exam totals
+        exam_ids = list(Exam.objects.values_list('id', flat=True))
+        stats.rebuild(exam_ids)
+        for exam_id in exam_ids:
+            stats.rebuild_question_stats(exam_id)
+
         self.stdout.write(self.style.SUCCESS(
             f"Attempts seeded. Closed exams graded: {closed_count}, open exams in-progress updated: {open_count}"
         ))
\ No newline at end of file
@@ -0,0 +1,332 @@
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from exams.models import Exam, ExamQuestion
+
+STEPS = ("login", "start", "question", "submit")
+ANSWERS = ("a", "b", "c", "d", "True", "False", "42")
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Report 3xx responses as they are, like the test client does."""
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def arrival_plan(profile, students, window):
+    """[(arrival offset in seconds, paced to the deadline?)] per virtual student.
+
+    burst      everyone arrives in the first few percent of the window (exam opens)
+    steady     arrivals spread evenly over the window
+    deadline   arrivals over the first half, each student pacing answers so
+               submissions pile up at the end of the window
+    """
+    plan = []
+    for _ in range(students):
+        if profile == "burst":
+            plan.append((min(random.expovariate(1 / (0.02 * window)), window), False))
+        elif profile == "steady":
+            plan.append((random.uniform(0, window), False))
+        else:
+            plan.append((random.uniform(0, window / 2), True))
+    return plan
+
+
+def process_tree_rss(pid):
+    """Resident memory in bytes of `pid` and all its descendants (Linux /proc)."""
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # the command name may contain spaces; fields resume after its ')'
+                parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    tree, frontier = {pid}, [pid]
+    while frontier:
+        parent = frontier.pop()
+        children = [child for child, ppid in parents.items() if ppid == parent]
+        tree.update(children)
+        frontier.extend(children)
+    total = 0
+    for member in tree:
+        try:
+            with open(f"/proc/{member}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            continue
+    return total
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Command(BaseCommand):
+    help = ("Drive the exam-taking flow (login, start, one POST per question, submit) with many "
+            "concurrent virtual students against a running server and report throughput, "
+            "latency percentiles and error rates per step.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--exam", type=int, required=True, help="Exam to sit; must be open.")
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000",
+                            help="Server under test (default http://127.0.0.1:8000).")
+        parser.add_argument("--students", type=int, default=100, help="Virtual students (default 100).")
+        parser.add_argument("--arrival", choices=("burst", "steady", "deadline"), default="burst",
+                            help="Arrival curve (default burst at opens_at).")
+        parser.add_argument("--window", type=float, default=60.0, metavar="SECONDS",
+                            help="Seconds over which students arrive / must submit (default 60).")
+        parser.add_argument("--think", type=float, default=1.0, metavar="SECONDS",
+                            help="Mean pause between answers for burst/steady (default 1).")
+        parser.add_argument("--password", default="Stu1234!",
+                            help="Password shared by the virtual students (default the seeders' Stu1234!).")
+        parser.add_argument("--create-students", action="store_true",
+                            help="Create missing load-test students (load00001, ...) enrolled in the exam's module.")
+        parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds.")
+        parser.add_argument("--server-pid", type=int, metavar="PID",
+                            help="Sample the resident memory of this server process and its workers (same "
+                                 "host, Linux) and report peak memory per concurrent student.")
+
+    def handle(self, *args, **opts):
+        try:
+            exam = Exam.objects.select_related("module").get(pk=opts["exam"])
+        except Exam.DoesNotExist:
+            raise CommandError(f"Exam {opts['exam']} does not exist.")
+        if not exam.is_open_now():
+            raise CommandError(f"'{exam.title}' is not open; the server would turn every student away.")
+        n_questions = ExamQuestion.objects.filter(exam=exam).count()
+        if not n_questions:
+            raise CommandError(f"'{exam.title}' has no questions.")
+
+        usernames = self.students(exam, opts["students"], opts["password"], opts["create_students"])
+        self.base_url = opts["base_url"].rstrip("/")
+        self.timeout = opts["timeout"]
+        self.exam = exam
+        self.n_questions = n_questions
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_samples = []
+        self.finished = 0
+        self.active = self.peak_active = 0
+        self.peak_rss = self.base_rss = None
+        if opts["server_pid"] is not None:
+            if not os.path.exists(f"/proc/{opts['server_pid']}"):
+                raise CommandError(f"No process {opts['server_pid']} on this host.")
+            self.base_rss = self.peak_rss = process_tree_rss(opts["server_pid"])
+
+        plan = arrival_plan(opts["arrival"], len(usernames), opts["window"])
+        self.stdout.write(f"{len(usernames)} students, {n_questions} questions, {opts['arrival']} arrivals "
+                          f"over {opts['window']:.0f}s against {self.base_url}")
+
+        started = time.monotonic()
+        deadline = started + opts["window"]
+        done = threading.Event()
+        if opts["server_pid"] is not None:
+            threading.Thread(target=self.sample_memory, args=(opts["server_pid"], done), daemon=True).start()
+        with ThreadPoolExecutor(max_workers=len(usernames)) as pool:
+            for username, (offset, pace) in zip(usernames, plan):
+                pool.submit(self.sit_exam, username, opts["password"], started + offset,
+                            deadline if pace else None, opts["think"])
+        elapsed = time.monotonic() - started
+        done.set()
+        self.report(elapsed)
+
+    def students(self, exam, count, password, create):
+        """Usernames of `count` students enrolled in the exam's module."""
+        User = get_user_model()
+        enrolled = list(User.objects
+                        .filter(role="student", modules=exam.module_id)
+                        .order_by("username")
+                        .values_list("username", flat=True)[:count])
+        if len(enrolled) < count and create:
+            # one hash for everyone; hashing per user would dominate the setup
+            hashed = make_password(password)
+            existing = set(User.objects.filter(username__startswith="load").values_list("username", flat=True))
+            new = [f"load{n:05d}" for n in range(1, 100000) if f"load{n:05d}" not in existing]
+            new = new[:count - len(enrolled)]
+            User.objects.bulk_create([User(username=u, role="student", password=hashed) for u in new],
+                                     batch_size=1000)
+            exam.module.students.add(*User.objects.filter(username__in=new))
+            enrolled += new
+        if len(enrolled) < count:
+            self.stdout.write(self.style.WARNING(
+                f"Only {len(enrolled)} students are enrolled in {exam.module.code}; "
+                f"use --create-students for more."))
+        if not enrolled:
+            raise CommandError("No students to simulate.")
+        return enrolled
+
+    # ---------- one virtual student ----------
+
+    def sit_exam(self, username, password, arrive_at, submit_by, think):
+        time.sleep(max(0.0, arrive_at - time.monotonic()))
+        with self.lock:
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+        try:
+            self.take_exam(username, password, submit_by, think)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+    def sample_memory(self, pid, done, interval=0.5):
+        while not done.wait(interval):
+            rss = process_tree_rss(pid)
+            with self.lock:
+                self.peak_rss = max(self.peak_rss, rss)
+
+    def take_exam(self, username, password, submit_by, think):
+        jar = CookieJar()
+        opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar), _NoRedirect)
+        try:
+            self.request(opener, jar, "login", "GET", reverse("login"), record=False)
+            status, location, _ = self.request(opener, jar, "login", "POST", reverse("login"),
+                                               {"username": username, "password": password})
+            if status != 302 or reverse("login") in location:
+                return self.fail("login", f"{username}: login rejected ({status})")
+
+            status, location, _ = self.request(opener, jar, "start", "POST",
+                                               reverse("take_exam_start", args=[self.exam.id]))
+            taking = (reverse("take_exam_question", args=[self.exam.id, 0]).rsplit("/", 2)[0],
+                      reverse("take_exam_paper", args=[self.exam.id]))
+            if status != 302 or not any(path in location for path in taking):
+                # e.g. sent to the result page: this student already sat the exam
+                return self.fail("start", f"{username}: start returned {status} {location}")
+
+            if self.exam.delivery_mode == "single":
+                ok = self.answer_paper(opener, jar, submit_by, think)
+            else:
+                ok = self.answer_pages(opener, jar, submit_by, think)
+            if not ok:
+                return
+
+            status, location, _ = self.request(opener, jar, "submit", "POST",
+                                               reverse("submit_exam", args=[self.exam.id]))
+            if status != 302 or "result" not in location:
+                return self.fail("submit", f"{username}: submit returned {status} {location}")
+            with self.lock:
+                self.finished += 1
+        except Exception as exc:  # keep the other students going
+            self.fail("error", f"{username}: {exc!r}")
+
+    def pause(self, remaining, submit_by, think):
+        if submit_by is not None:
+            # spread the remaining answers so the last one lands just before the deadline
+            time.sleep(max(0.0, (submit_by - time.monotonic()) / (remaining + 1)) * random.uniform(0.8, 1.0))
+        elif think > 0:
+            time.sleep(random.expovariate(1 / think))
+
+    def answer_pages(self, opener, jar, submit_by, think):
+        for index in range(self.n_questions):
+            self.pause(self.n_questions - index, submit_by, think)
+            last = index == self.n_questions - 1
+            data = {"answer": random.choice(ANSWERS), ("submit" if last else "next"): "1"}
+            status, _, _ = self.request(opener, jar, "question", "POST",
+                                        reverse("take_exam_question", args=[self.exam.id, index]), data)
+            if status != 302:
+                return self.fail("question", f"question {index} returned {status}")
+        return True
+
+    def answer_paper(self, opener, jar, submit_by, think):
+        # single-page delivery: load the paper once, then autosave one answer at a time
+        status, _, body = self.request(opener, jar, "question", "GET",
+                                       reverse("take_exam_paper", args=[self.exam.id]))
+        question_ids = re.findall(r'name="q-(\d+)"', body)
+        if status != 200 or not question_ids:
+            return self.fail("question", f"paper returned {status}")
+        for n, qid in enumerate(dict.fromkeys(question_ids)):
+            self.pause(len(question_ids) - n, submit_by, think)
+            status, _, _ = self.request(opener, jar, "question", "POST",
+                                        reverse("sync_answers", args=[self.exam.id]),
+                                        json_body={"answers": {qid: random.choice(ANSWERS)}})
+            if status != 200:
+                return self.fail("question", f"sync returned {status}")
+        return True
+
+    def request(self, opener, jar, step, method, path, data=None, json_body=None, record=True):
+        """(status, Location header, body text) of one request, timed under `step`."""
+        csrf = next((c.value for c in jar if c.name == "csrftoken"), "")
+        headers = {"X-CSRFToken": csrf, "Referer": self.base_url + path}
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers["Content-Type"] = "application/json"
+        elif method == "POST":
+            body = urllib.parse.urlencode({**(data or {}), "csrfmiddlewaretoken": csrf}).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        req = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+
+        start = time.perf_counter()
+        try:
+            with opener.open(req, timeout=self.timeout) as resp:
+                status, location, text = resp.status, resp.headers.get("Location", ""), resp.read().decode()
+        except urllib.error.HTTPError as exc:
+            status, location, text = exc.code, exc.headers.get("Location", ""), ""
+        elapsed = time.perf_counter() - start
+        if record:
+            with self.lock:
+                self.latencies[step].append(elapsed)
+        return status, location, text
+
+    def fail(self, step, detail):
+        with self.lock:
+            self.errors[step] += 1
+            if len(self.error_samples) < 10:
+                self.error_samples.append(detail)
+        return False
+
+    # ---------- report ----------
+
+    def report(self, elapsed):
+        total = sum(len(v) for v in self.latencies.values())
+        self.stdout.write(f"\nfinished {self.finished} exams in {elapsed:.1f}s; "
+                          f"{total} requests, {total / elapsed:.1f} req/s\n")
+        self.stdout.write(f"{'step':<10}{'requests':>10}{'req/s':>9}{'errors':>8}{'err %':>8}"
+                          f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for step in STEPS:
+            values = sorted(self.latencies[step])
+            errors = self.errors[step]
+            attempts = len(values) or errors
+            pcts = [percentile(values, p) for p in (50, 95, 99, 100)]
+            cells = "".join(f"{v * 1000:>10.1f}" if v is not None else f"{'-':>10}" for v in pcts)
+            err_pct = 100 * errors / attempts if attempts else 0
+            self.stdout.write(f"{step:<10}{len(values):>10}{len(values) / elapsed:>9.1f}{errors:>8}"
+                              f"{err_pct:>7.1f}%{cells}")
+        if self.peak_rss is not None:
+            mib = 1024 * 1024
+            per_student = (self.peak_rss - self.base_rss) / max(self.peak_active, 1)
+            self.stdout.write(f"\nserver memory: {self.base_rss / mib:.0f} MiB idle, {self.peak_rss / mib:.0f} MiB peak "
+                              f"with {self.peak_active} students in flight; "
+                              f"{per_student / 1024:.0f} KiB per concurrent student")
+        if self.errors["error"]:
+            self.stdout.write(self.style.WARNING(f"{self.errors['error']} students hit connection errors"))
+        if self.error_samples:
+            self.stdout.write("\nfirst errors:")
+            for detail in self.error_samples:
+                self.stdout.write(f"  {detail}")
@@ -0,0 +1,295 @@
+"""
+Per-view request metrics: latency, DB query count, DB time and template
+render time, exposed in the Prometheus text format at /staff/metrics/.
+
+Wiring (config/settings.py):
+
+    MIDDLEWARE          exams.metrics.RequestMetricsMiddleware
+    TEMPLATES BACKEND   exams.metrics.InstrumentedDjangoTemplates
+    METRICS_SAMPLE_RATE share of requests to measure (0 disables everything)
+
+With a sample rate of 0 the middleware removes itself at startup
+(MiddlewareNotUsed) and the template backend only checks an unset context
+variable, so there is no per-request cost. Otherwise every database
+connection gets an ``execute_wrapper`` as it is opened, which adds each
+query and its time to the sample of the request it runs for. The sample
+lives in a context variable, so it follows the request into the
+``sync_to_async`` threads where the async views (exams/views_async.py)
+run their queries; the middleware itself runs sync or async to match the
+handler. Samples are recorded into in-process histograms keyed by URL name.
+
+Each worker publishes a cumulative snapshot of its histograms to the cache
+at most every METRICS_PUBLISH_SECONDS (under a slot number taken from a
+shared counter); the metrics view adds all live snapshots up, so the
+output covers every worker that shares the cache.
+"""
+import contextvars
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates
+
+WORKER_COUNTER_KEY = 'exams:metrics:workers'
+WORKER_SNAPSHOT_KEY = 'exams:metrics:worker:{slot}'
+# a snapshot outlives its worker by this long, then drops out of the totals
+SNAPSHOT_TIMEOUT = 24 * 60 * 60
+
+# metric name -> (help text, bucket upper bounds)
+METRICS = {
+    'request_latency_seconds': (
+        'Time from middleware entry to response, per view.',
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)),
+    'db_queries': (
+        'Database queries executed per request, per view.',
+        (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)),
+    'db_time_seconds': (
+        'Time spent in database queries per request, per view.',
+        (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)),
+    'template_render_seconds': (
+        'Time spent rendering templates per request, per view.',
+        (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)),
+}
+PREFIX = 'exam_'
+
+_current = contextvars.ContextVar('exams_metrics_sample', default=None)
+
+
+class _Sample:
+    __slots__ = ('queries', 'db_time', 'template_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+
+
+def _record_query(execute, sql, params, many, context):
+    """execute_wrapper hook: time the query into the sample of the request it runs for."""
+    sample = _current.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sample.queries += 1
+        sample.db_time += time.perf_counter() - start
+
+
+def _wrap(connection):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def _wrap_new_connection(sender, connection, **kwargs):
+    _wrap(connection)
+
+
+def _wrap_open_connections():
+    # this thread's connections opened before the middleware was loaded
+    for conn in connections.all(initialized_only=True):
+        _wrap(conn)
+
+
+class Registry:
+    """Cumulative histograms of this process: {(metric, view): [bucket counts..., sum, count]}."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+        self._slot = None
+        self._published_at = 0.0
+
+    def observe(self, view, values):
+        with self._lock:
+            for metric, value in values.items():
+                bounds = METRICS[metric][1]
+                row = self._data.get((metric, view))
+                if row is None:
+                    row = self._data[(metric, view)] = [0] * (len(bounds) + 2)
+                for i, bound in enumerate(bounds):
+                    if value <= bound:
+                        row[i] += 1
+                        break
+                row[-2] += value
+                row[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {key: list(row) for key, row in self._data.items()}
+
+    def reset(self):
+        with self._lock:
+            self._data.clear()
+
+    def due(self):
+        return time.monotonic() - self._published_at >= settings.METRICS_PUBLISH_SECONDS
+
+    def publish(self, force=False):
+        """Write this worker's snapshot to the cache (at most every METRICS_PUBLISH_SECONDS)."""
+        if not force and not self.due():
+            return
+        self._published_at = time.monotonic()
+        # (re)claim a slot on first publish and whenever the counter was lost
+        if cache.add(WORKER_COUNTER_KEY, 0, None) or self._slot is None:
+            self._slot = cache.incr(WORKER_COUNTER_KEY)
+        cache.set(WORKER_SNAPSHOT_KEY.format(slot=self._slot),
+                  {'pid': os.getpid(), 'data': self.snapshot()}, SNAPSHOT_TIMEOUT)
+
+
+registry = Registry()
+
+
+def collect():
+    """Histograms summed over every worker snapshot still in the cache."""
+    registry.publish(force=True)
+    workers = cache.get(WORKER_COUNTER_KEY) or 0
+    keys = [WORKER_SNAPSHOT_KEY.format(slot=slot) for slot in range(1, workers + 1)]
+    totals = {}
+    for snap in cache.get_many(keys).values():
+        for key, row in snap['data'].items():
+            if key not in totals:
+                totals[key] = list(row)
+            else:
+                totals[key] = [a + b for a, b in zip(totals[key], row)]
+    return totals
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_text(totals):
+    """Prometheus text exposition (version 0.0.4) of collected histograms."""
+    by_metric = defaultdict(list)
+    for (metric, view), row in sorted(totals.items()):
+        by_metric[metric].append((view, row))
+
+    lines = [
+        f'# HELP {PREFIX}metrics_sample_rate Share of requests that are measured.',
+        f'# TYPE {PREFIX}metrics_sample_rate gauge',
+        f'{PREFIX}metrics_sample_rate {_number(float(settings.METRICS_SAMPLE_RATE))}',
+    ]
+    for metric, (help_text, bounds) in METRICS.items():
+        name = PREFIX + metric
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for view, row in by_metric.get(metric, []):
+            view = _label(view)
+            cumulative = 0
+            for bound, n in zip(bounds, row):
+                cumulative += n
+                lines.append(f'{name}_bucket{{view="{view}",le="{_number(bound)}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{view="{view}",le="+Inf"}} {row[-1]}')
+            lines.append(f'{name}_sum{{view="{view}"}} {_number(row[-2])}')
+            lines.append(f'{name}_count{{view="{view}"}} {row[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.rate = float(getattr(settings, 'METRICS_SAMPLE_RATE', 0))
+        if self.rate <= 0:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        connection_created.connect(_wrap_new_connection, dispatch_uid='exams.metrics')
+
+    def _sampled(self):
+        return self.rate >= 1 or random.random() < self.rate
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self._sampled():
+            return self.get_response(request)
+
+        _wrap_open_connections()
+        sample = _Sample()
+        token = _current.set(sample)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._record(request, sample, time.perf_counter() - start)
+        registry.publish()
+        return response
+
+    async def __acall__(self, request):
+        if not self._sampled():
+            return await self.get_response(request)
+
+        # connections are per thread: wrap those of the thread the view's
+        # sync_to_async calls run in, not the event loop's
+        await sync_to_async(_wrap_open_connections)()
+        sample = _Sample()
+        token = _current.set(sample)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._record(request, sample, time.perf_counter() - start)
+        if registry.due():
+            # a cache write: keep it off the event loop
+            await sync_to_async(registry.publish, thread_sensitive=False)()
+        return response
+
+    def _record(self, request, sample, elapsed):
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        registry.observe(view, {
+            'request_latency_seconds': elapsed,
+            'db_queries': sample.queries,
+            'db_time_seconds': sample.db_time,
+            'template_render_seconds': sample.template_time,
+        })
+
+
+class _TimedTemplate:
+    """Wraps a backend template so top-level renders add to the request's sample."""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        sample = _current.get()
+        if sample is None:
+            return self.template.render(context, request)
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            sample.template_time += time.perf_counter() - start
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates backend whose templates report render time to RequestMetricsMiddleware."""
+
+    def from_string(self, template_code):
+        return _TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _TimedTemplate(super().get_template(template_name))
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0005_studentexamattempt_question_order'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamPaper',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('checksum', models.CharField(max_length=64)),
+                ('content', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='papers', to='exams.exam')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='studentexamattempt',
+            name='paper',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.RESTRICT, to='exams.exampaper'),
+        ),
+        migrations.AddConstraint(
+            model_name='exampaper',
+            constraint=models.UniqueConstraint(fields=('exam', 'version'), name='uniq_exam_paper_version'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0006_exampaper_studentexamattempt_paper_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='delivery_mode',
+            field=models.CharField(choices=[('paged', 'One question per page'), ('single', 'All questions on one page')], default='paged', max_length=10),
+        ),
+    ]
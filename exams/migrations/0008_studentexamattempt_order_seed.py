@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0007_exam_delivery_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentexamattempt',
+            name='order_seed',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:23
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+
+
+def remove_duplicates(apps, schema_editor):
+    """Drop rows the new unique constraints would reject (left by concurrent requests)."""
+    ExamQuestion = apps.get_model('exams', 'ExamQuestion')
+    StudentAnswer = apps.get_model('exams', 'StudentAnswer')
+    StudentExamAttempt = apps.get_model('exams', 'StudentExamAttempt')
+
+    def dedupe(qs, fields, keep):
+        groups = (qs.values(*fields)
+                  .annotate(n=Count('id'), keep_id=keep('id'))
+                  .filter(n__gt=1))
+        for group in groups:
+            (qs.filter(**{f: group[f] for f in fields})
+             .exclude(id=group['keep_id'])
+             .delete())
+
+    dedupe(ExamQuestion.objects.all(), ['exam_id', 'question_id'], Min)
+    # the latest write is the answer the student last gave
+    dedupe(StudentAnswer.objects.all(), ['attempt_id', 'question_id'], Max)
+    # the first in-progress attempt is the one the exam pages have been using
+    dedupe(StudentExamAttempt.objects.filter(completed=False), ['student_id', 'exam_id'], Min)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0008_studentexamattempt_order_seed'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='studentanswer',
+            index=models.Index(fields=['question', 'is_correct'], name='answer_question_correct_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentexamattempt',
+            index=models.Index(fields=['student', 'exam', 'completed'], name='attempt_student_exam_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentexamattempt',
+            index=models.Index(condition=models.Q(('completed', False)), fields=['ends_at'], name='attempt_open_ends_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='examquestion',
+            constraint=models.UniqueConstraint(fields=('exam', 'question'), name='uniq_exam_question'),
+        ),
+        migrations.AddConstraint(
+            model_name='studentanswer',
+            constraint=models.UniqueConstraint(fields=('attempt', 'question'), name='uniq_attempt_answer'),
+        ),
+        migrations.AddConstraint(
+            model_name='studentexamattempt',
+            constraint=models.UniqueConstraint(condition=models.Q(('completed', False)), fields=('student', 'exam'), name='uniq_open_attempt'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0009_hot_table_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamStats',
+            fields=[
+                ('exam', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='exams.exam')),
+                ('attempts_total', models.PositiveIntegerField(default=0)),
+                ('attempts_completed', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0)),
+                ('score_sq_sum', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
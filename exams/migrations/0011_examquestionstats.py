@@ -0,0 +1,71 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:28
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import Lower, Trim
+import django.db.models.deletion
+
+# exams.stats.PICK_COLUMNS as of this migration
+PICK_COLUMNS = {
+    'MCQ': {'a': 'pick_a', 'b': 'pick_b', 'c': 'pick_c', 'd': 'pick_d'},
+    'TF': {'true': 'pick_true', 'false': 'pick_false'},
+}
+
+
+def backfill_question_stats(apps, schema_editor):
+    """Count the answers already given to every linked question (rebuild_question_stats
+    for each exam, against the tables as they are at this migration)."""
+    ExamQuestion = apps.get_model('exams', 'ExamQuestion')
+    ExamQuestionStats = apps.get_model('exams', 'ExamQuestionStats')
+    StudentAnswer = apps.get_model('exams', 'StudentAnswer')
+    pick_counts = {
+        col: Count('id', filter=Q(question__question_type=qtype, picked=value))
+        for qtype, cols in PICK_COLUMNS.items() for value, col in cols.items()
+    }
+    counts = {
+        (row['attempt__exam_id'], row['question_id']): row
+        for row in (StudentAnswer.objects
+                    .annotate(picked=Lower(Trim('selected_answer')))
+                    .values('attempt__exam_id', 'question_id')
+                    .annotate(answered=Count('id'), correct=Count('id', filter=Q(is_correct=True)), **pick_counts))
+    }
+    columns = ['answered', 'correct', *pick_counts]
+    pairs = set(ExamQuestion.objects.values_list('exam_id', 'question_id'))
+    ExamQuestionStats.objects.bulk_create(
+        [ExamQuestionStats(exam_id=exam_id, question_id=question_id,
+                           **{col: counts.get((exam_id, question_id), {}).get(col, 0) for col in columns})
+         for exam_id, question_id in sorted(pairs)],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0002_question_module'),
+        ('exams', '0010_examstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamQuestionStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('answered', models.IntegerField(default=0)),
+                ('correct', models.IntegerField(default=0)),
+                ('pick_a', models.IntegerField(default=0)),
+                ('pick_b', models.IntegerField(default=0)),
+                ('pick_c', models.IntegerField(default=0)),
+                ('pick_d', models.IntegerField(default=0)),
+                ('pick_true', models.IntegerField(default=0)),
+                ('pick_false', models.IntegerField(default=0)),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_stats', to='exams.exam')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='questions.question')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='examquestionstats',
+            constraint=models.UniqueConstraint(fields=('exam', 'question'), name='uniq_exam_question_stats'),
+        ),
+        migrations.RunPython(backfill_question_stats, migrations.RunPython.noop),
+    ]
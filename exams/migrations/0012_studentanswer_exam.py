@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:40
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+import django.db.models.deletion
+
+BATCH = 50_000
+
+
+def copy_exam_ids(apps, schema_editor):
+    """Fill studentanswer.exam_id from its attempt, one id range per statement."""
+    StudentAnswer = apps.get_model('exams', 'StudentAnswer')
+    StudentExamAttempt = apps.get_model('exams', 'StudentExamAttempt')
+    last = StudentAnswer.objects.aggregate(m=Max('id'))['m'] or 0
+    exam_of_attempt = StudentExamAttempt.objects.filter(pk=OuterRef('attempt_id')).values('exam_id')[:1]
+    for low in range(0, last, BATCH):
+        (StudentAnswer.objects
+         .filter(id__gt=low, id__lte=low + BATCH, exam_id__isnull=True)
+         .update(exam_id=Subquery(exam_of_attempt)))
+
+
+class Migration(migrations.Migration):
+    # the backfill commits per batch instead of holding one long transaction
+    atomic = False
+
+    dependencies = [
+        ('exams', '0011_examquestionstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentanswer',
+            name='exam',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='exams.exam'),
+        ),
+        migrations.RunPython(copy_exam_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='studentanswer',
+            name='exam',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='exams.exam'),
+        ),
+        migrations.RemoveConstraint(
+            model_name='studentanswer',
+            name='uniq_attempt_answer',
+        ),
+        migrations.AddConstraint(
+            model_name='studentanswer',
+            constraint=models.UniqueConstraint(fields=('exam', 'attempt', 'question'), name='uniq_exam_attempt_answer'),
+        ),
+    ]
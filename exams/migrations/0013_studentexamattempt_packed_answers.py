@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0012_studentanswer_exam'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentexamattempt',
+            name='packed_answers',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
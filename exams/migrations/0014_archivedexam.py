@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 22:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_alter_customuser_managers_alter_customuser_role'),
+        ('exams', '0013_studentexamattempt_packed_answers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedExam',
+            fields=[
+                ('exam_id', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=200)),
+                ('opens_at', models.DateTimeField(blank=True, null=True)),
+                ('closes_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts_total', models.PositiveIntegerField(default=0)),
+                ('attempts_completed', models.PositiveIntegerField(default=0)),
+                ('avg_score', models.FloatField(blank=True, null=True)),
+                ('answers', models.PositiveIntegerField(default=0)),
+                ('path', models.CharField(max_length=500)),
+                ('sha256', models.CharField(max_length=64)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('module', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='accounts.module')),
+            ],
+        ),
+    ]
@@ -4,6 +4,11 @@ from questions.models import Question
 from accounts.models import Module, CustomUser
 
 class Exam(models.Model):
+    DELIVERY_MODES = (
+        ('paged', 'One question per page'),
+        ('single', 'All questions on one page'),
+    )
+
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -13,6 +18,7 @@ class Exam(models.Model):
     opens_at = models.DateTimeField(null=True, blank=True)
     closes_at = models.DateTimeField(null=True, blank=True)
     duration_minutes = models.PositiveIntegerField(default=60)
+    delivery_mode = models.CharField(max_length=10, choices=DELIVERY_MODES, default='paged')
 
     def __str__(self):
         return self.title
@@ -29,9 +35,45 @@ class ExamQuestion(models.Model):
     exam = models.ForeignKey(Exam, on_delete=models.CASCADE)
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['exam', 'question'], name='uniq_exam_question'),
+        ]
+
     def __str__(self):
         return f"{self.exam.title} - {self.question.question_text[:50]}"
 
+class ExamPaper(models.Model):
+    """Compiled, immutable snapshot of an exam's questions and answer key.
+
+    Built once per distinct question set (see exams/papers.py) and shared by
+    every attempt started against it. Editing a question produces a new
+    version instead of changing papers that live attempts are pinned to;
+    only a regrade rewrites a pinned paper's answer key.
+    """
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='papers')
+    version = models.PositiveIntegerField()
+    checksum = models.CharField(max_length=64)
+    content = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['exam', 'version'], name='uniq_exam_paper_version'),
+        ]
+
+    def __str__(self):
+        return f"{self.exam.title} - paper v{self.version}"
+
+class StudentExamAttemptQuerySet(models.QuerySet):
+    # Dormant = pre-provisioned (see provision_attempts) but never started:
+    # the start view stamps started_at/ends_at when the student begins.
+    def dormant(self):
+        return self.filter(completed=False, ends_at__isnull=True)
+
+    def started(self):
+        return self.exclude(completed=False, ends_at__isnull=True)
+
 class StudentExamAttempt(models.Model):
     student = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     exam = models.ForeignKey(Exam, on_delete=models.CASCADE)
@@ -44,6 +86,34 @@ class StudentExamAttempt(models.Model):
 
     # 🔹 New field to store randomized question order
     question_order = models.JSONField(null=True, blank=True)
+    # Seeded mode (EXAM_QUESTION_ORDER_MODE='seeded'): order and MCQ option
+    # shuffles are derived from this seed + the paper instead of being stored
+    order_seed = models.PositiveIntegerField(null=True, blank=True)
+
+    # Paper the attempt was started against (questions + answer key)
+    paper = models.ForeignKey(ExamPaper, on_delete=models.RESTRICT, null=True, blank=True)
+    # EXAM_ANSWER_STORAGE='packed': every answer of the attempt in one value
+    # (see exams/packed_answers.py); NULL when the answers are StudentAnswer rows
+    packed_answers = models.JSONField(null=True, blank=True)
+
+    objects = StudentExamAttemptQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # one in-progress attempt per student and exam; also the index
+            # behind every (student, exam, completed=False) lookup
+            models.UniqueConstraint(
+                fields=['student', 'exam'], condition=models.Q(completed=False),
+                name='uniq_open_attempt',
+            ),
+        ]
+        indexes = [
+            # completed lookups: results page, dashboards, staff reports
+            models.Index(fields=['student', 'exam', 'completed'], name='attempt_student_exam_idx'),
+            # finalize_expired_attempts only ever looks at in-progress attempts
+            models.Index(fields=['ends_at'], condition=models.Q(completed=False),
+                         name='attempt_open_ends_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student.username} - {self.exam.title}"
@@ -57,11 +127,121 @@ class StudentExamAttempt(models.Model):
     def is_time_over(self):
         return bool(self.ends_at and timezone.now() >= self.ends_at)
 
+class ExamStats(models.Model):
+    """Running per-exam totals for the staff result pages (see exams/stats.py).
+
+    Kept up to date by the start, submit, expiry and regrade paths; rebuild
+    with ``manage.py rebuild_exam_stats`` after editing attempts by hand.
+    Dormant (pre-provisioned, never started) attempts are not counted.
+    """
+    exam = models.OneToOneField(Exam, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    attempts_total = models.PositiveIntegerField(default=0)
+    attempts_completed = models.PositiveIntegerField(default=0)
+    score_sum = models.FloatField(default=0)
+    score_sq_sum = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.exam.title} - stats"
+
+    @property
+    def avg_score(self):
+        if not self.attempts_completed:
+            return None
+        return round(self.score_sum / self.attempts_completed, 2)
+
+    @property
+    def score_stddev(self):
+        n = self.attempts_completed
+        if not n:
+            return None
+        variance = max(self.score_sq_sum / n - (self.score_sum / n) ** 2, 0)
+        return round(variance ** 0.5, 2)
+
+    @property
+    def completion_pct(self):
+        if not self.attempts_total:
+            return None
+        return round((self.attempts_completed / self.attempts_total) * 100, 1)
+
+class ExamQuestionStats(models.Model):
+    """Running answer counts for one question within one exam (see exams/stats.py).
+
+    Updated with deltas as answers are saved or changed; pick_* count the
+    current answers per option (canonical MCQ letter, or true/false).
+    """
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='question_stats')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    answered = models.IntegerField(default=0)
+    correct = models.IntegerField(default=0)
+    pick_a = models.IntegerField(default=0)
+    pick_b = models.IntegerField(default=0)
+    pick_c = models.IntegerField(default=0)
+    pick_d = models.IntegerField(default=0)
+    pick_true = models.IntegerField(default=0)
+    pick_false = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['exam', 'question'], name='uniq_exam_question_stats'),
+        ]
+
+    def __str__(self):
+        return f"{self.exam.title} - Q{self.question_id} stats"
+
+    @property
+    def correct_pct(self):
+        if not self.answered:
+            return None
+        return round((self.correct / self.answered) * 100, 1)
+
 class StudentAnswer(models.Model):
     attempt = models.ForeignKey(StudentExamAttempt, on_delete=models.CASCADE)
+    # copy of attempt.exam: the partition key when the table is partitioned
+    # (see partition_answers), so queries filtering on it touch one partition
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, db_index=False)
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     selected_answer = models.CharField(max_length=255)
     is_correct = models.BooleanField(default=False)
 
+    class Meta:
+        constraints = [
+            # answer writes upsert on this (see exams/answer_store.py); a unique
+            # constraint on a partitioned table must include the partition key
+            models.UniqueConstraint(fields=['exam', 'attempt', 'question'], name='uniq_exam_attempt_answer'),
+        ]
+        indexes = [
+            # per-question analytics and regrading
+            models.Index(fields=['question', 'is_correct'], name='answer_question_correct_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.exam_id is None:
+            self.exam_id = self.attempt.exam_id
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.attempt.student.username} - Q: {self.question.id} - Ans: {self.selected_answer}"
+
+class ArchivedExam(models.Model):
+    """An exam moved to cold storage by ``manage.py archive_exams`` (see exams/archive.py).
+
+    The exam, its attempts and answers only live in the bundle file now; this
+    row keeps the summary the staff pages list and where to find the bundle.
+    Keyed by the exam's old id, so its results URL keeps working.
+    """
+    exam_id = models.PositiveIntegerField(primary_key=True)
+    module = models.ForeignKey(Module, on_delete=models.CASCADE)
+    title = models.CharField(max_length=200)
+    opens_at = models.DateTimeField(null=True, blank=True)
+    closes_at = models.DateTimeField(null=True, blank=True)
+    attempts_total = models.PositiveIntegerField(default=0)
+    attempts_completed = models.PositiveIntegerField(default=0)
+    avg_score = models.FloatField(null=True, blank=True)
+    answers = models.PositiveIntegerField(default=0)
+    path = models.CharField(max_length=500)
+    sha256 = models.CharField(max_length=64)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.title} (archived)"
@@ -0,0 +1,125 @@
+"""
+Packed answer storage: every answer of an attempt in one column.
+
+With settings.EXAM_ANSWER_STORAGE = 'packed', an attempt's answers are kept
+in StudentExamAttempt.packed_answers instead of one StudentAnswer row per
+question, so saving an answer is a single-row UPDATE and grading or
+rendering a result is a single-row read:
+
+    {
+        'codes': 'ab.t*',      # one character per paper question, in paper order
+        'correct': '11',       # hex bitmask, bit i set when question i is correct
+        'text': {'4': 'paris'} # answers at '*' positions, by position
+    }
+
+Codes: '.' unanswered, 'a'-'d' the (canonical) MCQ letter, 't'/'f' for
+'True'/'False'; anything else is '*' with the text in the side map.
+Positions come from the attempt's compiled paper, which never changes, so
+an attempt must be pinned to a paper to be packed.
+
+The storage of each attempt is fixed by whether packed_answers is set:
+attempts started before a switch keep their rows and both kinds are read
+side by side. ``PackedAnswer`` gives the per-answer view (question,
+selected_answer, is_correct) that the result templates and the admin use.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+
+from . import papers
+from .models import StudentExamAttempt
+
+UNANSWERED = '.'
+OTHER = '*'
+CODES = {'a': 'a', 'b': 'b', 'c': 'c', 'd': 'd', 'True': 't', 'False': 'f'}
+VALUES = {code: value for value, code in CODES.items()}
+
+PackedAnswer = namedtuple('PackedAnswer', ['attempt_id', 'question_id', 'question', 'selected_answer', 'is_correct'])
+
+
+def storage_mode():
+    return getattr(settings, 'EXAM_ANSWER_STORAGE', 'rows')
+
+
+def pack(paper, answers):
+    """Pack {question_id: selected_answer}, marking each against the paper's key."""
+    codes = [UNANSWERED] * len(paper['order'])
+    mask = 0
+    text = {}
+    position = {qid: i for i, qid in enumerate(paper['order'])}
+    for question_id, selected in answers.items():
+        i = position[question_id]
+        code = CODES.get(selected)
+        if code is None:
+            code = OTHER
+            text[str(i)] = selected
+        codes[i] = code
+        if papers.normalize_answer(selected) == paper['questions'][question_id]['key']:
+            mask |= 1 << i
+    return {'codes': ''.join(codes), 'correct': format(mask, 'x'), 'text': text}
+
+
+def unpack(paper, packed):
+    """{question_id: (selected_answer, is_correct)} of a packed attempt, in paper order."""
+    mask = int(packed['correct'], 16)
+    answers = {}
+    for i, (question_id, code) in enumerate(zip(paper['order'], packed['codes'])):
+        if code == UNANSWERED:
+            continue
+        selected = packed['text'][str(i)] if code == OTHER else VALUES[code]
+        answers[question_id] = (selected, bool(mask >> i & 1))
+    return answers
+
+
+def correct_count(packed):
+    return bin(int(packed['correct'], 16)).count('1')
+
+
+def set_correct(paper, packed, question_id, is_correct):
+    """Packed value with one question's correctness flag set; the same dict if unchanged."""
+    bit = 1 << paper['order'].index(question_id)
+    mask = int(packed['correct'], 16)
+    new = mask | bit if is_correct else mask & ~bit
+    if new == mask:
+        return packed
+    return {**packed, 'correct': format(new, 'x')}
+
+
+def attempt_answers(attempt, paper=None):
+    """PackedAnswer per answer of one packed attempt, in paper order."""
+    paper = paper or papers.get_paper(attempt.paper_id)
+    return [
+        PackedAnswer(attempt.id, qid, paper['questions'][qid], selected, ok)
+        for qid, (selected, ok) in unpack(paper, attempt.packed_answers).items()
+    ]
+
+
+def packed_attempts(exam_id):
+    return StudentExamAttempt.objects.filter(exam_id=exam_id, packed_answers__isnull=False)
+
+
+def iter_answers(rows):
+    """(row, PackedAnswer) for every answer of attempt rows (dicts with id, paper_id, packed_answers)."""
+    for row in rows:
+        paper = papers.get_paper(row['paper_id'])
+        for qid, (selected, ok) in unpack(paper, row['packed_answers']).items():
+            yield row, PackedAnswer(row['id'], qid, paper['questions'][qid], selected, ok)
+
+
+def regrade(question_id, key, paper_ids):
+    """Re-mark `question_id` against the normalized `key` in the packed attempts
+    pinned to `paper_ids` (the papers holding it); returns changed attempt ids."""
+    rows = (StudentExamAttempt.objects
+            .filter(paper_id__in=paper_ids, packed_answers__isnull=False)
+            .values('id', 'paper_id', 'packed_answers'))
+    updates = []
+    for row in rows.iterator():
+        paper = papers.get_paper(row['paper_id'])
+        answer = unpack(paper, row['packed_answers']).get(question_id)
+        if answer is None:
+            continue
+        packed = set_correct(paper, row['packed_answers'], question_id, papers.normalize_answer(answer[0]) == key)
+        if packed is not row['packed_answers']:
+            updates.append(StudentExamAttempt(id=row['id'], packed_answers=packed))
+    StudentExamAttempt.objects.bulk_update(updates, ['packed_answers'], batch_size=1000)
+    return {a.id for a in updates}
@@ -0,0 +1,241 @@
+"""
+Compiled exam papers.
+
+A paper is one serialized blob holding every question of an exam (text,
+options, raw correct answer and the normalized answer key). It is compiled
+the first time an exam is started (or ahead of opens_at by the
+provision_attempts command), stored as an ExamPaper row and shared by
+every attempt started against it, so question pages and results render
+without per-question row fetches.
+
+Papers are immutable: when an exam's questions change, the next start
+compiles a new version and attempts already in progress keep the one they
+were pinned to. The one exception is the answer key: a regrade rewrites
+it in every paper holding the question (``rekey_question``), so answers
+saved after the regrade are marked like the ones it re-marked.
+
+settings.EXAM_QUESTION_ORDER_MODE picks how an attempt's question order is
+kept: 'stored' shuffles once and saves the list in question_order, 'seeded'
+saves only a per-attempt seed and derives both the question order and the
+MCQ option order (A-D) from it with a stable hash-based permutation, so the
+exact paper a student saw can be reproduced for audits.
+"""
+import hashlib
+import json
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+
+from questions.models import Question
+from .models import ExamPaper, ExamQuestion
+
+CURRENT_PAPER_KEY = 'exams:paper-current:{exam_id}'
+PAPER_KEY = 'exams:paper:{paper_id}'
+
+# papers only change on a regrade, which drops their entries, so the only
+# reason to expire them is memory
+PAPER_TIMEOUT = 24 * 60 * 60
+
+QUESTION_FIELDS = (
+    'id', 'question_text', 'question_type',
+    'option_a', 'option_b', 'option_c', 'option_d',
+    'correct_answer',
+)
+
+
+def normalize_answer(value):
+    return (value or '').strip().lower()
+
+
+def question_snapshot(row):
+    """Serialize one question (a dict of QUESTION_FIELDS) for a paper."""
+    snap = {field: row[field] for field in QUESTION_FIELDS}
+    snap['key'] = normalize_answer(row['correct_answer'])
+    return snap
+
+
+def compile_paper_content(exam):
+    """Build the paper content for the exam's current question set (one query)."""
+    rows = (Question.objects
+            .filter(examquestion__exam=exam)
+            .order_by('id')
+            .values(*QUESTION_FIELDS))
+    return {'questions': [question_snapshot(r) for r in rows]}
+
+
+def _checksum(content):
+    raw = json.dumps(content, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def current_paper_id(exam):
+    """Id of the paper new attempts should use, compiling a new version if needed."""
+    key = CURRENT_PAPER_KEY.format(exam_id=exam.pk)
+    paper_id = cache.get(key)
+    if paper_id is not None:
+        return paper_id
+
+    content = compile_paper_content(exam)
+    checksum = _checksum(content)
+    latest = ExamPaper.objects.filter(exam=exam).order_by('-version').first()
+    if latest is not None and latest.checksum == checksum:
+        paper = latest
+    else:
+        paper = _create_paper(exam, content, checksum)
+
+    cache.set(key, paper.pk, PAPER_TIMEOUT)
+    return paper.pk
+
+
+def _create_paper(exam, content, checksum):
+    next_version = (ExamPaper.objects.filter(exam=exam)
+                    .aggregate(v=Max('version'))['v'] or 0) + 1
+    try:
+        with transaction.atomic():
+            return ExamPaper.objects.create(
+                exam=exam, version=next_version, checksum=checksum, content=content
+            )
+    except IntegrityError:
+        # another worker compiled the same version first
+        return ExamPaper.objects.get(exam=exam, version=next_version)
+
+
+def papers_holding(question_id):
+    """{paper_id: exam_id} of every paper with the question.
+
+    Papers of every exam are checked, not just the exams the question is
+    linked to now: attempts on an exam it has since been removed from are
+    still pinned to papers with it.
+    """
+    return {
+        row['id']: row['exam_id']
+        for row in ExamPaper.objects.values('id', 'exam_id', 'content').iterator()
+        if any(q['id'] == question_id for q in row['content']['questions'])
+    }
+
+
+def rekey_question(question_id, correct_answer, paper_ids):
+    """Set the question's answer key in the papers `paper_ids` (see papers_holding)."""
+    key = normalize_answer(correct_answer)
+    changed = []
+    for paper in ExamPaper.objects.filter(pk__in=paper_ids).only('id', 'checksum', 'content'):
+        snap = next(q for q in paper.content['questions'] if q['id'] == question_id)
+        if snap['correct_answer'] == correct_answer:
+            continue
+        snap['correct_answer'] = correct_answer
+        snap['key'] = key
+        paper.checksum = _checksum(paper.content)
+        paper.save(update_fields=['checksum', 'content'])
+        changed.append(PAPER_KEY.format(paper_id=paper.pk))
+    if changed:
+        cache.delete_many(changed)
+        # and again once committed, in case a reader cached the old content meanwhile
+        transaction.on_commit(lambda: cache.delete_many(changed))
+
+
+def invalidate_current_paper(exam_id):
+    cache.delete(CURRENT_PAPER_KEY.format(exam_id=exam_id))
+
+
+def get_paper(paper_id):
+    """Return the compiled paper as {'id', 'version', 'questions': {qid: snapshot}, 'order': [qid, ...]}."""
+    key = PAPER_KEY.format(paper_id=paper_id)
+    paper = cache.get(key)
+    if paper is None:
+        row = ExamPaper.objects.filter(pk=paper_id).values('id', 'version', 'content').first()
+        if row is None:
+            return None
+        questions = row['content']['questions']
+        paper = {
+            'id': row['id'],
+            'version': row['version'],
+            'questions': {q['id']: q for q in questions},
+            'order': [q['id'] for q in questions],
+        }
+        cache.set(key, paper, PAPER_TIMEOUT)
+    return paper
+
+
+def order_mode():
+    return getattr(settings, 'EXAM_QUESTION_ORDER_MODE', 'stored')
+
+
+def shuffled_order(paper_id):
+    """A fresh random question order for one attempt on this paper."""
+    q_ids = list(get_paper(paper_id)['order'])
+    random.shuffle(q_ids)
+    return q_ids
+
+
+def new_order_fields(paper_id):
+    """question_order/order_seed values for a new attempt, per EXAM_QUESTION_ORDER_MODE."""
+    if order_mode() == 'seeded':
+        return {'question_order': None, 'order_seed': random.getrandbits(31)}
+    return {'question_order': shuffled_order(paper_id), 'order_seed': None}
+
+
+# ---------- seeded permutations ----------
+
+MCQ_OPTIONS = ('a', 'b', 'c', 'd')
+
+
+def stable_permutation(items, *salt):
+    """Order `items` by a hash of (salt, item): same inputs, same order, on any host or Python."""
+    prefix = ':'.join(str(part) for part in salt)
+    return sorted(items, key=lambda item: hashlib.sha256(f'{prefix}:{item}'.encode('utf-8')).digest())
+
+
+def attempt_question_order(paper, question_order, order_seed):
+    """The question ids an attempt shows, in order (stored list or derived from the seed)."""
+    if question_order:
+        return question_order
+    if order_seed is not None and paper is not None:
+        return stable_permutation(paper['order'], 'questions', order_seed)
+    return list(paper['order']) if paper is not None else []
+
+
+def option_order(order_seed, question_id):
+    """Canonical option letters in the order the student sees them."""
+    if order_seed is None:
+        return list(MCQ_OPTIONS)
+    return stable_permutation(MCQ_OPTIONS, 'options', order_seed, question_id)
+
+
+def mcq_options(question, order_seed):
+    """Options to render as [{'value', 'label', 'text'}]; value is the displayed letter."""
+    shown = option_order(order_seed, question['id'])
+    return [
+        {'value': MCQ_OPTIONS[pos], 'label': MCQ_OPTIONS[pos].upper(), 'text': question[f'option_{letter}']}
+        for pos, letter in enumerate(shown)
+    ]
+
+
+def to_canonical_option(order_seed, question_id, shown_letter):
+    """Map the letter a student picked back to the paper's own option letter."""
+    if order_seed is None or shown_letter not in MCQ_OPTIONS:
+        return shown_letter
+    return option_order(order_seed, question_id)[MCQ_OPTIONS.index(shown_letter)]
+
+
+def to_shown_option(order_seed, question_id, canonical_letter):
+    if order_seed is None or canonical_letter not in MCQ_OPTIONS:
+        return canonical_letter
+    return MCQ_OPTIONS[option_order(order_seed, question_id).index(canonical_letter)]
+
+
+def paper_question(paper, question_id):
+    """Question snapshot from the paper, falling back to the live row for unpinned attempts."""
+    if paper is not None and question_id in paper['questions']:
+        return paper['questions'][question_id]
+    row = Question.objects.filter(pk=question_id).values(*QUESTION_FIELDS).first()
+    return question_snapshot(row) if row else None
+
+
+def exams_using_question(question_id):
+    return list(ExamQuestion.objects
+                .filter(question_id=question_id)
+                .values_list('exam_id', flat=True)
+                .distinct())
@@ -0,0 +1,147 @@
+"""
+Bulk deletion of attempts and their answers.
+
+``purge_attempts`` deletes in keyset-ordered batches, each in its own short
+transaction: the batch's answers go in one DELETE (StudentAnswer has no
+signal receivers or dependents, so Django does not load them), then the
+batch's attempts are deleted through the ORM so their post_delete
+receivers still run. Memory and lock duration are bounded by the batch
+size however much is being purged, and on PostgreSQL each batch sets a
+lock_timeout so a purge gives up (and retries) rather than queueing
+behind exam traffic. In-progress attempts have their cached state and
+write-behind buffer dropped before and after their batch is deleted, so
+neither a later save nor a buffer flush writes to a deleted attempt.
+
+``truncate_attempts`` empties both tables at once on PostgreSQL. TRUNCATE
+takes an exclusive lock, so the purge_attempts command only uses it while
+no exam is open.
+"""
+import time
+from collections import namedtuple
+
+from django.db import OperationalError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from accounts import dashboard_cache
+from . import answer_store, attempt_cache, stats
+from .models import Exam, ExamQuestionStats, ExamStats, StudentAnswer, StudentExamAttempt
+
+LOCK_TIMEOUT = '2s'
+LOCK_RETRIES = 5
+
+PurgeReport = namedtuple('PurgeReport', ['attempts', 'answers', 'seconds'])
+
+
+def scoped_attempts(exam_ids=None, module_ids=None, before=None):
+    """Attempts of the given exams / modules, started before `before`; all attempts if unscoped."""
+    qs = StudentExamAttempt.objects.all()
+    if exam_ids:
+        qs = qs.filter(exam_id__in=exam_ids)
+    if module_ids:
+        qs = qs.filter(exam__module_id__in=module_ids)
+    if before:
+        qs = qs.filter(started_at__lt=before)
+    return qs
+
+
+def open_exams(now=None):
+    now = now or timezone.now()
+    return (Exam.objects
+            .filter(is_active=True)
+            .filter(Q(opens_at__isnull=True) | Q(opens_at__lte=now))
+            .filter(Q(closes_at__isnull=True) | Q(closes_at__gte=now)))
+
+
+def _delete_batch(ids, exam_ids):
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+        answers, _ = StudentAnswer.objects.filter(attempt_id__in=ids, exam_id__in=exam_ids).delete()
+        StudentExamAttempt.objects.filter(id__in=ids).delete()
+    return answers
+
+
+def purge_attempts(attempts, batch_size=1000, pause=0.0, on_batch=None, refresh_stats=True):
+    """Delete the `attempts` queryset and its answers in batches; returns a PurgeReport.
+
+    `pause` seconds are slept between batches to leave room for live traffic.
+    Statistics of the affected exams are recomputed at the end unless
+    `refresh_stats` is False.
+    """
+    started = time.monotonic()
+    qs = attempts.order_by('id').values('id', 'student_id', 'exam_id', 'completed')
+    n_attempts = n_answers = 0
+    exam_ids = set()
+    last_id = 0
+    while True:
+        rows = list(qs.filter(id__gt=last_id)[:batch_size])
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+        ids = [r['id'] for r in rows]
+        open_rows = [r for r in rows if not r['completed']]
+        # in-progress attempts: stop the exam pages from saving to them first
+        _forget(open_rows)
+
+        for retry in range(LOCK_RETRIES + 1):
+            try:
+                n_answers += _delete_batch(ids, {r['exam_id'] for r in rows})
+                break
+            except OperationalError:
+                # lock_timeout hit: back off and let the exam traffic through
+                if retry == LOCK_RETRIES:
+                    raise
+                time.sleep(2 ** retry)
+
+        # a request that read the state before the delete may have cached or buffered it again
+        _forget(rows)
+        exam_ids.update(r['exam_id'] for r in rows)
+        n_attempts += len(rows)
+        if on_batch:
+            on_batch(n_attempts, n_answers)
+        if pause:
+            time.sleep(pause)
+
+    if refresh_stats:
+        _refresh_stats(exam_ids)
+    return PurgeReport(n_attempts, n_answers, time.monotonic() - started)
+
+
+def _forget(rows):
+    """Drop cached state and unwritten (write-behind) answers of attempts being deleted."""
+    if rows:
+        attempt_cache.invalidate_attempts((r['student_id'], r['exam_id']) for r in rows)
+        answer_store.discard_buffers(r['id'] for r in rows)
+
+
+def _refresh_stats(exam_ids):
+    exam_ids = sorted(exam_ids)
+    existing = set(ExamStats.objects.filter(exam_id__in=exam_ids).values_list('exam_id', flat=True))
+    stats.rebuild([e for e in exam_ids if e in existing])
+    for exam_id in exam_ids:
+        if ExamQuestionStats.objects.filter(exam_id=exam_id).exists():
+            stats.rebuild_question_stats(exam_id)
+
+
+def truncate_attempts():
+    """Empty the attempts and answers tables in one statement.
+
+    PostgreSQL only; callers check ``open_exams()`` first. Returns the seconds taken.
+    """
+    started = time.monotonic()
+    students = set(StudentExamAttempt.objects.values_list('student_id', flat=True).distinct())
+    open_rows = list(StudentExamAttempt.objects.filter(completed=False).values('id', 'student_id', 'exam_id'))
+    _forget(open_rows)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+            cursor.execute(f"TRUNCATE {StudentAnswer._meta.db_table}, {StudentExamAttempt._meta.db_table}")
+        ExamStats.objects.all().delete()  # recomputed on next read
+        ExamQuestionStats.objects.update(answered=0, correct=0, pick_a=0, pick_b=0, pick_c=0, pick_d=0,
+                                         pick_true=0, pick_false=0)
+    # TRUNCATE sends no signals
+    _forget(open_rows)
+    dashboard_cache.bump_students(students)
+    return time.monotonic() - started
@@ -0,0 +1,134 @@
+"""
+Keyset-paginated results grid for staff_exam_results_view.
+
+Each page is one range scan: rows are ordered by (sort key, id) and the
+next/previous page starts after/before the (sort key, id) of the last/first
+row shown, carried in an opaque cursor. Unlike OFFSET paging the cost does
+not grow with the page number, and rows do not shift between pages while
+students keep submitting.
+
+Time taken is formatted as HH:MM:SS by the database (``DurationHMS``).
+"""
+import base64
+import binascii
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.db.models import CharField, DecimalField, DurationField, ExpressionWrapper, F, Func, Q, Value
+from django.db.models.functions import Coalesce
+
+from .models import StudentExamAttempt
+
+PAGE_SIZE = 50
+
+
+class DurationHMS(Func):
+    """'HH:MM:SS' text for (end - start), computed in SQL; NULL while end is NULL."""
+    output_field = CharField()
+
+    def _compile(self, compiler):
+        start, start_params = compiler.compile(self.source_expressions[0])
+        end, end_params = compiler.compile(self.source_expressions[1])
+        return start, tuple(start_params), end, tuple(end_params)
+
+    def as_postgresql(self, compiler, connection, **extra):
+        start, start_params, end, end_params = self._compile(compiler)
+        secs = f"EXTRACT(EPOCH FROM ({end} - {start}))::bigint"
+        hours = f"({secs} / 3600)::text"
+        # LPAD alone would cut 100+ hours down to two digits
+        sql = (f"LPAD({hours}, GREATEST(2, LENGTH({hours})), '0') "
+               f"|| ':' || TO_CHAR({secs} %% 3600 / 60, 'FM00') || ':' || TO_CHAR({secs} %% 60, 'FM00')")
+        return sql, (end_params + start_params) * 4
+
+    def as_sqlite(self, compiler, connection, **extra):
+        start, start_params, end, end_params = self._compile(compiler)
+        secs = f"CAST(ROUND((julianday({end}) - julianday({start})) * 86400) AS INTEGER)"
+        sql = f"printf('%%02d:%%02d:%%02d', {secs} / 3600, {secs} %% 3600 / 60, {secs} %% 60)"
+        return sql, (end_params + start_params) * 3
+
+    def as_mysql(self, compiler, connection, **extra):
+        start, start_params, end, end_params = self._compile(compiler)
+        sql = f"TIME_FORMAT(SEC_TO_TIME(TIMESTAMPDIFF(SECOND, {start}, {end})), '%%H:%%i:%%s')"
+        return sql, start_params + end_params
+
+
+def _time_taken():
+    diff = ExpressionWrapper(F('submitted_at') - F('started_at'), output_field=DurationField())
+    return Coalesce(diff, Value(timedelta(0)), output_field=DurationField())
+
+
+# sort name -> (key expression, encode for cursor, decode from cursor)
+SORTS = {
+    # in-progress attempts have no submitted_at yet; they sort by their start
+    'submitted': (lambda: Coalesce('submitted_at', 'started_at'),
+                  lambda v: v.isoformat(), datetime.fromisoformat),
+    'score': (lambda: Coalesce('score', Value(Decimal('-1')), output_field=DecimalField(max_digits=5, decimal_places=2)),
+              str, Decimal),
+    'time': (_time_taken,
+             lambda v: v // timedelta(microseconds=1), lambda v: timedelta(microseconds=int(v))),
+}
+
+STATUS_FILTERS = {
+    'all': Q(),
+    'completed': Q(completed=True),
+    'in_progress': Q(completed=False),
+}
+
+
+def encode_cursor(sort, row):
+    raw = json.dumps([SORTS[sort][1](row['sort_key']), row['id']])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(sort, cursor):
+    """(sort key, id) from a cursor, or None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return SORTS[sort][2](value), int(pk)
+    except (ValueError, TypeError, binascii.Error, ArithmeticError):
+        return None
+
+
+def results_page(exam, sort='submitted', descending=True, status='all', after=None, before=None,
+                 size=PAGE_SIZE):
+    """One page of the exam's (started) attempts.
+
+    Returns {'rows', 'next', 'prev'}; next/prev are cursors or None.
+    """
+    sort = sort if sort in SORTS else 'submitted'
+    qs = (StudentExamAttempt.objects
+          .started()
+          .filter(exam=exam)
+          .filter(STATUS_FILTERS.get(status, Q()))
+          .annotate(sort_key=SORTS[sort][0](),
+                    time_taken=DurationHMS('started_at', 'submitted_at'))
+          .values('id', 'student__username', 'score', 'completed', 'started_at', 'submitted_at',
+                  'time_taken', 'sort_key'))
+
+    after, before = decode_cursor(sort, after), decode_cursor(sort, before)
+    backwards = before is not None and after is None
+    # walking backwards flips the comparison and the ordering, then the page is reversed
+    desc = descending != backwards
+    boundary = before if backwards else after
+    if boundary is not None:
+        key, pk = boundary
+        op = 'lt' if desc else 'gt'
+        qs = qs.filter(Q(**{f'sort_key__{op}': key}) | Q(sort_key=key, **{f'id__{op}': pk}))
+    qs = qs.order_by(*(('-sort_key', '-id') if desc else ('sort_key', 'id')))
+
+    rows = list(qs[:size + 1])
+    more = len(rows) > size
+    rows = rows[:size]
+    if backwards:
+        rows.reverse()
+
+    has_next = (more and not backwards) or (backwards and bool(rows))
+    has_prev = (more and backwards) or (after is not None and bool(rows))
+    return {
+        'rows': rows,
+        'next': encode_cursor(sort, rows[-1]) if has_next and rows else None,
+        'prev': encode_cursor(sort, rows[0]) if has_prev and rows else None,
+    }
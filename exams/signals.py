@@ -0,0 +1,56 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.dispatch import receiver
+
+from questions.models import Question
+from . import attempt_cache, papers, stats
+from .models import Exam, ExamQuestion, ExamQuestionStats, StudentExamAttempt
+
+
+@receiver([post_save, post_delete], sender=Exam)
+def drop_cached_exam(sender, instance, **kwargs):
+    attempt_cache.invalidate_exam(instance.pk)
+
+
+@receiver(m2m_changed, sender=get_user_model().modules.through)
+def drop_cached_enrollment(sender, instance, action, reverse, pk_set, **kwargs):
+    # cached attempt state carries the enrollment check: drop it for the open
+    # attempts on exams of the modules a student joined or left
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    attempts = StudentExamAttempt.objects.filter(completed=False)
+    if not reverse:
+        # user.modules.add/remove/clear(...); pk_set is None after a clear
+        attempts = attempts.filter(student_id=instance.pk)
+        if pk_set is not None:
+            attempts = attempts.filter(exam__module_id__in=pk_set)
+    else:
+        # module.students.add/remove/clear(...)
+        attempts = attempts.filter(exam__module_id=instance.pk)
+        if pk_set is not None:
+            attempts = attempts.filter(student_id__in=pk_set)
+    attempt_cache.invalidate_attempts(attempts.values_list('student_id', 'exam_id'))
+
+
+@receiver(post_save, sender=Question)
+def recompile_papers_for_question(sender, instance, **kwargs):
+    # a new paper version is compiled on the next start; pinned attempts keep theirs
+    for exam_id in papers.exams_using_question(instance.pk):
+        papers.invalidate_current_paper(exam_id)
+
+
+@receiver([post_save, post_delete], sender=ExamQuestion)
+def recompile_paper_for_exam(sender, instance, **kwargs):
+    papers.invalidate_current_paper(instance.exam_id)
+
+
+@receiver(post_save, sender=ExamQuestion)
+def add_question_stats(sender, instance, created, **kwargs):
+    # bulk-linked questions send no signal: get_question_stats fills those in
+    if created:
+        stats.rebuild_question_stats(instance.exam_id, [instance.question_id])
+
+
+@receiver(post_delete, sender=ExamQuestion)
+def drop_question_stats(sender, instance, **kwargs):
+    ExamQuestionStats.objects.filter(exam_id=instance.exam_id, question_id=instance.question_id).delete()
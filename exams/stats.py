@@ -0,0 +1,233 @@
+"""
+Materialized per-exam statistics (ExamStats).
+
+The staff overview and results pages used to aggregate every attempt of
+every exam on each load. Instead, each path that changes an attempt's
+status or score applies a delta to the exam's ExamStats row inside the same
+transaction:
+
+    record_started      start view (new attempt, or a dormant one stamped)
+    record_completed    submit and the expiry sweeper
+    record_rescored     regrading
+
+Deltas are only applied to rows that exist. A missing row is computed from
+the attempts table the first time it is read (``get_stats``), which also
+covers exams that had attempts before this table existed;
+``manage.py rebuild_exam_stats`` recomputes rows after bulk edits.
+
+Per-question counters (ExamQuestionStats) work the same way: save_answers
+turns each new or changed answer into deltas (``answer_deltas``) and applies
+them in one UPDATE per save (``apply_answer_deltas``); with write-behind the
+deltas travel in the answer buffer and are applied when it is flushed.
+A linked question without a row (linked with bulk_create, which sends no
+post_save) is counted the next time the exam's rows are read
+(``get_question_stats``).
+"""
+from collections import defaultdict
+
+from django.db.models import Case, Count, F, FloatField, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Cast, Lower, Trim
+from django.utils import timezone
+
+from . import packed_answers, papers
+from .models import ExamQuestion, ExamQuestionStats, ExamStats, StudentAnswer, StudentExamAttempt
+
+
+def record_started(exam_id, count=1):
+    ExamStats.objects.filter(exam_id=exam_id).update(
+        attempts_total=F('attempts_total') + count,
+        updated_at=timezone.now(),
+    )
+
+
+def record_completed(exam_id, scores):
+    """Count attempts of one exam that just completed with the given scores."""
+    scores = [float(s or 0) for s in scores]
+    if not scores:
+        return
+    ExamStats.objects.filter(exam_id=exam_id).update(
+        attempts_completed=F('attempts_completed') + len(scores),
+        score_sum=F('score_sum') + sum(scores),
+        score_sq_sum=F('score_sq_sum') + sum(s * s for s in scores),
+        updated_at=timezone.now(),
+    )
+
+
+def record_completed_many(rows):
+    """record_completed for rows of (exam_id, score) spanning several exams."""
+    per_exam = defaultdict(list)
+    for exam_id, score in rows:
+        per_exam[exam_id].append(score)
+    for exam_id, scores in per_exam.items():
+        record_completed(exam_id, scores)
+
+
+def record_rescored(rows):
+    """Apply score changes given as (exam_id, old_score, new_score)."""
+    deltas = defaultdict(lambda: [0.0, 0.0])
+    for exam_id, old, new in rows:
+        old, new = float(old or 0), float(new or 0)
+        deltas[exam_id][0] += new - old
+        deltas[exam_id][1] += new * new - old * old
+    for exam_id, (d_sum, d_sq) in deltas.items():
+        ExamStats.objects.filter(exam_id=exam_id).update(
+            score_sum=F('score_sum') + d_sum,
+            score_sq_sum=F('score_sq_sum') + d_sq,
+            updated_at=timezone.now(),
+        )
+
+
+def rebuild(exam_ids):
+    """Recompute ExamStats for the given exams from their attempts (one grouped query)."""
+    exam_ids = list(exam_ids)
+    score = Cast('score', FloatField())
+    completed = Q(completed=True)
+    totals = {
+        row['exam_id']: row
+        for row in (StudentExamAttempt.objects
+                    .started()
+                    .filter(exam_id__in=exam_ids)
+                    .values('exam_id')
+                    .annotate(
+                        total=Count('id'),
+                        done=Count('id', filter=completed),
+                        s=Sum(score, filter=completed),
+                        sq=Sum(score * score, filter=completed),
+                    ))
+    }
+    rebuilt = {}
+    for exam_id in exam_ids:
+        row = totals.get(exam_id, {})
+        rebuilt[exam_id], _ = ExamStats.objects.update_or_create(
+            exam_id=exam_id,
+            defaults={
+                'attempts_total': row.get('total') or 0,
+                'attempts_completed': row.get('done') or 0,
+                'score_sum': row.get('s') or 0,
+                'score_sq_sum': row.get('sq') or 0,
+            },
+        )
+    return rebuilt
+
+
+def get_stats(exam_ids):
+    """{exam_id: ExamStats}, computing rows that do not exist yet."""
+    exam_ids = list(exam_ids)
+    found = ExamStats.objects.in_bulk(exam_ids)
+    missing = [e for e in exam_ids if e not in found]
+    if missing:
+        found.update(rebuild(missing))
+    return found
+
+
+# ---------- per-question counters ----------
+
+PICK_COLUMNS = {
+    'MCQ': {'a': 'pick_a', 'b': 'pick_b', 'c': 'pick_c', 'd': 'pick_d'},
+    'TF': {'true': 'pick_true', 'false': 'pick_false'},
+}
+
+
+def _pick_column(question, selected):
+    return PICK_COLUMNS.get(question['question_type'], {}).get(papers.normalize_answer(selected))
+
+
+def answer_deltas(question, old, new, new_correct):
+    """Counter deltas for one answer going from `old` (None if unanswered) to `new`."""
+    deltas = defaultdict(int)
+    if old is None:
+        deltas['answered'] += 1
+    else:
+        deltas['correct'] -= int(papers.normalize_answer(old) == question['key'])
+        old_pick = _pick_column(question, old)
+        if old_pick:
+            deltas[old_pick] -= 1
+    deltas['correct'] += int(new_correct)
+    new_pick = _pick_column(question, new)
+    if new_pick:
+        deltas[new_pick] += 1
+    return {col: d for col, d in deltas.items() if d}
+
+
+def merge_deltas(into, more):
+    """Add {question_id: {column: delta}} `more` into `into` (in place)."""
+    for question_id, cols in more.items():
+        target = into.setdefault(question_id, {})
+        for col, d in cols.items():
+            target[col] = target.get(col, 0) + d
+    return into
+
+
+def apply_answer_deltas(exam_id, deltas):
+    """Apply {question_id: {column: delta}} to an exam's counters in one UPDATE."""
+    deltas = {qid: {col: d for col, d in cols.items() if d} for qid, cols in deltas.items()}
+    deltas = {qid: cols for qid, cols in deltas.items() if cols}
+    if not deltas:
+        return
+    columns = {col for cols in deltas.values() for col in cols}
+    updates = {
+        col: F(col) + Case(
+            *[When(question_id=qid, then=Value(cols[col])) for qid, cols in deltas.items() if cols.get(col)],
+            default=Value(0), output_field=IntegerField(),
+        )
+        for col in columns
+    }
+    ExamQuestionStats.objects.filter(exam_id=exam_id, question_id__in=list(deltas)).update(**updates)
+
+
+def rebuild_question_stats(exam_id, question_ids=None):
+    """Recompute an exam's per-question counters from its answers (one grouped query)."""
+    if question_ids is None:
+        question_ids = list(ExamQuestion.objects.filter(exam_id=exam_id).values_list('question_id', flat=True))
+    picked = Lower(Trim('selected_answer'))
+    pick_counts = {
+        col: Count('id', filter=Q(question__question_type=qtype, picked=value))
+        for qtype, cols in PICK_COLUMNS.items() for value, col in cols.items()
+    }
+    rows = {
+        row['question_id']: row
+        for row in (StudentAnswer.objects
+                    .filter(exam_id=exam_id, question_id__in=question_ids)
+                    .annotate(picked=picked)
+                    .values('question_id')
+                    .annotate(answered=Count('id'), correct=Count('id', filter=Q(is_correct=True)), **pick_counts))
+    }
+    zero = {'answered': 0, 'correct': 0, **{col: 0 for col in pick_counts}}
+    _add_packed_counts(exam_id, set(question_ids), rows, zero)
+    for question_id in question_ids:
+        row = rows.get(question_id, zero)
+        ExamQuestionStats.objects.update_or_create(
+            exam_id=exam_id, question_id=question_id,
+            defaults={col: row[col] for col in zero},
+        )
+
+
+def _add_packed_counts(exam_id, question_ids, rows, zero):
+    """Add the answers of the exam's packed attempts to the grouped `rows`."""
+    packed = packed_answers.packed_attempts(exam_id).values('id', 'paper_id', 'packed_answers')
+    for _, answer in packed_answers.iter_answers(packed.iterator()):
+        if answer.question_id not in question_ids:
+            continue
+        row = rows.setdefault(answer.question_id, dict(zero))
+        row['answered'] += 1
+        row['correct'] += int(answer.is_correct)
+        pick = _pick_column(answer.question, answer.selected_answer)
+        if pick:
+            row[pick] += 1
+
+
+def get_question_stats(exam_id):
+    """The exam's ExamQuestionStats rows (with their questions), computing missing ones on first use."""
+    rows = list(ExamQuestionStats.objects
+                .filter(exam_id=exam_id)
+                .select_related('question')
+                .order_by('question_id'))
+    linked = set(ExamQuestion.objects.filter(exam_id=exam_id).values_list('question_id', flat=True))
+    missing = linked - {row.question_id for row in rows}
+    if missing:
+        rebuild_question_stats(exam_id, sorted(missing))
+        rows = list(ExamQuestionStats.objects
+                    .filter(exam_id=exam_id)
+                    .select_related('question')
+                    .order_by('question_id'))
+    return rows
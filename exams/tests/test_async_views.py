@@ -0,0 +1,164 @@
+import asyncio
+import json
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test import AsyncClient, AsyncRequestFactory, TestCase, override_settings
+from django.urls import include, path, resolve, reverse
+from django.utils import timezone
+
+from accounts.models import Module
+from exams import metrics, views_async
+from exams.models import Exam, ExamQuestion, StudentAnswer, StudentExamAttempt
+from questions.models import Question
+
+User = get_user_model()
+
+# the site's URLs with the exam-taking pages routed to the async views, as
+# exams/urls_student.py does with EXAM_ASYNC_VIEWS on
+urlpatterns = [
+    path('student/exams/<int:exam_id>/start/', views_async.take_exam_start_view, name='take_exam_start'),
+    path('student/exams/<int:exam_id>/q/<int:question_index>/', views_async.take_exam_question_view,
+         name='take_exam_question'),
+    path('student/exams/<int:exam_id>/paper/', views_async.take_exam_paper_view, name='take_exam_paper'),
+    path('student/exams/<int:exam_id>/sync/', views_async.sync_answers_view, name='sync_answers'),
+    path('student/exams/<int:exam_id>/submit/', views_async.submit_exam_view, name='submit_exam'),
+    path('student/exams/<int:exam_id>/result/', views_async.exam_result_view, name='exam_result'),
+    path('', include('config.urls')),
+]
+
+
+@override_settings(ROOT_URLCONF='exams.tests.test_async_views', EXAM_ASYNC_VIEWS=True)
+class AsyncExamFlowTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.module = Module.objects.create(code="CS101", name="Intro to CS")
+        self.student = User.objects.create_user(
+            username="CSSS251001", password="Stu1234!", role="student",
+        )
+        self.student.modules.add(self.module)
+        now = timezone.now()
+        self.exam = Exam.objects.create(
+            title="Async Exam", module=self.module, is_active=True,
+            opens_at=now - timedelta(hours=1), closes_at=now + timedelta(hours=1), duration_minutes=60,
+        )
+        self.answers = {}
+        for text, answer in (("2+2?", "4"), ("3+5?", "8")):
+            question = Question.objects.create(question_text=text, question_type="FILL",
+                                               module=self.module, correct_answer=answer)
+            ExamQuestion.objects.create(exam=self.exam, question=question)
+            self.answers[question.id] = answer
+        self.async_client.force_login(self.student)
+
+    def test_views_are_coroutines(self):
+        for name, args in (("take_exam_start", [1]), ("take_exam_question", [1, 0]),
+                           ("submit_exam", [1]), ("exam_result", [1])):
+            self.assertTrue(asyncio.iscoroutinefunction(resolve(reverse(name, args=args)).func), name)
+
+    async def test_full_exam_flow_through_async_views(self):
+        exam_id = self.exam.id
+        response = await self.async_client.post(reverse("take_exam_start", args=[exam_id]))
+        self.assertRedirects(response, reverse("take_exam_question", args=[exam_id, 0]),
+                             fetch_redirect_response=False)
+
+        attempt = await StudentExamAttempt.objects.aget(student=self.student, exam=self.exam)
+        for index, question_id in enumerate(attempt.question_order):
+            response = await self.async_client.get(reverse("take_exam_question", args=[exam_id, index]))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context["question_index"], index)
+            button = "submit" if index == len(attempt.question_order) - 1 else "next"
+            response = await self.async_client.post(reverse("take_exam_question", args=[exam_id, index]),
+                                                    {"answer": self.answers[question_id], button: "1"})
+            self.assertEqual(response.status_code, 302)
+
+        response = await self.async_client.post(reverse("submit_exam", args=[exam_id]))
+        self.assertRedirects(response, reverse("exam_result", args=[exam_id]), fetch_redirect_response=False)
+        await attempt.arefresh_from_db()
+        self.assertTrue(attempt.completed)
+        self.assertEqual(float(attempt.score), 100.00)
+        self.assertEqual(await StudentAnswer.objects.filter(attempt=attempt).acount(), 2)
+
+        response = await self.async_client.get(reverse("exam_result", args=[exam_id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.context["correct"], response.context["total"]), (2, 2))
+
+        # a second start goes straight to the result
+        response = await self.async_client.post(reverse("take_exam_start", args=[exam_id]))
+        self.assertRedirects(response, reverse("exam_result", args=[exam_id]), fetch_redirect_response=False)
+
+    async def test_anonymous_student_is_sent_to_login(self):
+        response = await AsyncClient().get(reverse("take_exam_question", args=[self.exam.id, 0]))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse("login"), response["Location"])
+
+    async def test_clock_stream_pushes_readings_then_submit(self):
+        response = await self.async_client.post(reverse("take_exam_start", args=[self.exam.id]))
+        response = await self.async_client.get(response["Location"])
+        stream_url = response.context["clock_stream_url"]
+        self.assertTrue(stream_url)
+
+        response = await self.async_client.get(stream_url)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = response.streaming_content
+        self.assertTrue((await anext(events)).startswith(b"retry:"))
+        name, data = (await anext(events)).decode().splitlines()[:2]
+        self.assertEqual(name, "event: clock")
+        self.assertFalse(json.loads(data[len("data: "):])["submit"])
+
+        # once the exam closes, the next reading is a submit event and the stream ends
+        self.exam.closes_at = timezone.now() - timedelta(seconds=1)
+        await self.exam.asave()
+        response = await self.async_client.get(stream_url)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 2)
+        self.assertTrue(chunks[1].startswith(b"event: submit"))
+
+    @override_settings(METRICS_SAMPLE_RATE=1.0)
+    async def test_request_metrics_count_queries_run_off_the_event_loop(self):
+        metrics.registry.reset()
+        response = await self.async_client.post(reverse("take_exam_start", args=[self.exam.id]))
+        await self.async_client.get(response["Location"])
+
+        totals = metrics.registry.snapshot()
+        queries = totals[("db_queries", "take_exam_question")]
+        self.assertEqual(queries[-1], 1)
+        self.assertGreater(queries[-2], 0)
+        self.assertGreater(totals[("db_time_seconds", "take_exam_start")][-2], 0)
+
+    @override_settings(METRICS_SAMPLE_RATE=1.0)
+    async def test_request_metrics_follow_the_request_into_worker_threads(self):
+        def select_one():
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            connection.close()
+
+        async def view(request):
+            # a worker thread of its own, so a connection the request thread never saw
+            await sync_to_async(select_one, thread_sensitive=False)()
+            return HttpResponse()
+
+        metrics.registry.reset()
+        middleware = metrics.RequestMetricsMiddleware(view)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        request = AsyncRequestFactory().get("/")
+        request.resolver_match = None
+        await middleware(request)
+        self.assertEqual(metrics.registry.snapshot()[("db_queries", "unresolved")][-2], 1)
+
+    async def test_unpinned_attempt_questions_load_off_the_event_loop(self):
+        # attempts from before compiled papers read their questions from the live rows
+        order = list(self.answers)
+        await StudentExamAttempt.objects.acreate(student=self.student, exam=self.exam, question_order=order,
+                                                 ends_at=timezone.now() + timedelta(minutes=30))
+        response = await self.async_client.get(reverse("take_exam_question", args=[self.exam.id, 1]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["question"]["id"], order[1])
+        response = await self.async_client.get(reverse("take_exam_paper", args=[self.exam.id]))
+        self.assertEqual(len(response.context["items"]), 2)
+
+        response = await self.async_client.get(reverse("sync_answers", args=[self.exam.id]))
+        self.assertEqual(response.status_code, 405)
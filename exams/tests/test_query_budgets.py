@@ -0,0 +1,187 @@
+import difflib
+import json
+import re
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+try:
+    import numpy
+except ImportError:  # item analysis is optional
+    numpy = None
+
+from accounts.models import Module
+from exams import stats
+from exams.models import Exam, ExamQuestion, StudentAnswer, StudentExamAttempt
+from questions.models import Question
+
+User = get_user_model()
+
+PASSWORD = "Budget1234!"
+SMALL, LARGE = 3, 12
+
+# Most queries each request may run with a cold cache (session and user
+# lookups included). Every view must also run the same number of queries at
+# both scales.
+BUDGETS = {
+    "student_dashboard": 5,
+    "exam_instructions": 4,
+    "take_exam_start": 18,
+    "take_exam_question GET": 7,
+    "take_exam_question POST": 9,
+    "take_exam_paper": 7,
+    "sync_answers": 9,
+    "submit_exam": 10,
+    "exam_result": 6,
+    "staff_dashboard": 4,
+    "staff_results_overview": 6,
+    "staff_exam_results": 7,
+    "staff_exam_question_stats": 7,
+    "staff_exam_item_analysis": 9,
+    "staff_attempt_detail": 7,
+    "staff_exam_manage": 5,
+    "staff_exam_questions_manage": 6,
+    "staff_exam_results_export_csv": 6,
+    "staff_exam_answers_export_ndjson": 7,
+    "question_list": 2,
+}
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SAVEPOINTS = re.compile(r'SAVEPOINT "[^"]+"')
+_IN_LISTS = re.compile(r"IN \((?:\?, )*\?\)")
+_VALUES_ROWS = re.compile(r"(\([?, ]+\))(?:, \1)+")
+_CASE_ARMS = re.compile(r"(WHEN \(\S+ = \?\) THEN \? )+")
+
+
+def normalize(sql):
+    """SQL with literals and variable-length lists collapsed, so only the query shape is compared."""
+    sql = _SAVEPOINTS.sub('SAVEPOINT "?"', _LITERALS.sub("?", sql))
+    sql = _IN_LISTS.sub("IN (...)", sql)
+    sql = _VALUES_ROWS.sub(r"\1, ...", sql)
+    return _CASE_ARMS.sub("WHEN ... ", sql)
+
+
+class QueryBudgetTests(TestCase):
+    """Each view runs a constant number of queries, whatever the number of attempts or questions."""
+
+    def build_world(self, tag, size):
+        """A module with `size` exams, questions per exam and other students who completed it."""
+        now = timezone.now()
+        module = Module.objects.create(code=f"QB{tag}", name=f"Budget {tag}")
+        staff = User.objects.create_user(username=f"staff{tag}", password=PASSWORD, role="staff", module=module)
+        student = User.objects.create_user(username=f"student{tag}", password=PASSWORD, role="student")
+        student.modules.add(module)
+
+        exams = Exam.objects.bulk_create([
+            Exam(title=f"Exam {tag}-{n}", module=module, opens_at=now - timedelta(hours=1),
+                 closes_at=now + timedelta(hours=1), duration_minutes=60)
+            for n in range(size)
+        ])
+        exam = exams[0]
+        questions = Question.objects.bulk_create([
+            Question(question_text=f"Q{n}?", module=module, **kind)
+            for n, kind in zip(range(size), self.question_kinds())
+        ])
+        ExamQuestion.objects.bulk_create([ExamQuestion(exam=exam, question=q) for q in questions])
+
+        others = User.objects.bulk_create([
+            User(username=f"other{tag}-{n}", role="student", password="!") for n in range(size)
+        ])
+        module.students.add(*others)
+        attempts = StudentExamAttempt.objects.bulk_create([
+            StudentExamAttempt(student=u, exam=exam, completed=True, score=50, ends_at=now,
+                               submitted_at=now, question_order=[q.id for q in questions])
+            for u in others
+        ])
+        StudentAnswer.objects.bulk_create([
+            StudentAnswer(attempt=a, exam=exam, question=q, selected_answer=q.correct_answer, is_correct=n % 2 == 0)
+            for n, a in enumerate(attempts) for q in questions
+        ])
+        # materialized stats exist in a running system; their first-read rebuild is not measured
+        stats.rebuild(e.id for e in exams)
+        stats.rebuild_question_stats(exam.id)
+        return {"exam": exam, "staff": staff, "student": student, "questions": questions}
+
+    @staticmethod
+    def question_kinds():
+        while True:
+            yield {"question_type": "MCQ", "option_a": "A", "option_b": "B", "option_c": "C",
+                   "option_d": "D", "correct_answer": "b"}
+            yield {"question_type": "TF", "correct_answer": "True"}
+            yield {"question_type": "FILL", "correct_answer": "paris"}
+
+    def capture(self, client, method, url, data=None, **extra):
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(client, method)(url, data, **extra)
+            if response.streaming:
+                b"".join(response.streaming_content)
+        self.assertLess(response.status_code, 400, url)
+        return [normalize(q["sql"]) for q in ctx.captured_queries]
+
+    def run_views(self, world):
+        """{step name: normalized SQL} for one pass over the student and staff views."""
+        exam, questions = world["exam"], world["questions"]
+        runs = {}
+
+        self.client.login(username=world["student"].username, password=PASSWORD)
+        student_steps = [
+            ("student_dashboard", "get", reverse("student_dashboard"), None, {}),
+            ("exam_instructions", "get", reverse("exam_instructions", args=[exam.id]), None, {}),
+            ("take_exam_start", "post", reverse("take_exam_start", args=[exam.id]), None, {}),
+            ("take_exam_question GET", "get", reverse("take_exam_question", args=[exam.id, 0]), None, {}),
+            ("take_exam_question POST", "post", reverse("take_exam_question", args=[exam.id, 0]),
+             {"answer": "True", "next": "Next"}, {}),
+            ("take_exam_paper", "get", reverse("take_exam_paper", args=[exam.id]), None, {}),
+            ("sync_answers", "post", reverse("sync_answers", args=[exam.id]),
+             json.dumps({"answers": {str(q.id): q.correct_answer for q in questions}}),
+             {"content_type": "application/json"}),
+            ("submit_exam", "post", reverse("submit_exam", args=[exam.id]), None, {}),
+            ("exam_result", "get", reverse("exam_result", args=[exam.id]), None, {}),
+        ]
+        for name, method, url, data, extra in student_steps:
+            runs[name] = self.capture(self.client, method, url, data, **extra)
+        attempt = StudentExamAttempt.objects.get(student=world["student"], exam=exam)
+        self.client.logout()
+
+        self.client.login(username=world["staff"].username, password=PASSWORD)
+        staff_steps = [
+            ("staff_dashboard", reverse("staff_dashboard")),
+            ("staff_results_overview", reverse("staff_results_overview")),
+            ("staff_exam_results", reverse("staff_exam_results", args=[exam.id])),
+            ("staff_exam_question_stats", reverse("staff_exam_question_stats", args=[exam.id])),
+            ("staff_attempt_detail", reverse("staff_attempt_detail", args=[exam.id, attempt.id])),
+            ("staff_exam_manage", reverse("staff_exam_manage", args=[exam.id])),
+            ("staff_exam_questions_manage", reverse("staff_exam_questions_manage", args=[exam.id])),
+            ("staff_exam_results_export_csv", reverse("staff_exam_results_export_csv", args=[exam.id])),
+            ("staff_exam_answers_export_ndjson", reverse("staff_exam_answers_export_ndjson", args=[exam.id])),
+            ("question_list", reverse("question_list")),
+        ]
+        if numpy is not None:
+            staff_steps.append(("staff_exam_item_analysis", reverse("staff_exam_item_analysis", args=[exam.id])))
+        for name, url in staff_steps:
+            runs[name] = self.capture(self.client, "get", url)
+        self.client.logout()
+        return runs
+
+    def test_query_counts_do_not_grow_with_data(self):
+        small = self.run_views(self.build_world("S", SMALL))
+        large = self.run_views(self.build_world("L", LARGE))
+
+        failures = []
+        for name, queries in large.items():
+            if len(queries) != len(small[name]):
+                diff = difflib.unified_diff(small[name], queries, f"scale {SMALL}", f"scale {LARGE}", lineterm="")
+                failures.append(f"{name}: {len(small[name])} queries at scale {SMALL}, "
+                                f"{len(queries)} at scale {LARGE}\n" + "\n".join(diff))
+            elif len(queries) > BUDGETS[name]:
+                failures.append(f"{name}: {len(queries)} queries, budget is {BUDGETS[name]}\n"
+                                + "\n".join(queries))
+        if failures:
+            self.fail("\n\n".join(failures))
@@ -1,10 +1,26 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import tempfile
+import unittest
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db.models import F
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from datetime import timedelta
 
-from exams.models import Exam, ExamQuestion, StudentExamAttempt, StudentAnswer
+from exams import archive, metrics, results_grid
+from exams.grading import regrade_question
+
+try:
+    import numpy
+except ImportError:  # item analysis is optional
+    numpy = None
+
+from exams.models import ArchivedExam, Exam, ExamQuestion, ExamStats, StudentExamAttempt, StudentAnswer
 from questions.models import Question
 from accounts.models import Module
 
@@ -135,3 +151,254 @@ class StaffExamFlowTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response["Content-Type"], "text/csv")
         self.assertIn(f"exam_{exam.id}_results.csv", response["Content-Disposition"])
+
+    def test_streaming_exports_quote_and_cover_answers(self):
+        self.login_staff()
+        exam = self.create_exam()
+        q = Question.objects.create(question_text="2+2?", question_type="FILL",
+                                    module=self.module, correct_answer="4")
+        ExamQuestion.objects.create(exam=exam, question=q)
+        self.student.first_name, self.student.last_name = "Doe, Jr.", 'The "Kid"'
+        self.student.save()
+        attempt = StudentExamAttempt.objects.create(student=self.student, exam=exam, completed=True, score=100)
+        StudentAnswer.objects.create(attempt=attempt, question=q, selected_answer="4, final", is_correct=True)
+
+        response = self.client.get(reverse("staff_exam_results_export_csv", args=[exam.id]))
+        rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual(rows[0][:3], ["username", "full_name", "score"])
+        self.assertEqual(rows[1][:3], ["CSSS251001", 'Doe, Jr. The "Kid"', "100.00"])
+
+        response = self.client.get(reverse("staff_exam_results_export_ndjson", args=[exam.id]))
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        record = json.loads(b"".join(response.streaming_content).decode().splitlines()[0])
+        self.assertEqual(record["score"], 100.0)
+
+        response = self.client.get(reverse("staff_exam_answers_export_csv", args=[exam.id]))
+        rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual(rows[1], [str(attempt.id), "CSSS251001", str(q.id), "FILL", "4, final", "True"])
+
+        response = self.client.get(reverse("staff_exam_answers_export_ndjson", args=[exam.id]))
+        record = json.loads(b"".join(response.streaming_content).decode())
+        self.assertEqual(record["selected_answer"], "4, final")
+        self.assertIs(record["is_correct"], True)
+
+    def test_regrade_after_answer_key_change(self):
+        exam = self.create_exam()
+        q1 = Question.objects.create(question_text="2+2?", question_type="FILL",
+                                     module=self.module, correct_answer="5")
+        q2 = Question.objects.create(question_text="3+5?", question_type="FILL",
+                                     module=self.module, correct_answer="8")
+        ExamQuestion.objects.create(exam=exam, question=q1)
+        ExamQuestion.objects.create(exam=exam, question=q2)
+        attempt = StudentExamAttempt.objects.create(student=self.student, exam=exam, completed=True, score=50)
+        StudentAnswer.objects.create(attempt=attempt, question=q1, selected_answer="4", is_correct=False)
+        StudentAnswer.objects.create(attempt=attempt, question=q2, selected_answer="8", is_correct=True)
+
+        # key was wrong: 4 is the right answer
+        q1.correct_answer = "4"
+        q1.save()
+        report = regrade_question(q1)
+
+        self.assertEqual(report.answers_changed, 1)
+        self.assertEqual(report.attempts_rescored, 1)
+        attempt.refresh_from_db()
+        self.assertEqual(float(attempt.score), 100.00)
+
+        # nothing left to change on a second run
+        self.assertEqual(regrade_question(q1).answers_changed, 0)
+
+    @unittest.skipIf(numpy is None, "item analysis needs NumPy")
+    def test_item_analysis(self):
+        self.login_staff()
+        exam = self.create_exam()
+        q1 = Question.objects.create(question_text="2+2?", question_type="FILL",
+                                     module=self.module, correct_answer="4")
+        q2 = Question.objects.create(question_text="3+5?", question_type="FILL",
+                                     module=self.module, correct_answer="8")
+        ExamQuestion.objects.create(exam=exam, question=q1)
+        ExamQuestion.objects.create(exam=exam, question=q2)
+        for n, marks in enumerate([(1, 1), (1, 0), (0, 0), (1, 1)]):
+            student = User.objects.create_user(username=f"S{n}", password="x", role="student")
+            attempt = StudentExamAttempt.objects.create(student=student, exam=exam, completed=True)
+            if not any(marks):
+                continue  # submitted blank: both questions count as wrong
+            for q, ok in zip((q1, q2), marks):
+                StudentAnswer.objects.create(attempt=attempt, question=q, selected_answer="x", is_correct=bool(ok))
+
+        response = self.client.get(reverse("staff_exam_item_analysis", args=[exam.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "3+5?")
+        analysis = response.context["analysis"]
+        self.assertEqual(analysis.attempts, 4)
+        self.assertEqual([i.difficulty for i in analysis.items], [0.75, 0.5])
+        self.assertEqual([i.discrimination for i in analysis.items], [1.0, 1.0])
+        self.assertEqual(analysis.cronbach_alpha, 0.727)
+        self.assertEqual(analysis.kr20, 0.727)
+
+    def test_results_grid_keyset_pages_and_sorts(self):
+        self.login_staff()
+        exam = self.create_exam()
+        now = timezone.now()
+        ids = []
+        for n, (score, minutes) in enumerate([(40, 10), (90, 30), (90, 5), (None, None), (70, 61)]):
+            student = User.objects.create_user(username=f"S{n}", password="x", role="student")
+            attempt = StudentExamAttempt.objects.create(
+                student=student, exam=exam, completed=score is not None, score=score,
+                ends_at=now + timedelta(hours=1),
+            )
+            started = now - timedelta(hours=2, minutes=n)
+            submitted = started + timedelta(minutes=minutes) if minutes else None
+            StudentExamAttempt.objects.filter(pk=attempt.pk).update(started_at=started, submitted_at=submitted)
+            ids.append(attempt.pk)
+
+        def walk(**kwargs):
+            seen, page = [], results_grid.results_page(exam, size=2, **kwargs)
+            while True:
+                seen += [r["id"] for r in page["rows"]]
+                if not page["next"]:
+                    return seen, page
+                page = results_grid.results_page(exam, size=2, after=page["next"], **kwargs)
+
+        order, last = walk(sort="score")
+        self.assertEqual(order, [ids[2], ids[1], ids[4], ids[0], ids[3]])  # ties broken by id
+        back = results_grid.results_page(exam, size=2, sort="score", before=last["prev"])
+        self.assertEqual([r["id"] for r in back["rows"]], [ids[4], ids[0]])
+
+        order, _ = walk(sort="time", descending=False, status="completed")
+        self.assertEqual(order, [ids[2], ids[0], ids[1], ids[4]])
+
+        response = self.client.get(reverse("staff_exam_results", args=[exam.id]), {"sort": "time"})
+        self.assertContains(response, "01:01:00")
+        self.assertContains(response, "00:05:00")
+
+        # hours are not cut to two digits
+        StudentExamAttempt.objects.filter(pk=ids[0]).update(
+            submitted_at=F("started_at") + timedelta(hours=101, minutes=2, seconds=3))
+        hms = (StudentExamAttempt.objects.filter(pk=ids[0])
+               .annotate(hms=results_grid.DurationHMS("started_at", "submitted_at"))
+               .values_list("hms", flat=True).get())
+        self.assertEqual(hms, "101:02:03")
+
+    @override_settings(METRICS_SAMPLE_RATE=1.0, METRICS_TOKEN="scrape-me")
+    def test_request_metrics_endpoint(self):
+        cache.clear()
+        metrics.registry.reset()
+        self.login_staff()
+        exam = self.create_exam()
+        self.client.get(reverse("staff_results_overview"))
+        self.client.get(reverse("staff_results_overview"))
+        self.client.get(reverse("staff_exam_results", args=[exam.id]))
+
+        body = self.client.get(reverse("staff_metrics")).content.decode()
+        self.assertIn("# TYPE exam_request_latency_seconds histogram", body)
+        self.assertIn('exam_request_latency_seconds_count{view="staff_results_overview"} 2', body)
+        self.assertIn('exam_db_queries_count{view="staff_exam_results"} 1', body)
+        self.assertIn('exam_template_render_seconds_bucket{view="staff_results_overview",le="+Inf"} 2', body)
+        queries = [line for line in body.splitlines()
+                   if line.startswith('exam_db_queries_sum{view="staff_results_overview"}')]
+        self.assertTrue(queries and float(queries[0].split()[-1]) > 0)
+
+        # students are turned away; a scraper can use the token instead of a session
+        self.client.logout()
+        self.client.login(username="CSSS251001", password="Stu1234!")
+        self.assertRedirects(self.client.get(reverse("staff_metrics")), reverse("login"),
+                             fetch_redirect_response=False)
+        self.client.logout()
+        response = self.client.get(reverse("staff_metrics"), HTTP_AUTHORIZATION="Bearer scrape-me")
+        self.assertEqual(response.status_code, 200)
+
+    def test_purge_attempts_in_batches_by_exam(self):
+        keep, drop = self.create_exam(), self.create_exam()
+        q = Question.objects.create(question_text="2+2?", question_type="FILL", correct_answer="4",
+                                    module=self.module)
+        for exam in (keep, drop):
+            ExamQuestion.objects.create(exam=exam, question=q)
+            for n in range(3):
+                student = User.objects.create_user(username=f"P{exam.id}-{n}", password="x", role="student")
+                attempt = StudentExamAttempt.objects.create(student=student, exam=exam, completed=True, score=100)
+                StudentAnswer.objects.create(attempt=attempt, question=q, selected_answer="4", is_correct=True)
+        # materialize ExamStats for both exams, as a staff visit would
+        self.login_staff()
+        self.client.get(reverse("staff_results_overview"))
+        self.assertEqual(ExamStats.objects.get(exam=drop).attempts_total, 3)
+
+        with self.assertRaises(CommandError):
+            call_command("purge_attempts", stdout=io.StringIO())
+        call_command("purge_attempts", exam_ids=[drop.id], batch_size=2, stdout=io.StringIO())
+
+        self.assertFalse(StudentExamAttempt.objects.filter(exam=drop).exists())
+        self.assertFalse(StudentAnswer.objects.filter(attempt__exam=drop).exists())
+        self.assertEqual(StudentAnswer.objects.filter(attempt__exam=keep).count(), 3)
+        self.assertEqual(ExamStats.objects.get(exam=drop).attempts_total, 0)
+        self.assertEqual(ExamStats.objects.get(exam=keep).attempts_total, 3)
+
+    def test_archive_closed_exam_keeps_results_readable(self):
+        old, current = self.create_exam(), self.create_exam()
+        Exam.objects.filter(pk=old.pk).update(closes_at=timezone.now() - timedelta(days=200))
+        q = Question.objects.create(question_text="2+2?", question_type="FILL", correct_answer="4",
+                                    module=self.module)
+        for exam in (old, current):
+            ExamQuestion.objects.create(exam=exam, question=q)
+            for n in range(3):
+                student = User.objects.create_user(username=f"A{exam.id}-{n}", password="x", role="student")
+                attempt = StudentExamAttempt.objects.create(student=student, exam=exam, completed=True,
+                                                            score=100 if n else 0, submitted_at=timezone.now())
+                StudentAnswer.objects.create(attempt=attempt, question=q, selected_answer="4", is_correct=bool(n))
+
+        with tempfile.TemporaryDirectory() as directory:
+            call_command("archive_exams", before=str(timezone.now().date()), dir=directory, batch_size=2,
+                         stdout=io.StringIO())
+
+            self.assertFalse(Exam.objects.filter(pk=old.pk).exists())
+            self.assertFalse(StudentExamAttempt.objects.filter(exam_id=old.pk).exists())
+            self.assertFalse(StudentAnswer.objects.filter(exam_id=old.pk).exists())
+            self.assertEqual(StudentAnswer.objects.filter(exam=current).count(), 3)
+            archived = ArchivedExam.objects.get(pk=old.pk)
+            self.assertEqual((archived.attempts_completed, archived.answers), (3, 3))
+            kinds = [r["kind"] for r in archive.read_bundle(archived.path)]
+            self.assertEqual(kinds, ["exam", "question"] + ["attempt"] * 3 + ["answer"] * 3)
+
+            # the old results URL now serves the bundle, read-only
+            self.login_staff()
+            response = self.client.get(reverse("staff_exam_results", args=[old.pk]))
+            self.assertContains(response, "Archived")
+            self.assertContains(response, f"A{old.id}-1")
+            self.assertContains(self.client.get(reverse("staff_results_overview")), "Archived Exams")
+
+    def test_archive_rerun_resumes_purge_from_existing_bundle(self):
+        exam = self.create_exam()
+        Exam.objects.filter(pk=exam.pk).update(closes_at=timezone.now() - timedelta(days=200))
+        exam.refresh_from_db()
+        q = Question.objects.create(question_text="2+2?", question_type="FILL", correct_answer="4",
+                                    module=self.module)
+        ExamQuestion.objects.create(exam=exam, question=q)
+        for n in range(3):
+            student = User.objects.create_user(username=f"R{n}", password="x", role="student")
+            attempt = StudentExamAttempt.objects.create(student=student, exam=exam, completed=True,
+                                                        score=100, submitted_at=timezone.now())
+            StudentAnswer.objects.create(attempt=attempt, question=q, selected_answer="4", is_correct=True)
+
+        with tempfile.TemporaryDirectory() as directory:
+            # a first run that wrote the bundle and then stopped part-way through the purge
+            path = archive.bundle_path(exam.pk, directory)
+            counts, sha256 = archive.write_bundle(exam, path)
+            ArchivedExam.objects.create(exam_id=exam.pk, module=self.module, title=exam.title,
+                                        closes_at=exam.closes_at, attempts_total=3, attempts_completed=3,
+                                        answers=counts["answer"], path=str(path), sha256=sha256)
+            StudentExamAttempt.objects.filter(exam=exam).order_by("id").first().delete()
+
+            # a live attempt missing from the bundle stops the re-run before anything is deleted
+            late = StudentExamAttempt.objects.create(student=User.objects.get(username="R0"), exam=exam)
+            with self.assertRaises(CommandError):
+                call_command("archive_exams", before=str(timezone.now().date()), dir=directory,
+                             stdout=io.StringIO())
+            self.assertEqual(StudentExamAttempt.objects.filter(exam=exam).count(), 3)
+            late.delete()
+
+            call_command("archive_exams", before=str(timezone.now().date()), dir=directory, stdout=io.StringIO())
+            self.assertFalse(Exam.objects.filter(pk=exam.pk).exists())
+            # the bundle still holds all three attempts, not just the two left live
+            self.assertEqual(archive.file_sha256(path), sha256)
+            kinds = [r["kind"] for r in archive.read_bundle(path)]
+            self.assertEqual((kinds.count("attempt"), kinds.count("answer")), (3, 3))
+            self.assertEqual(ArchivedExam.objects.get(pk=exam.pk).answers, 3)
@@ -1,10 +1,16 @@
-from django.test import TestCase
+from io import StringIO
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
 from django.utils import timezone
 from datetime import timedelta
 
-from exams.models import Exam, ExamQuestion, StudentExamAttempt, StudentAnswer
+from exams import answer_store, attempt_cache, packed_answers, papers, purge, stats
+from exams.grading import finalize_attempt, regrade_question
+from exams.management.commands.provision_attempts import Command as ProvisionAttempts
+from exams.models import Exam, ExamPaper, ExamQuestion, ExamQuestionStats, ExamStats, StudentExamAttempt, StudentAnswer
 from questions.models import Question
 from accounts.models import Module
 
@@ -13,6 +19,9 @@ User = get_user_model()
 
 class StudentExamFlowTests(TestCase):
     def setUp(self):
+        # Cached attempt state is keyed by ids, which the test DB reuses
+        cache.clear()
+
         # Create module
         self.module = Module.objects.create(code="CS101", name="Intro to CS")
 
@@ -56,6 +65,11 @@ class StudentExamFlowTests(TestCase):
     def login_student(self):
         self.client.login(username="CSSS251001", password="Stu1234!")
 
+    def correct_answer_at(self, index):
+        """Correct answer for the question shown at `index` (order is shuffled per attempt)."""
+        attempt = StudentExamAttempt.objects.get(student=self.student, exam=self.exam)
+        return Question.objects.get(pk=attempt.question_order[index]).correct_answer
+
     def test_full_exam_flow_correct_answers(self):
         """Student takes exam and answers everything correctly."""
         self.login_student()
@@ -66,13 +80,13 @@ class StudentExamFlowTests(TestCase):
         # Q1 → use correct_answer normalized
         self.client.post(
             reverse("take_exam_question", args=[self.exam.id, 0]),
-            {"answer": self.q1.correct_answer.lower(), "next": "Next"}
+            {"answer": self.correct_answer_at(0).lower(), "next": "Next"}
         )
 
         # Q2 → use correct_answer normalized, submit
         response = self.client.post(
             reverse("take_exam_question", args=[self.exam.id, 1]),
-            {"answer": self.q2.correct_answer.lower(), "submit": "Submit"}
+            {"answer": self.correct_answer_at(1).lower(), "submit": "Submit"}
         )
         self.assertRedirects(
             response,
@@ -122,3 +136,450 @@ class StudentExamFlowTests(TestCase):
         attempt = StudentExamAttempt.objects.get(student=self.student, exam=self.exam)
         self.assertTrue(attempt.completed)
         self.assertEqual(float(attempt.score), 0.00)
+
+    def test_question_pages_served_from_attempt_cache(self):
+        """Navigation reads the attempt from cache and issues one write per POST."""
+        self.login_student()
+        self.client.post(reverse("take_exam_start", args=[self.exam.id]))
+
+        # session + user only; exam, attempt and question come from cache
+        with self.assertNumQueries(2):
+            self.client.get(reverse("take_exam_question", args=[self.exam.id, 1]))
+
+        # same reads + exactly one upsert for the answer + one counter UPDATE
+        with self.assertNumQueries(4):
+            self.client.post(
+                reverse("take_exam_question", args=[self.exam.id, 0]),
+                {"answer": "4", "next": "Next"}
+            )
+
+        # previously given answer is prefilled from the cached answer map
+        response = self.client.get(reverse("take_exam_question", args=[self.exam.id, 0]))
+        self.assertEqual(response.context["prefill"], "4")
+
+        # submit drops the cached state
+        self.client.post(reverse("submit_exam", args=[self.exam.id]))
+        self.assertIsNone(cache.get(f"exams:attempt:{self.student.pk}:{self.exam.id}"))
+
+    def test_stale_state_upserts_instead_of_duplicating(self):
+        """Two saves from states that both think the question is unanswered leave one row."""
+        self.login_student()
+        self.client.post(reverse("take_exam_start", args=[self.exam.id]))
+        state = attempt_cache.get_attempt_state(self.student, self.exam)
+        stale = dict(state, answers={})
+        paper = papers.get_paper(state["paper_id"])
+
+        answer_store.save_answers(state, paper, {self.q1.id: "4"})
+        answer_store.save_answers(stale, paper, {self.q1.id: "5"})
+
+        answers = StudentAnswer.objects.filter(attempt_id=state["attempt_id"], question=self.q1)
+        self.assertEqual(answers.count(), 1)
+        self.assertEqual(answers.get().selected_answer, "5")
+        self.assertFalse(answers.get().is_correct)
+
+    def test_question_edit_compiles_new_paper_version(self):
+        """Live attempts keep their paper; the next start gets a new version."""
+        self.login_student()
+        self.client.post(reverse("take_exam_start", args=[self.exam.id]))
+        attempt = StudentExamAttempt.objects.get(student=self.student, exam=self.exam)
+        self.assertEqual(attempt.paper.version, 1)
+
+        self.q1.question_text = "2+2 (edited)?"
+        self.q1.save()
+
+        # the in-progress attempt still renders the text it was started with
+        index = attempt.question_order.index(self.q1.id)
+        response = self.client.get(reverse("take_exam_question", args=[self.exam.id, index]))
+        self.assertContains(response, "2+2?")
+        self.assertNotContains(response, "edited")
+
+        # a fresh start is pinned to the recompiled paper
+        self.client.post(reverse("submit_exam", args=[self.exam.id]))
+        attempt.delete()
+        self.client.post(reverse("take_exam_start", args=[self.exam.id]))
+        attempt = StudentExamAttempt.objects.get(student=self.student, exam=self.exam)
+        self.assertEqual(attempt.paper.version, 2)
+        self.assertEqual(ExamPaper.objects.filter(exam=self.exam).count(), 2)
+
+    def test_single_page_mode_syncs_answers_in_bulk(self):
+        """Single-page exams load once and save batches of answers as JSON."""
+        self.exam.delivery_mode = "single"
+        self.exam.save()
+        self.login_student()
+
+        response = self.client.post(reverse("take_exam_start", args=[self.exam.id]))
+        self.assertRedirects(response, reverse("take_exam_paper", args=[self.exam.id]))
+        response = self.client.get(reverse("take_exam_paper", args=[self.exam.id]))
+        self.assertContains(response, "2+2?")
+        self.assertContains(response, "3+5?")
+
+        sync_url = reverse("sync_answers", args=[self.exam.id])
+        # session + user + one bulk upsert for both answers + one counter UPDATE
+        with self.assertNumQueries(4):
+            response = self.client.post(
+                sync_url, {"answers": {str(self.q1.id): "4", str(self.q2.id): "7"}},
+                content_type="application/json",
+            )
+        self.assertEqual(response.json()["saved"], 2)
+
+        # session + user + one upsert + one counter UPDATE; the unchanged answer is skipped
+        with self.assertNumQueries(4):
+            response = self.client.post(
+                sync_url, {"answers": {str(self.q1.id): "4", str(self.q2.id): "8"}},
+                content_type="application/json",
+            )
+        self.assertEqual(response.json()["saved"], 1)
+
+        attempt = StudentExamAttempt.objects.get(student=self.student, exam=self.exam)
+        answers = dict(StudentAnswer.objects.filter(attempt=attempt).values_list("question_id", "is_correct"))
+        self.assertEqual(answers, {self.q1.id: True, self.q2.id: True})
+
+        # questions outside the paper are rejected
+        response = self.client.post(sync_url, {"answers": {"999999": "x"}}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+        self.client.post(reverse("submit_exam", args=[self.exam.id]))
+        attempt.refresh_from_db()
+        self.assertEqual(float(attempt.score), 100.00)
+
+    @override_settings(EXAM_ANSWER_WRITE_MODE="behind", EXAM_ANSWER_FLUSH_SECONDS=3600)
+    def test_write_behind_buffers_until_flush_or_submit(self):
+        """Buffered answers reach the DB via flush_answer_buffers and on submit."""
+        self.login_student()
+        self.client.post(reverse("take_exam_start", args=[self.exam.id]))
+        attempt = StudentExamAttempt.objects.get(student=self.student, exam=self.exam)
+
+        self.client.post(
+            reverse("take_exam_question", args=[self.exam.id, 0]),
+            {"answer": self.correct_answer_at(0), "next": "Next"}
+        )
+        self.assertFalse(StudentAnswer.objects.filter(attempt=attempt).exists())
+        # still shown to the student from the cached state
+        response = self.client.get(reverse("take_exam_question", args=[self.exam.id, 0]))
+        self.assertEqual(response.context["prefill"], self.correct_answer_at(0))
+
+        # evicted state is rebuilt with the answers still in the buffer
+        attempt_cache.invalidate_attempt(self.student.id, self.exam.id)
+        state = attempt_cache.get_attempt_state(self.student, self.exam)
+        self.assertEqual(state["answers"], {attempt.question_order[0]: self.correct_answer_at(0)})
+
+        # a buffer taken out by a flush that failed is kept and written, older
+        # than the answers saved since
+        self.assertEqual(answer_store._take_buffer(attempt.id)["answers"],
+                         {attempt.question_order[0]: (self.correct_answer_at(0), True)})
+        answer_store.save_answers(state, papers.get_paper(state["paper_id"]),
+                                  {attempt.question_order[0]: "wrong"})
+        self.assertEqual(answer_store.pending_answers(attempt.id), {attempt.question_order[0]: "wrong"})
+        self.assertEqual(answer_store.flush_attempt(attempt.id), 1)
+        self.assertEqual(StudentAnswer.objects.get(attempt=attempt).selected_answer, "wrong")
+        self.assertEqual(answer_store.pending_answers(attempt.id), {})
+        answer_store.save_answers(state, papers.get_paper(state["paper_id"]),
+                                  {attempt.question_order[0]: self.correct_answer_at(0)})
+
+        # recovery / interval path
+        call_command("flush_answer_buffers", stdout=StringIO())
+        self.assertEqual(StudentAnswer.objects.filter(attempt=attempt).count(), 1)
+        self.assertTrue(StudentAnswer.objects.get(attempt=attempt).is_correct)
+
+        # submit flushes synchronously before scoring
+        self.client.post(
+            reverse("take_exam_question", args=[self.exam.id, 1]),
+            {"answer": self.correct_answer_at(1), "submit": "Submit"}
+        )
+        self.assertEqual(StudentAnswer.objects.filter(attempt=attempt).count(), 1)
+        self.client.post(reverse("submit_exam", args=[self.exam.id]))
+        attempt.refresh_from_db()
+        self.assertEqual(StudentAnswer.objects.filter(attempt=attempt).count(), 2)
+        self.assertEqual(float(attempt.score), 100.00)
+
+    def test_dropping_a_module_ends_access_to_its_open_attempt(self):
+        """The enrollment check cached with an attempt follows the student's modules."""
+        self.login_student()
+        self.client.post(reverse("take_exam_start", args=[self.exam.id]))
+        self.assertTrue(attempt_cache.get_attempt_state(self.student, self.exam)["enrolled"])
+
+        self.student.modules.remove(self.module)
+        self.assertFalse(attempt_cache.get_attempt_state(self.student, self.exam)["enrolled"])
+        response = self.client.get(reverse("take_exam_question", args=[self.exam.id, 0]))
+        self.assertNotEqual(response.status_code, 200)
+
+        self.module.students.add(self.student)
+        self.assertTrue(attempt_cache.get_attempt_state(self.student, self.exam)["enrolled"])
+
+    @override_settings(EXAM_ANSWER_WRITE_MODE="behind", EXAM_ANSWER_FLUSH_SECONDS=3600)
+    def test_purging_an_open_attempt_drops_its_buffer_and_state(self):
+        """A purged in-progress attempt leaves nothing behind for a flush or save to write."""
+        self.login_student()
+        self.client.post(reverse("take_exam_start", args=[self.exam.id]))
+        attempt = StudentExamAttempt.objects.get(student=self.student, exam=self.exam)
+        self.client.post(
+            reverse("take_exam_question", args=[self.exam.id, 0]),
+            {"answer": self.correct_answer_at(0), "next": "Next"}
+        )
+        self.assertEqual(len(answer_store.pending_answers(attempt.id)), 1)
+
+        report = purge.purge_attempts(StudentExamAttempt.objects.filter(exam=self.exam))
+        self.assertEqual(report.attempts, 1)
+        self.assertEqual(answer_store.pending_answers(attempt.id), {})
+        self.assertEqual(answer_store.flush_attempt(attempt.id), 0)
+        self.assertIsNone(cache.get(attempt_cache.attempt_key(self.student.id, self.exam.id)))
+        self.assertFalse(StudentAnswer.objects.filter(attempt_id=attempt.id).exists())
+
+    def test_expired_attempts_are_finalized_by_sweeper(self):
+        """Abandoned attempts get scored once their time budget has run out."""
+        self.login_student()
+        self.client.post(reverse("take_exam_start", args=[self.exam.id]))
+        self.client.post(
+            reverse("take_exam_question", args=[self.exam.id, 0]),
+            {"answer": self.correct_answer_at(0), "next": "Next"}
+        )
+        attempt = StudentExamAttempt.objects.get(student=self.student, exam=self.exam)
+
+        # not expired yet -> untouched
+        call_command("finalize_expired_attempts", stdout=StringIO())
+        attempt.refresh_from_db()
+        self.assertFalse(attempt.completed)
+
+        ends_at = timezone.now() - timedelta(minutes=1)
+        StudentExamAttempt.objects.filter(pk=attempt.pk).update(ends_at=ends_at)
+        call_command("finalize_expired_attempts", "--batch-size", "1", stdout=StringIO())
+        attempt.refresh_from_db()
+        self.assertTrue(attempt.completed)
+        self.assertEqual(float(attempt.score), 50.00)
+        self.assertEqual(attempt.submitted_at, ends_at)
+
+    def test_provisioned_attempt_is_stamped_on_start(self):
+        """Dormant attempts get their clock started with a single UPDATE."""
+        call_command("provision_attempts", "--exam", str(self.exam.id), stdout=StringIO())
+        attempt = StudentExamAttempt.objects.get(student=self.student, exam=self.exam)
+        self.assertIsNone(attempt.ends_at)
+        self.assertEqual(sorted(attempt.question_order), sorted([self.q1.id, self.q2.id]))
+
+        # provisioning twice does not duplicate
+        call_command("provision_attempts", "--exam", str(self.exam.id), stdout=StringIO())
+        self.assertEqual(StudentExamAttempt.objects.filter(exam=self.exam).count(), 1)
+
+        self.login_student()
+        # dormant attempts can't be answered before they are started
+        response = self.client.get(reverse("take_exam_question", args=[self.exam.id, 0]))
+        self.assertRedirects(response, reverse("take_exam_start", args=[self.exam.id]),
+                             fetch_redirect_response=False)
+
+        # state is already cached by the visit above: session + user + the stamping
+        # UPDATE + the ExamStats counter bump
+        with self.assertNumQueries(4):
+            response = self.client.post(reverse("take_exam_start", args=[self.exam.id]))
+        self.assertRedirects(response, reverse("take_exam_question", args=[self.exam.id, 0]),
+                             fetch_redirect_response=False)
+        attempt.refresh_from_db()
+        self.assertIsNotNone(attempt.ends_at)
+        self.assertEqual(StudentExamAttempt.objects.filter(exam=self.exam).count(), 1)
+
+        # a provisioning run that looked the student up just before they started
+        # skips them instead of aborting on uniq_open_attempt
+        late = [StudentExamAttempt(student=self.student, exam=self.exam, completed=False)]
+        self.assertEqual(ProvisionAttempts.insert(self.exam, late), 0)
+        self.assertEqual(StudentExamAttempt.objects.filter(exam=self.exam).count(), 1)
+
+    @override_settings(EXAM_QUESTION_ORDER_MODE="seeded")
+    def test_seeded_order_is_reproducible_and_maps_options(self):
+        """Seeded attempts store no order list; MCQ letters are mapped back to the paper's."""
+        mcq = Question.objects.create(
+            question_text="Largest?", question_type="MCQ", module=self.module,
+            option_a="1", option_b="2", option_c="3", option_d="4", correct_answer="d",
+        )
+        ExamQuestion.objects.create(exam=self.exam, question=mcq)
+        self.login_student()
+        self.client.post(reverse("take_exam_start", args=[self.exam.id]))
+
+        attempt = StudentExamAttempt.objects.get(student=self.student, exam=self.exam)
+        self.assertIsNone(attempt.question_order)
+        self.assertIsNotNone(attempt.order_seed)
+        paper = papers.get_paper(attempt.paper_id)
+        order = papers.attempt_question_order(paper, None, attempt.order_seed)
+        self.assertEqual(order, papers.attempt_question_order(paper, None, attempt.order_seed))
+        self.assertEqual(sorted(order), sorted([self.q1.id, self.q2.id, mcq.id]))
+
+        index = order.index(mcq.id)
+        response = self.client.get(reverse("take_exam_question", args=[self.exam.id, index]))
+        shown = next(o["value"] for o in response.context["options"] if o["text"] == "4")
+        self.client.post(reverse("take_exam_question", args=[self.exam.id, index]), {"answer": shown})
+
+        answer = StudentAnswer.objects.get(attempt=attempt, question=mcq)
+        self.assertEqual(answer.selected_answer, "d")
+        self.assertTrue(answer.is_correct)
+        response = self.client.get(reverse("take_exam_question", args=[self.exam.id, index]))
+        self.assertEqual(response.context["prefill"], shown)
+
+    def test_exam_stats_follow_start_submit_and_regrade(self):
+        """ExamStats is updated incrementally instead of re-aggregating attempts."""
+        self.login_student()
+        self.client.post(reverse("take_exam_start", args=[self.exam.id]))
+        # no row yet: the first read computes it from the attempts table
+        self.assertFalse(ExamStats.objects.filter(exam=self.exam).exists())
+        self.assertEqual(stats.get_stats([self.exam.id])[self.exam.id].attempts_total, 1)
+
+        answer_store.save_answers(
+            attempt_cache.get_attempt_state(self.student, self.exam),
+            None, {self.q1.id: "4", self.q2.id: "7"},
+        )
+        stale = StudentExamAttempt.objects.get(student=self.student, exam=self.exam)
+        self.client.post(reverse("submit_exam", args=[self.exam.id]))
+        st = ExamStats.objects.get(exam=self.exam)
+        self.assertEqual((st.attempts_total, st.attempts_completed, st.avg_score), (1, 1, 50.0))
+
+        # a second submit of the same attempt (double click, or racing the sweeper) counts once
+        finalize_attempt(stale)
+        self.assertTrue(stale.completed)
+        st.refresh_from_db()
+        self.assertEqual((st.attempts_completed, st.score_sum), (1, 50.0))
+
+        self.q2.correct_answer = "7"
+        self.q2.save()
+        regrade_question(self.q2)
+        st.refresh_from_db()
+        self.assertEqual(st.avg_score, 100.0)
+        self.assertEqual(st.score_sq_sum, 10000.0)
+
+        call_command("rebuild_exam_stats", "--exam", str(self.exam.id), stdout=StringIO())
+        st.refresh_from_db()
+        self.assertEqual((st.attempts_total, st.attempts_completed, st.avg_score), (1, 1, 100.0))
+
+    @override_settings(EXAM_ANSWER_WRITE_MODE="behind", EXAM_ANSWER_FLUSH_SECONDS=3600)
+    def test_question_counters_follow_answer_changes(self):
+        """Per-question counters move with each save, including buffered ones at flush."""
+        mcq = Question.objects.create(
+            question_text="Largest?", question_type="MCQ", module=self.module,
+            option_a="1", option_b="2", option_c="3", option_d="4", correct_answer="d",
+        )
+        ExamQuestion.objects.create(exam=self.exam, question=mcq)
+        self.login_student()
+        self.client.post(reverse("take_exam_start", args=[self.exam.id]))
+        state = attempt_cache.get_attempt_state(self.student, self.exam)
+        paper = papers.get_paper(state["paper_id"])
+
+        answer_store.save_answers(state, paper, {mcq.id: "a", self.q1.id: "4"})
+        answer_store.save_answers(state, paper, {mcq.id: "d"})
+        row = ExamQuestionStats.objects.get(exam=self.exam, question=mcq)
+        self.assertEqual(row.answered, 0)  # still buffered
+
+        call_command("flush_answer_buffers", stdout=StringIO())
+        row.refresh_from_db()
+        self.assertEqual((row.answered, row.correct, row.pick_a, row.pick_d), (1, 1, 0, 1))
+
+        rows = {r.question_id: r for r in stats.get_question_stats(self.exam.id)}
+        self.assertEqual((rows[self.q1.id].answered, rows[self.q1.id].correct), (1, 1))
+        self.assertEqual(rows[self.q2.id].answered, 0)
+
+        # counters agree with a full recount
+        stats.rebuild_question_stats(self.exam.id)
+        row.refresh_from_db()
+        self.assertEqual((row.answered, row.correct, row.pick_a, row.pick_d), (1, 1, 0, 1))
+
+    def test_question_stats_cover_bulk_linked_questions(self):
+        """Questions linked without post_save still get a stats row when the exam's rows are read."""
+        stats.get_question_stats(self.exam.id)
+        extra = [Question.objects.create(question_text=f"Extra {i}?", question_type="FILL", module=self.module,
+                                         correct_answer=str(i)) for i in range(2)]
+        ExamQuestion.objects.bulk_create([ExamQuestion(exam=self.exam, question=q) for q in extra])
+
+        rows = stats.get_question_stats(self.exam.id)
+        self.assertEqual([r.question_id for r in rows], sorted([self.q1.id, self.q2.id] + [q.id for q in extra]))
+
+    @override_settings(EXAM_ANSWER_STORAGE="packed")
+    def test_packed_storage_keeps_answers_on_the_attempt(self):
+        """Packed attempts store every answer in one column and read back like rows."""
+        mcq = Question.objects.create(
+            question_text="Largest?", question_type="MCQ", module=self.module,
+            option_a="1", option_b="2", option_c="3", option_d="4", correct_answer="d",
+        )
+        ExamQuestion.objects.create(exam=self.exam, question=mcq)
+        self.login_student()
+        self.client.post(reverse("take_exam_start", args=[self.exam.id]))
+        state = attempt_cache.get_attempt_state(self.student, self.exam)
+        paper = papers.get_paper(state["paper_id"])
+
+        answer_store.save_answers(state, paper, {mcq.id: "d", self.q1.id: "4"})
+        answer_store.save_answers(state, paper, {self.q2.id: "seven"})
+        self.assertFalse(StudentAnswer.objects.exists())
+        attempt = StudentExamAttempt.objects.get(student=self.student, exam=self.exam)
+        self.assertEqual(len(attempt.packed_answers["codes"]), 3)
+        self.assertIn("seven", attempt.packed_answers["text"].values())
+
+        # a rebuilt cache state unpacks the saved answers
+        attempt_cache.invalidate_attempt(self.student.id, self.exam.id)
+        state = attempt_cache.get_attempt_state(self.student, self.exam)
+        self.assertTrue(state["packed"])
+        self.assertEqual(state["answers"], {mcq.id: "d", self.q1.id: "4", self.q2.id: "seven"})
+
+        self.client.post(reverse("submit_exam", args=[self.exam.id]))
+        attempt.refresh_from_db()
+        self.assertEqual(float(attempt.score), 66.67)
+        response = self.client.get(reverse("exam_result", args=[self.exam.id]))
+        self.assertContains(response, "seven")
+        self.assertEqual(response.context["correct"], 2)
+
+        # regrading flips the packed flag and rescores
+        self.q2.correct_answer = "Seven"
+        self.q2.save()
+        report = regrade_question(self.q2)
+        self.assertEqual((report.answers_changed, report.attempts_rescored), (1, 1))
+        attempt.refresh_from_db()
+        self.assertEqual(float(attempt.score), 100.00)
+        rows = {r.question_id: r for r in stats.get_question_stats(self.exam.id)}
+        self.assertEqual((rows[mcq.id].answered, rows[mcq.id].pick_d), (1, 1))
+        self.assertEqual(rows[self.q2.id].correct, 1)
+
+    @override_settings(EXAM_ANSWER_STORAGE="packed")
+    def test_regrade_reaches_open_attempts_pinned_to_older_papers(self):
+        """A regrade re-marks attempts by their paper and holds for answers saved after it."""
+        self.login_student()
+        self.client.post(reverse("take_exam_start", args=[self.exam.id]))
+        state = attempt_cache.get_attempt_state(self.student, self.exam)
+        answer_store.save_answers(state, papers.get_paper(state["paper_id"]), {self.q2.id: "seven"})
+        # the question leaves the exam while the attempt is still pinned to a paper with it
+        ExamQuestion.objects.filter(exam=self.exam, question=self.q2).delete()
+
+        self.q2.correct_answer = "Seven"
+        self.q2.save()
+        self.assertEqual(regrade_question(self.q2).answers_changed, 1)
+        attempt = StudentExamAttempt.objects.get(student=self.student, exam=self.exam)
+        paper = papers.get_paper(attempt.paper_id)
+        self.assertEqual(paper["questions"][self.q2.id]["key"], "seven")
+        self.assertEqual(packed_answers.unpack(paper, attempt.packed_answers), {self.q2.id: ("seven", True)})
+
+        # the next save re-packs every answer against the paper's (new) key
+        state = attempt_cache.get_attempt_state(self.student, self.exam)
+        answer_store.save_answers(state, papers.get_paper(state["paper_id"]), {self.q1.id: "4"})
+        attempt.refresh_from_db()
+        self.assertEqual(packed_answers.unpack(paper, attempt.packed_answers), {self.q1.id: ("4", True), self.q2.id: ("seven", True)})
+
+    def test_clock_reads_the_cache_and_forces_submit_at_close(self):
+        # the window outlasts the attempt, so the attempt's own time is the deadline
+        self.exam.closes_at = timezone.now() + timedelta(hours=2)
+        self.exam.save()
+        self.login_student()
+        self.client.post(reverse("take_exam_start", args=[self.exam.id]))
+        response = self.client.get(reverse("take_exam_question", args=[self.exam.id, 0]))
+        clock_url = response.context["clock_url"]
+
+        # a tick needs no session, user or attempt queries while the cache is warm
+        self.client.logout()
+        with self.assertNumQueries(0):
+            reading = self.client.get(clock_url).json()
+        self.assertFalse(reading["submit"])
+        self.assertTrue(3500 < reading["remaining_seconds"] <= 3600)
+        self.assertEqual(reading["deadline"], reading["ends_at"])
+
+        # closing the exam early moves the deadline and tells the page to submit
+        self.exam.closes_at = timezone.now() - timedelta(seconds=1)
+        self.exam.save()
+        reading = self.client.get(clock_url).json()
+        self.assertEqual(reading["deadline"], reading["closes_at"])
+        self.assertEqual(reading["remaining_seconds"], 0)
+        self.assertTrue(reading["submit"])
+
+        # forged or foreign tokens get nothing
+        self.assertEqual(self.client.get(clock_url.replace("/clock/", "/clock/x")).status_code, 403)
+        other = reverse("exam_clock", args=[self.exam.id + 1, clock_url.rstrip("/").rsplit("/", 1)[1]])
+        self.assertEqual(self.client.get(other).status_code, 403)
@@ -19,6 +19,16 @@ urlpatterns = [
     path('results/overview/', views.staff_results_overview_view, name='staff_results_overview'),
     path('exams/<int:exam_id>/', views.staff_exam_results_view, name='staff_exam_results'),
     path('exams/<int:exam_id>/questions/', views.staff_exam_question_stats_view, name='staff_exam_question_stats'),
+    path('exams/<int:exam_id>/item-analysis/', views.staff_exam_item_analysis_view, name='staff_exam_item_analysis'),
     path('exams/<int:exam_id>/attempt/<int:attempt_id>/', views.staff_attempt_detail_view, name='staff_attempt_detail'),
     path('exams/<int:exam_id>/export.csv', views.staff_exam_results_export_csv, name='staff_exam_results_export_csv'),
+    path('exams/<int:exam_id>/export.ndjson', views.staff_exam_export_view,
+         {'dataset': 'results', 'fmt': 'ndjson'}, name='staff_exam_results_export_ndjson'),
+    path('exams/<int:exam_id>/answers.csv', views.staff_exam_export_view,
+         {'dataset': 'answers', 'fmt': 'csv'}, name='staff_exam_answers_export_csv'),
+    path('exams/<int:exam_id>/answers.ndjson', views.staff_exam_export_view,
+         {'dataset': 'answers', 'fmt': 'ndjson'}, name='staff_exam_answers_export_ndjson'),
+
+    # Request metrics (Prometheus text format)
+    path('metrics/', views.staff_metrics_view, name='staff_metrics'),
 ]
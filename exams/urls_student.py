@@ -1,10 +1,19 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, views_async
+
+# the exam-taking pages can be served by their async versions under ASGI
+taking = views_async if settings.EXAM_ASYNC_VIEWS else views
 
 urlpatterns = [
     path('exams/<int:exam_id>/instructions/', views.exam_instructions_view, name='exam_instructions'),
-    path('exams/<int:exam_id>/start/', views.take_exam_start_view, name='take_exam_start'),
-    path('exams/<int:exam_id>/q/<int:question_index>/', views.take_exam_question_view, name='take_exam_question'),
-    path('exams/<int:exam_id>/submit/', views.submit_exam_view, name='submit_exam'),
-    path('exams/<int:exam_id>/result/', views.exam_result_view, name='exam_result'),
+    path('exams/<int:exam_id>/start/', taking.take_exam_start_view, name='take_exam_start'),
+    path('exams/<int:exam_id>/q/<int:question_index>/', taking.take_exam_question_view, name='take_exam_question'),
+    path('exams/<int:exam_id>/paper/', taking.take_exam_paper_view, name='take_exam_paper'),
+    path('exams/<int:exam_id>/sync/', taking.sync_answers_view, name='sync_answers'),
+    path('exams/<int:exam_id>/clock/<str:token>/', views.exam_clock_view, name='exam_clock'),
+    path('exams/<int:exam_id>/clock/<str:token>/stream/', views_async.exam_clock_stream_view,
+         name='exam_clock_stream'),
+    path('exams/<int:exam_id>/submit/', taking.submit_exam_view, name='submit_exam'),
+    path('exams/<int:exam_id>/result/', taking.exam_result_view, name='exam_result'),
 ]
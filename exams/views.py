@@ -4,10 +4,13 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils import timezone
 from .forms import ExamCreationForm, NewQuestionForExamForm
-from .models import Exam, ExamQuestion, StudentExamAttempt, StudentAnswer
-from questions.models import Question
-from django.db.models import Count, Avg, Q, F, ExpressionWrapper, DurationField
-from django.http import HttpResponse
+from .models import ArchivedExam, Exam, ExamQuestion, StudentExamAttempt, StudentAnswer
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_POST
+from accounts import dashboard_cache
+from . import answer_store, archive, attempt_cache, clock, exports, grading, metrics, packed_answers, papers, results_grid, stats
 
 
 # ---------- STAFF VIEWS ----------
@@ -147,34 +150,29 @@ def staff_results_overview_view(request):
     if request.user.role != 'staff':
         return redirect('login')
 
-    exams = (Exam.objects
-             .filter(module=request.user.module)
-             .annotate(
-                 attempts_total=Count('studentexamattempt', distinct=True),
-                 attempts_completed=Count('studentexamattempt', filter=Q(studentexamattempt__completed=True), distinct=True),
-                 avg_score=Avg('studentexamattempt__score'),
-             )
-             .order_by('-created_at'))
+    exams = list(Exam.objects
+                 .filter(module=request.user.module)
+                 .order_by('-created_at'))
+    # totals come from the materialized ExamStats rows (see exams/stats.py)
+    exam_stats = stats.get_stats(e.id for e in exams)
 
-    # Pre-compute completion % safely (no template math needed)
     overview = []
     for e in exams:
-        total = e.attempts_total or 0
-        completed = e.attempts_completed or 0
-        completion_pct = round((completed / total) * 100, 1) if total else None
+        st = exam_stats[e.id]
         overview.append({
             'id': e.id,
             'title': e.title,
             'opens_at': e.opens_at,
             'closes_at': e.closes_at,
             'duration_minutes': e.duration_minutes,
-            'attempts_total': total,
-            'attempts_completed': completed,
-            'completion_pct': completion_pct,
-            'avg_score': round(e.avg_score, 2) if e.avg_score is not None else None,
+            'attempts_total': st.attempts_total,
+            'attempts_completed': st.attempts_completed,
+            'completion_pct': st.completion_pct,
+            'avg_score': st.avg_score,
         })
+    archived = ArchivedExam.objects.filter(module=request.user.module).order_by('-closes_at')
 
-    return render(request, 'exams/staff_overview.html', {'overview': overview})
+    return render(request, 'exams/staff_overview.html', {'overview': overview, 'archived': archived})
 
 
 @login_required
@@ -182,49 +180,61 @@ def staff_exam_results_view(request, exam_id):
     if request.user.role != 'staff':
         return redirect('login')
 
-    exam = get_object_or_404(Exam, pk=exam_id)
+    exam = Exam.objects.filter(pk=exam_id).first()
+    if exam is None:
+        return _archived_exam_results(request, exam_id)
     if exam.module != request.user.module:
         return redirect('staff_dashboard')
 
-    # duration: submitted_at - started_at
-    time_taken = ExpressionWrapper(F('submitted_at') - F('started_at'), output_field=DurationField())
-    attempts = (StudentExamAttempt.objects
-                .filter(exam=exam)
-                .select_related('student')
-                .annotate(time_taken=time_taken)
-                .order_by('-submitted_at', '-started_at'))
-
-    total = attempts.count()
-    completed_qs = attempts.filter(completed=True)
-    completed = completed_qs.count()
-    avg_score = completed_qs.aggregate(Avg('score'))['score__avg']
-    avg_score = round(avg_score, 2) if avg_score is not None else None
-
-    # shape rows for simple template rendering
-    rows = []
-    for a in attempts:
-        # time_taken may be None if in progress
-        tt = None
-        if a.time_taken:
-            total_sec = int(a.time_taken.total_seconds())
-            h, rem = divmod(total_sec, 3600)
-            m, s = divmod(rem, 60)
-            tt = f'{h:02d}:{m:02d}:{s:02d}'
-        rows.append({
-            'id': a.id,
-            'username': a.student.username,
-            'score': float(a.score) if a.completed and a.score is not None else None,
-            'started_at': a.started_at,
-            'submitted_at': a.submitted_at,
-            'time_taken': tt,
-            'status': 'Completed' if a.completed else 'In Progress',
-        })
+    # keyset-paginated grid, see exams/results_grid.py
+    sort = request.GET.get('sort', 'submitted')
+    status = request.GET.get('status', 'all')
+    descending = request.GET.get('dir', 'desc') != 'asc'
+    page = results_grid.results_page(
+        exam, sort=sort, descending=descending, status=status,
+        after=request.GET.get('after'), before=request.GET.get('before'),
+    )
+
+    rows = [{
+        'id': a['id'],
+        'username': a['student__username'],
+        'score': float(a['score']) if a['completed'] and a['score'] is not None else None,
+        'started_at': a['started_at'],
+        'submitted_at': a['submitted_at'],
+        'time_taken': a['time_taken'],
+        'status': 'Completed' if a['completed'] else 'In Progress',
+    } for a in page['rows']]
+
+    # summary header comes from the materialized ExamStats row
+    exam_stats = stats.get_stats([exam.id])[exam.id]
 
     return render(request, 'exams/staff_exam_results.html', {
         'exam': exam,
-        'total': total,
-        'completed': completed,
-        'avg_score': avg_score,
+        'total': exam_stats.attempts_total,
+        'completed': exam_stats.attempts_completed,
+        'avg_score': exam_stats.avg_score,
+        'score_stddev': exam_stats.score_stddev,
+        'attempts': rows,
+        'sort': sort if sort in results_grid.SORTS else 'submitted',
+        'status': status if status in results_grid.STATUS_FILTERS else 'all',
+        'dir': 'desc' if descending else 'asc',
+        'next_cursor': page['next'],
+        'prev_cursor': page['prev'],
+    })
+
+
+def _archived_exam_results(request, exam_id):
+    """Read-only results of an exam moved to cold storage (see exams/archive.py)."""
+    archived = get_object_or_404(ArchivedExam, pk=exam_id)
+    if archived.module_id != request.user.module_id:
+        return redirect('staff_dashboard')
+    try:
+        rows = archive.archived_results(archived)
+    except OSError:
+        rows = None  # bundle moved or unreadable
+
+    return render(request, 'exams/staff_archived_results.html', {
+        'archived': archived,
         'attempts': rows,
     })
 
@@ -238,27 +248,22 @@ def staff_exam_question_stats_view(request, exam_id):
     if exam.module != request.user.module:
         return redirect('staff_dashboard')
 
-    qstats = (ExamQuestion.objects
-              .filter(exam=exam)
-              .select_related('question')
-              .annotate(
-                  attempts_count=Count('question__studentanswer', filter=Q(question__studentanswer__attempt__exam=exam), distinct=True),
-                  correct_count=Count('question__studentanswer', filter=Q(question__studentanswer__attempt__exam=exam,
-                                                                         question__studentanswer__is_correct=True), distinct=True),
-              )
-              .order_by('question__id'))
-
+    # incrementally maintained counters, one indexed read (see exams/stats.py)
     rows = []
-    for idx, row in enumerate(qstats, start=1):
-        attempts_count = row.attempts_count or 0
-        correct_count = row.correct_count or 0
-        pct = round((correct_count / attempts_count) * 100, 1) if attempts_count else None
+    for idx, row in enumerate(stats.get_question_stats(exam.id), start=1):
+        if row.question.question_type == 'MCQ':
+            picks = [('A', row.pick_a), ('B', row.pick_b), ('C', row.pick_c), ('D', row.pick_d)]
+        elif row.question.question_type == 'TF':
+            picks = [('True', row.pick_true), ('False', row.pick_false)]
+        else:
+            picks = []
         rows.append({
             'n': idx,
             'text': row.question.question_text,
-            'attempts': attempts_count,
-            'correct': correct_count,
-            'pct': pct,
+            'attempts': row.answered,
+            'correct': row.correct,
+            'pct': row.correct_pct,
+            'picks': picks,
         })
 
     return render(request, 'exams/staff_exam_question_stats.html', {
@@ -267,6 +272,36 @@ def staff_exam_question_stats_view(request, exam_id):
     })
 
 
+@login_required
+def staff_exam_item_analysis_view(request, exam_id):
+    if request.user.role != 'staff':
+        return redirect('login')
+
+    exam = get_object_or_404(Exam, pk=exam_id)
+    if exam.module != request.user.module:
+        return redirect('staff_dashboard')
+
+    try:
+        # NumPy is only needed for this page
+        from . import item_analysis
+    except ImportError:
+        messages.error(request, "Item analysis needs NumPy (pip install -r requirements-optional.txt).")
+        return redirect('staff_exam_question_stats', exam_id=exam.id)
+
+    analysis = item_analysis.analyze_exam(exam)
+    texts = dict(ExamQuestion.objects.filter(exam=exam).values_list('question_id', 'question__question_text'))
+    rows = [
+        {'n': idx, 'text': texts.get(item.question_id, ''), 'item': item}
+        for idx, item in enumerate(analysis.items, start=1)
+    ]
+
+    return render(request, 'exams/staff_exam_item_analysis.html', {
+        'exam': exam,
+        'analysis': analysis,
+        'rows': rows,
+    })
+
+
 @login_required
 def staff_attempt_detail_view(request, exam_id, attempt_id):
     if request.user.role != 'staff':
@@ -277,10 +312,14 @@ def staff_attempt_detail_view(request, exam_id, attempt_id):
         return redirect('staff_dashboard')
 
     attempt = get_object_or_404(StudentExamAttempt.objects.select_related('student'), pk=attempt_id, exam=exam)
-    answers = (StudentAnswer.objects
-               .filter(attempt=attempt)
-               .select_related('question')
-               .order_by('question__id'))
+    if attempt.packed_answers is not None:
+        # paper order is question id order, like the rows below
+        answers = packed_answers.attempt_answers(attempt)
+    else:
+        answers = (StudentAnswer.objects
+                   .filter(attempt=attempt, exam=exam)
+                   .select_related('question')
+                   .order_by('question__id'))
 
     # simple time taken
     time_str = '-'
@@ -299,7 +338,8 @@ def staff_attempt_detail_view(request, exam_id, attempt_id):
 
 
 @login_required
-def staff_exam_results_export_csv(request, exam_id):
+def staff_exam_export_view(request, exam_id, dataset, fmt):
+    """Streamed download of an exam's results or answers as CSV/NDJSON (see exams/exports.py)."""
     if request.user.role != 'staff':
         return redirect('login')
 
@@ -307,38 +347,42 @@ def staff_exam_results_export_csv(request, exam_id):
     if exam.module != request.user.module:
         return redirect('staff_dashboard')
 
-    attempts = (StudentExamAttempt.objects
-                .filter(exam=exam, completed=True)
-                .select_related('student')
-                .order_by('student__username'))
+    return exports.stream_export(exam, dataset, fmt)
+
+
+def staff_exam_results_export_csv(request, exam_id):
+    return staff_exam_export_view(request, exam_id, 'results', 'csv')
 
-    resp = HttpResponse(content_type='text/csv')
-    resp['Content-Disposition'] = f'attachment; filename="exam_{exam.id}_results.csv"'
-    resp.write('username,full_name,score,started_at,submitted_at,time_taken_secs\n')
 
-    for a in attempts:
-        full_name = f"{a.student.first_name} {a.student.last_name}".strip().replace(',', ' ')
-        secs = ''
-        if a.submitted_at and a.started_at:
-            secs = int((a.submitted_at - a.started_at).total_seconds())
-        score = a.score if a.score is not None else ''
-        resp.write(f"{a.student.username},{full_name},{score},{a.started_at},{a.submitted_at or ''},{secs}\n")
+def staff_metrics_view(request):
+    """Request metrics of all workers in Prometheus text format (see exams/metrics.py)."""
+    # scrapers authenticate with METRICS_TOKEN instead of a staff session
+    token = settings.METRICS_TOKEN
+    if not (token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')):
+        if not request.user.is_authenticated or request.user.role != 'staff':
+            return redirect('login')
 
-    return resp
+    return HttpResponse(metrics.render_text(metrics.collect()),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
 # ---------- STUDENT VIEWS ----------
 
-import random
+import json
 
 @login_required
 def take_exam_start_view(request, exam_id):
     if request.user.role != 'student':
         return redirect('login')
 
-    exam = get_object_or_404(Exam, id=exam_id, is_active=True)
+    exam = attempt_cache.get_active_exam_or_404(exam_id)
+    state = attempt_cache.get_attempt_state(request.user, exam)
 
-    if not request.user.modules.filter(pk=exam.module_id).exists():
+    if state is not None:
+        enrolled = state['enrolled']
+    else:
+        enrolled = request.user.modules.filter(pk=exam.module_id).exists()
+    if not enrolled:
         return redirect('student_dashboard')
 
     # exam must be open in its window
@@ -346,40 +390,84 @@ def take_exam_start_view(request, exam_id):
         messages.error(request, "This exam is not currently open.")
         return redirect('student_dashboard')
 
-    # if already completed, go to result
-    existing_completed = StudentExamAttempt.objects.filter(
-        student=request.user, exam=exam, completed=True
-    ).first()
-    if existing_completed:
-        return redirect('exam_result', exam_id=exam.id)
-
-    # get or create ongoing attempt
-    attempt, created = StudentExamAttempt.objects.get_or_create(
-        student=request.user, exam=exam, completed=False
-    )
-    if created or not attempt.ends_at:
-        attempt.started_at = timezone.now()
-        attempt.ends_at = attempt.started_at + timedelta(minutes=exam.duration_minutes)
+    if state is None:
+        # if already completed, go to result
+        existing_completed = StudentExamAttempt.objects.filter(
+            student=request.user, exam=exam, completed=True
+        ).first()
+        if existing_completed:
+            return redirect('exam_result', exam_id=exam.id)
 
-        # assign random question order once per attempt
-        q_ids = list(Question.objects.filter(examquestion__exam=exam).values_list("id", flat=True))
-        random.shuffle(q_ids)
-        attempt.question_order = q_ids
+        # not pre-provisioned: create the attempt with its paper and random order
+        paper_id = papers.current_paper_id(exam)
+        now = timezone.now()
+        attempt, created = StudentExamAttempt.objects.get_or_create(
+            student=request.user, exam=exam, completed=False,
+            defaults={
+                'paper_id': paper_id,
+                'ends_at': now + timedelta(minutes=exam.duration_minutes),
+                **papers.new_order_fields(paper_id),
+            },
+        )
+        if created:
+            stats.record_started(exam.id)
+        state = attempt_cache.prime_attempt_state(attempt)
 
-        attempt.save()
+    if state['ends_at'] is None:
+        state = start_dormant_attempt(request.user, exam, state)
+        if state is None:
+            return redirect('exam_result', exam_id=exam.id)
 
+    return resume_attempt(exam, state)
+
+
+def start_dormant_attempt(user, exam, state):
+    """Start the clock of a dormant (pre-provisioned) attempt with a single UPDATE.
+
+    Returns the updated state, or None if a concurrent request started and
+    finished the attempt first.
+    """
+    now = timezone.now()
+    fields = {'started_at': now, 'ends_at': now + timedelta(minutes=exam.duration_minutes)}
+    if not state['question_order']:
+        # attempts created before papers existed have no order yet
+        fields['paper_id'] = papers.current_paper_id(exam)
+        fields.update(papers.new_order_fields(fields['paper_id']))
+    stamped = (StudentExamAttempt.objects
+               .filter(pk=state['attempt_id'], ends_at__isnull=True)
+               .update(**fields))
+    if not stamped:
+        # a concurrent request started it first
+        attempt_cache.invalidate_attempt(user.pk, exam.id)
+        return attempt_cache.get_attempt_state(user, exam)
+
+    stats.record_started(exam.id)
+    # update() sends no post_save
+    dashboard_cache.bump_student(user.pk)
+    state['ends_at'] = fields['ends_at']
+    if 'paper_id' in fields:
+        state['paper_id'] = fields['paper_id']
+        state['order_seed'] = fields['order_seed']
+        state['question_order'] = papers.attempt_question_order(
+            papers.get_paper(fields['paper_id']), fields['question_order'], fields['order_seed'])
+    attempt_cache.save_attempt_state(state)
+    return state
+
+
+def resume_attempt(exam, state):
+    """Redirect to where a started attempt continues: its first unanswered question."""
     # if time already over, submit immediately
-    if attempt.is_time_over():
+    if attempt_cache.is_time_over(state):
         return redirect('submit_exam', exam_id=exam.id)
 
-    # jump to first unanswered
-    questions = attempt.question_order or []
+    questions = state['question_order']
     if not questions:
         return redirect('student_dashboard')
 
-    answered_ids = set(
-        StudentAnswer.objects.filter(attempt=attempt).values_list('question_id', flat=True)
-    )
+    if exam.delivery_mode == 'single':
+        return redirect('take_exam_paper', exam_id=exam.id)
+
+    answered_ids = state['answers']
     first_index = 0
     for i, qid in enumerate(questions):
         if qid not in answered_ids:
@@ -409,52 +497,44 @@ def take_exam_question_view(request, exam_id, question_index: int):
     if request.user.role != 'student':
         return redirect('login')
 
-    exam = get_object_or_404(Exam, id=exam_id, is_active=True)
-    if not request.user.modules.filter(pk=exam.module_id).exists():
-        return redirect('student_dashboard')
+    # exam and attempt state come from the cache; see exams/attempt_cache.py
+    exam = attempt_cache.get_active_exam_or_404(exam_id)
 
     # get ongoing attempt
-    attempt = StudentExamAttempt.objects.filter(
-        student=request.user, exam=exam, completed=False
-    ).first()
-    if not attempt:
+    state = attempt_cache.get_attempt_state(request.user, exam)
+    if state is None or state['ends_at'] is None:
+        # never started (or only pre-provisioned): the start view starts the clock
         return redirect('take_exam_start', exam_id=exam.id)
+    if not state['enrolled']:
+        return redirect('student_dashboard')
 
     # hard gates: exam window & time budget
-    if not exam.is_open_now() or attempt.is_time_over():
+    if not exam.is_open_now() or attempt_cache.is_time_over(state):
         return redirect('submit_exam', exam_id=exam.id)
 
     # use stored random question order
-    question_ids = attempt.question_order or []
+    question_ids = state['question_order']
     total = len(question_ids)
     if total == 0:
         return redirect('student_dashboard')
     if question_index < 0 or question_index >= total:
         return redirect('take_exam_question', exam_id=exam.id, question_index=0)
 
-    # fetch current question in that order
+    # current question in that order, rendered from the attempt's compiled paper
     question_id = question_ids[question_index]
-    question = get_object_or_404(Question, id=question_id)
+    paper = papers.get_paper(state['paper_id']) if state['paper_id'] else None
+    question = papers.paper_question(paper, question_id)
+    if question is None:
+        raise Http404("No Question matches the given query.")
 
-    # check if already answered
-    prev = StudentAnswer.objects.filter(attempt=attempt, question=question).first()
-    prefill = prev.selected_answer if prev else ""
+    # check if already answered (MCQ letters as this student sees them)
+    prefill = state['answers'].get(question_id, "")
+    if question['question_type'] == 'MCQ':
+        prefill = papers.to_shown_option(state.get('order_seed'), question_id, prefill)
 
     if request.method == 'POST':
-        if attempt.is_time_over():
-            return redirect('submit_exam', exam_id=exam.id)
-
         selected_answer = (request.POST.get('answer') or "").strip()
-
-        # save/update answer
-        StudentAnswer.objects.update_or_create(
-            attempt=attempt,
-            question=question,
-            defaults={
-                'selected_answer': selected_answer,
-                'is_correct': selected_answer.lower() == question.correct_answer.lower()
-            }
-        )
+        answer_store.save_answers(state, paper, {question_id: selected_answer})
 
         if 'prev' in request.POST:
             return redirect('take_exam_question', exam_id=exam.id, question_index=question_index - 1)
@@ -463,17 +543,118 @@ def take_exam_question_view(request, exam_id, question_index: int):
         if 'submit' in request.POST:
             return redirect('submit_exam', exam_id=exam.id)
 
-    remaining = attempt.remaining_seconds()
+    return render(request, 'exams/take_question.html',
+                  question_page_context(exam, state, question, question_index, prefill))
+
 
-    return render(request, 'exams/take_question.html', {
+def question_page_context(exam, state, question, question_index, prefill):
+    total = len(state['question_order'])
+    return {
         'exam': exam,
         'question': question,
+        'options': papers.mcq_options(question, state.get('order_seed')),
         'question_index': question_index,
         'total_questions': total,
         'prefill': prefill,
         'has_prev': question_index > 0,
         'has_next': question_index < total - 1,
-        'remaining_seconds': remaining or 0,
+        'remaining_seconds': attempt_cache.remaining_seconds(state) or 0,
+        **clock.page_urls(state),
+    }
+
+
+@login_required
+def take_exam_paper_view(request, exam_id):
+    """Single-page delivery: the whole paper loads once and answers autosave via sync_answers_view."""
+    if request.user.role != 'student':
+        return redirect('login')
+
+    exam = attempt_cache.get_active_exam_or_404(exam_id)
+    state = attempt_cache.get_attempt_state(request.user, exam)
+    if state is None or state['ends_at'] is None:
+        # never started (or only pre-provisioned): the start view starts the clock
+        return redirect('take_exam_start', exam_id=exam.id)
+    if not state['enrolled']:
+        return redirect('student_dashboard')
+    if not exam.is_open_now() or attempt_cache.is_time_over(state):
+        return redirect('submit_exam', exam_id=exam.id)
+
+    paper = papers.get_paper(state['paper_id']) if state['paper_id'] else None
+    items = []
+    for qid in state['question_order']:
+        question = papers.paper_question(paper, qid)
+        if question is None:
+            continue
+        prefill = state['answers'].get(qid, "")
+        if question['question_type'] == 'MCQ':
+            prefill = papers.to_shown_option(state.get('order_seed'), qid, prefill)
+        items.append({
+            'question': question,
+            'options': papers.mcq_options(question, state.get('order_seed')),
+            'prefill': prefill,
+            'field_name': f'q-{qid}',
+        })
+    if not items:
+        return redirect('student_dashboard')
+
+    return render(request, 'exams/take_exam_paper.html', {
+        'exam': exam,
+        'items': items,
+        'remaining_seconds': attempt_cache.remaining_seconds(state) or 0,
+        **clock.page_urls(state),
+    })
+
+
+def exam_clock_view(request, exam_id, token):
+    """Server time and the attempt's deadline, from the cache; see exams/clock.py.
+
+    No login check: the signed token in the URL names the attempt, so a
+    poll costs no session or user queries.
+    """
+    ids = clock.read_token(token)
+    if ids is None or ids[1] != exam_id:
+        return JsonResponse({'error': 'Invalid clock link.'}, status=403)
+    exam, state = clock.load(*ids)
+    if exam is None or state is None or state['ends_at'] is None:
+        # submitted (or never started): the page submits and lands on the result
+        return JsonResponse({'error': 'No exam in progress.', 'submit': True}, status=404)
+    response = JsonResponse(clock.reading(exam, state))
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+@login_required
+@require_POST
+def sync_answers_view(request, exam_id):
+    """JSON autosave: {"answers": {"<question_id>": "<answer>", ...}} written in one bulk upsert."""
+    if request.user.role != 'student':
+        return JsonResponse({'error': 'Students only.'}, status=403)
+
+    exam = attempt_cache.get_active_exam_or_404(exam_id)
+    state = attempt_cache.get_attempt_state(request.user, exam)
+    if state is None or state['ends_at'] is None or not state['enrolled']:
+        return JsonResponse({'error': 'No exam in progress.'}, status=404)
+    if not exam.is_open_now() or attempt_cache.is_time_over(state):
+        # client submits the exam when it sees this
+        return JsonResponse({'error': 'Time is over.', 'closed': True}, status=409)
+
+    try:
+        payload = json.loads(request.body)
+        submitted = {int(qid): value for qid, value in payload['answers'].items()}
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return JsonResponse({'error': 'Expected {"answers": {question_id: answer}}.'}, status=400)
+
+    allowed = set(state['question_order'])
+    if not submitted.keys() <= allowed:
+        return JsonResponse({'error': 'Unknown question.'}, status=400)
+
+    paper = papers.get_paper(state['paper_id']) if state['paper_id'] else None
+    saved = answer_store.save_answers(state, paper, submitted)
+
+    return JsonResponse({
+        'saved': saved,
+        'answered': len(state['answers']),
+        'remaining_seconds': attempt_cache.remaining_seconds(state) or 0,
     })
 
 
@@ -482,10 +663,13 @@ def submit_exam_view(request, exam_id):
     if request.user.role != 'student':
         return redirect('login')
 
-    exam = get_object_or_404(Exam, id=exam_id, is_active=True)
+    exam = attempt_cache.get_active_exam_or_404(exam_id)
     attempt = StudentExamAttempt.objects.filter(
         student=request.user, exam=exam, completed=False
     ).first()
+    if attempt and attempt.ends_at is None:
+        # pre-provisioned but never started: nothing to submit yet
+        return redirect('take_exam_start', exam_id=exam.id)
     if not attempt:
         # Already submitted or never started
         completed = StudentExamAttempt.objects.filter(student=request.user, exam=exam, completed=True).first()
@@ -494,15 +678,7 @@ def submit_exam_view(request, exam_id):
         return redirect('student_dashboard')
 
     # finalize scoring
-    answers = StudentAnswer.objects.filter(attempt=attempt)
-    total_q = ExamQuestion.objects.filter(exam=exam).count()
-    correct = answers.filter(is_correct=True).count()
-    score = round((correct / total_q) * 100, 2) if total_q else 0
-
-    attempt.score = score
-    attempt.completed = True
-    attempt.submitted_at = timezone.now()
-    attempt.save()
+    grading.finalize_attempt(attempt)
 
     return redirect('exam_result', exam_id=exam.id)
 
@@ -521,20 +697,34 @@ def exam_result_view(request, exam_id):
         completed=True
     )
 
-    # Fetch all answers
-    answers_qs = (StudentAnswer.objects
-                  .filter(attempt=attempt)
-                  .select_related('question'))
-
-    # If question order was stored, use it; otherwise fallback to ID order
-    if attempt.question_order:
-        answers_map = {a.question.id: a for a in answers_qs}
-        answers = [answers_map[qid] for qid in attempt.question_order if qid in answers_map]
+    if attempt.paper_id:
+        # Render from the compiled paper: no per-question row fetches
+        paper = papers.get_paper(attempt.paper_id)
+        if attempt.packed_answers is not None:
+            answers_map = {a.question_id: a._asdict()
+                           for a in packed_answers.attempt_answers(attempt, paper)}
+        else:
+            answers_map = {
+                row['question_id']: row
+                for row in (StudentAnswer.objects
+                            .filter(attempt=attempt, exam=exam)
+                            .values('question_id', 'selected_answer', 'is_correct'))
+            }
+        answers, total, correct = paper_result_answers(paper, attempt, answers_map)
     else:
-        answers = list(answers_qs.order_by('question__id'))
-
-    total = ExamQuestion.objects.filter(exam=exam).count()
-    correct = sum(1 for a in answers if a.is_correct)
+        # Fetch all answers
+        answers_qs = (StudentAnswer.objects
+                      .filter(attempt=attempt, exam=exam)
+                      .select_related('question'))
+
+        # If question order was stored, use it; otherwise fallback to ID order
+        if attempt.question_order:
+            answers_map = {a.question.id: a for a in answers_qs}
+            answers = [answers_map[qid] for qid in attempt.question_order if qid in answers_map]
+        else:
+            answers = list(answers_qs.order_by('question__id'))
+        total = ExamQuestion.objects.filter(exam=exam).count()
+        correct = sum(1 for a in answers if a.is_correct)
 
     return render(request, 'exams/exam_result.html', {
         'exam': exam,
@@ -543,4 +733,18 @@ def exam_result_view(request, exam_id):
         'total': total,
         'correct': correct,
         'score': attempt.score,
-    })
\ No newline at end of file
+    })
+
+
+def paper_result_answers(paper, attempt, answers_map):
+    """(answers in the order the student saw them, total questions, correct) from the compiled paper."""
+    answers = [
+        {
+            'question': paper['questions'][qid],
+            'selected_answer': answers_map[qid]['selected_answer'],
+            'is_correct': answers_map[qid]['is_correct'],
+        }
+        for qid in papers.attempt_question_order(paper, attempt.question_order, attempt.order_seed)
+        if qid in answers_map and qid in paper['questions']
+    ]
+    return answers, len(paper['questions']), sum(1 for a in answers if a['is_correct'])
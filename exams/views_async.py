@@ -0,0 +1,339 @@
+"""
+Async versions of the student exam-taking views, for serving a sitting
+under ASGI.
+
+With settings.EXAM_ASYNC_VIEWS on, exams/urls_student.py routes the
+exam-taking pages here instead of to exams/views.py; URL names, templates,
+redirects and answer storage are the same. Reads and writes that are plain
+queries use the async ORM (``afirst``, ``aexists``, ``aget_or_create``,
+``async for``). The cache layer (exams/attempt_cache.py), compiled papers,
+answer_store and grading stay synchronous and shared with the sync views;
+each view reaches them in as few ``sync_to_async`` hops as it can, because
+every hop is a thread handoff.
+
+``login_required`` cannot wrap a coroutine on Django 4.2, and touching
+``request.user`` loads the session and user from the database, so each
+view first resolves the user off the event loop with ``_student``.
+"""
+import json
+from datetime import timedelta
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.contrib.auth.views import redirect_to_login
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.shortcuts import redirect, render
+from django.utils import timezone
+from django.utils.log import log_response
+
+from . import answer_store, attempt_cache, clock, grading, packed_answers, papers, stats
+from .models import Exam, ExamQuestion, StudentAnswer, StudentExamAttempt
+from .views import paper_result_answers, question_page_context, resume_attempt, start_dormant_attempt
+
+
+async def _student(request):
+    """The logged-in user, loaded off the event loop; None when anonymous."""
+    def load():
+        user = request.user
+        return user if user.is_authenticated else None
+    return await sync_to_async(load)()
+
+
+def _exam_and_state(user, exam_id):
+    exam = attempt_cache.get_active_exam_or_404(exam_id)
+    return exam, attempt_cache.get_attempt_state(user, exam)
+
+
+def require_POST(view):
+    """django.views.decorators.http.require_POST for coroutine views; Django 4.2's
+    decorator only wraps sync views (it would hand back an unawaited coroutine)."""
+    @wraps(view)
+    async def inner(request, *args, **kwargs):
+        if request.method != 'POST':
+            response = HttpResponseNotAllowed(['POST'])
+            log_response('Method Not Allowed (%s): %s', request.method, request.path,
+                         response=response, request=request)
+            return response
+        return await view(request, *args, **kwargs)
+    return inner
+
+
+def _state_and_paper(user, exam_id, question_ids=()):
+    """(exam, state, paper, {question_id: snapshot}) for the given positions of the
+    attempt's order; snapshots of unpinned attempts come from the database, so
+    they are resolved here, off the event loop."""
+    exam, state = _exam_and_state(user, exam_id)
+    paper = None
+    questions = {}
+    if state is not None:
+        if state['paper_id']:
+            paper = papers.get_paper(state['paper_id'])
+        order = state['question_order']
+        for qid in (order if question_ids is None else [order[i] for i in question_ids if 0 <= i < len(order)]):
+            questions[qid] = papers.paper_question(paper, qid)
+    return exam, state, paper, questions
+
+
+def _create_attempt_fields(exam):
+    paper_id = papers.current_paper_id(exam)
+    return {
+        'paper_id': paper_id,
+        'ends_at': timezone.now() + timedelta(minutes=exam.duration_minutes),
+        **papers.new_order_fields(paper_id),
+    }
+
+
+async def take_exam_start_view(request, exam_id):
+    user = await _student(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+    if user.role != 'student':
+        return redirect('login')
+
+    exam, state = await sync_to_async(_exam_and_state)(user, exam_id)
+
+    if state is not None:
+        enrolled = state['enrolled']
+    else:
+        enrolled = await user.modules.filter(pk=exam.module_id).aexists()
+    if not enrolled:
+        return redirect('student_dashboard')
+
+    # exam must be open in its window
+    if not exam.is_open_now():
+        messages.error(request, "This exam is not currently open.")
+        return redirect('student_dashboard')
+
+    if state is None:
+        # if already completed, go to result
+        if await StudentExamAttempt.objects.filter(student=user, exam=exam, completed=True).aexists():
+            return redirect('exam_result', exam_id=exam.id)
+
+        # not pre-provisioned: create the attempt with its paper and random order
+        defaults = await sync_to_async(_create_attempt_fields)(exam)
+        attempt, created = await StudentExamAttempt.objects.aget_or_create(
+            student=user, exam=exam, completed=False, defaults=defaults,
+        )
+        if created:
+            await sync_to_async(stats.record_started)(exam.id)
+        state = await sync_to_async(attempt_cache.prime_attempt_state)(attempt)
+
+    if state['ends_at'] is None:
+        state = await sync_to_async(start_dormant_attempt)(user, exam, state)
+        if state is None:
+            return redirect('exam_result', exam_id=exam.id)
+
+    return resume_attempt(exam, state)
+
+
+async def take_exam_question_view(request, exam_id, question_index: int):
+    user = await _student(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+    if user.role != 'student':
+        return redirect('login')
+
+    exam, state, paper, questions = await sync_to_async(_state_and_paper)(user, exam_id, [question_index])
+    if state is None or state['ends_at'] is None:
+        # never started (or only pre-provisioned): the start view starts the clock
+        return redirect('take_exam_start', exam_id=exam.id)
+    if not state['enrolled']:
+        return redirect('student_dashboard')
+
+    # hard gates: exam window & time budget
+    if not exam.is_open_now() or attempt_cache.is_time_over(state):
+        return redirect('submit_exam', exam_id=exam.id)
+
+    question_ids = state['question_order']
+    total = len(question_ids)
+    if total == 0:
+        return redirect('student_dashboard')
+    if question_index < 0 or question_index >= total:
+        return redirect('take_exam_question', exam_id=exam.id, question_index=0)
+
+    question_id = question_ids[question_index]
+    question = questions[question_id]
+    if question is None:
+        raise Http404("No Question matches the given query.")
+
+    prefill = state['answers'].get(question_id, "")
+    if question['question_type'] == 'MCQ':
+        prefill = papers.to_shown_option(state.get('order_seed'), question_id, prefill)
+
+    if request.method == 'POST':
+        selected_answer = (request.POST.get('answer') or "").strip()
+        await sync_to_async(answer_store.save_answers)(state, paper, {question_id: selected_answer})
+
+        if 'prev' in request.POST:
+            return redirect('take_exam_question', exam_id=exam.id, question_index=question_index - 1)
+        if 'next' in request.POST:
+            return redirect('take_exam_question', exam_id=exam.id, question_index=question_index + 1)
+        if 'submit' in request.POST:
+            return redirect('submit_exam', exam_id=exam.id)
+
+    return render(request, 'exams/take_question.html',
+                  question_page_context(exam, state, question, question_index, prefill))
+
+
+async def take_exam_paper_view(request, exam_id):
+    """Single-page delivery; see views.take_exam_paper_view."""
+    user = await _student(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+    if user.role != 'student':
+        return redirect('login')
+
+    exam, state, paper, questions = await sync_to_async(_state_and_paper)(user, exam_id, None)
+    if state is None or state['ends_at'] is None:
+        return redirect('take_exam_start', exam_id=exam.id)
+    if not state['enrolled']:
+        return redirect('student_dashboard')
+    if not exam.is_open_now() or attempt_cache.is_time_over(state):
+        return redirect('submit_exam', exam_id=exam.id)
+
+    items = []
+    for qid in state['question_order']:
+        question = questions[qid]
+        if question is None:
+            continue
+        prefill = state['answers'].get(qid, "")
+        if question['question_type'] == 'MCQ':
+            prefill = papers.to_shown_option(state.get('order_seed'), qid, prefill)
+        items.append({
+            'question': question,
+            'options': papers.mcq_options(question, state.get('order_seed')),
+            'prefill': prefill,
+            'field_name': f'q-{qid}',
+        })
+    if not items:
+        return redirect('student_dashboard')
+
+    return render(request, 'exams/take_exam_paper.html', {
+        'exam': exam,
+        'items': items,
+        'remaining_seconds': attempt_cache.remaining_seconds(state) or 0,
+        **clock.page_urls(state),
+    })
+
+
+@require_POST
+async def sync_answers_view(request, exam_id):
+    """JSON autosave; see views.sync_answers_view."""
+    user = await _student(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+    if user.role != 'student':
+        return JsonResponse({'error': 'Students only.'}, status=403)
+
+    exam, state, paper, _ = await sync_to_async(_state_and_paper)(user, exam_id)
+    if state is None or state['ends_at'] is None or not state['enrolled']:
+        return JsonResponse({'error': 'No exam in progress.'}, status=404)
+    if not exam.is_open_now() or attempt_cache.is_time_over(state):
+        return JsonResponse({'error': 'Time is over.', 'closed': True}, status=409)
+
+    try:
+        payload = json.loads(request.body)
+        submitted = {int(qid): value for qid, value in payload['answers'].items()}
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return JsonResponse({'error': 'Expected {"answers": {question_id: answer}}.'}, status=400)
+
+    if not submitted.keys() <= set(state['question_order']):
+        return JsonResponse({'error': 'Unknown question.'}, status=400)
+
+    saved = await sync_to_async(answer_store.save_answers)(state, paper, submitted)
+
+    return JsonResponse({
+        'saved': saved,
+        'answered': len(state['answers']),
+        'remaining_seconds': attempt_cache.remaining_seconds(state) or 0,
+    })
+
+
+async def exam_clock_stream_view(request, exam_id, token):
+    """Server-sent clock events for one attempt; see exams/clock.py."""
+    ids = clock.read_token(token)
+    if ids is None or ids[1] != exam_id:
+        return JsonResponse({'error': 'Invalid clock link.'}, status=403)
+    if not isinstance(request, ASGIRequest):
+        # a WSGI worker would have to buffer the whole stream
+        return JsonResponse({'error': 'Streaming needs an ASGI server; poll the clock instead.'}, status=404)
+    response = StreamingHttpResponse(clock.events(*ids), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-store'
+    # keep nginx from buffering the events
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def submit_exam_view(request, exam_id):
+    user = await _student(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+    if user.role != 'student':
+        return redirect('login')
+
+    exam = await sync_to_async(attempt_cache.get_active_exam_or_404)(exam_id)
+    attempt = await StudentExamAttempt.objects.filter(student=user, exam=exam, completed=False).afirst()
+    if attempt and attempt.ends_at is None:
+        # pre-provisioned but never started: nothing to submit yet
+        return redirect('take_exam_start', exam_id=exam.id)
+    if not attempt:
+        # Already submitted or never started
+        if await StudentExamAttempt.objects.filter(student=user, exam=exam, completed=True).aexists():
+            return redirect('exam_result', exam_id=exam.id)
+        return redirect('student_dashboard')
+
+    await sync_to_async(grading.finalize_attempt)(attempt)
+
+    return redirect('exam_result', exam_id=exam.id)
+
+
+async def exam_result_view(request, exam_id):
+    user = await _student(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+    if user.role != 'student':
+        return redirect('login')
+
+    exam = await Exam.objects.filter(id=exam_id, is_active=True).afirst()
+    if exam is None:
+        raise Http404("No Exam matches the given query.")
+    attempt = await StudentExamAttempt.objects.filter(student=user, exam=exam, completed=True).afirst()
+    if attempt is None:
+        raise Http404("No StudentExamAttempt matches the given query.")
+
+    if attempt.paper_id:
+        # Render from the compiled paper: no per-question row fetches
+        paper = await sync_to_async(papers.get_paper)(attempt.paper_id)
+        if attempt.packed_answers is not None:
+            answers_map = {a.question_id: a._asdict()
+                           for a in packed_answers.attempt_answers(attempt, paper)}
+        else:
+            answers_map = {
+                row['question_id']: row
+                async for row in (StudentAnswer.objects
+                                  .filter(attempt=attempt, exam=exam)
+                                  .values('question_id', 'selected_answer', 'is_correct'))
+            }
+        answers, total, correct = paper_result_answers(paper, attempt, answers_map)
+    else:
+        answers_qs = (StudentAnswer.objects
+                      .filter(attempt=attempt, exam=exam)
+                      .select_related('question'))
+        if attempt.question_order:
+            answers_map = {a.question.id: a async for a in answers_qs}
+            answers = [answers_map[qid] for qid in attempt.question_order if qid in answers_map]
+        else:
+            answers = [a async for a in answers_qs.order_by('question__id')]
+        total = await ExamQuestion.objects.filter(exam=exam).acount()
+        correct = sum(1 for a in answers if a.is_correct)
+
+    return render(request, 'exams/exam_result.html', {
+        'exam': exam,
+        'attempt': attempt,
+        'answers': answers,
+        'total': total,
+        'correct': correct,
+        'score': attempt.score,
+    })
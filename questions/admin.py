@@ -1,4 +1,5 @@
 from django.contrib import admin
+from exams.grading import regrade_question
 from .models import Question
 
 @admin.register(Question)
@@ -6,3 +7,13 @@ class QuestionAdmin(admin.ModelAdmin):
     list_display = ('question_text', 'question_type', 'correct_answer')
     list_filter = ('question_type',)
     search_fields = ('question_text',)
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and 'correct_answer' in form.changed_data:
+            report = regrade_question(obj)
+            self.message_user(
+                request,
+                f"Answer key changed: {report.answers_changed} answers re-marked, "
+                f"{report.attempts_rescored} attempts rescored in {report.seconds}s."
+            )
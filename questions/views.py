@@ -1,5 +1,7 @@
 from django.shortcuts import render, redirect
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from exams.grading import regrade_question
 from .forms import QuestionForm
 from .models import Question
 from django.shortcuts import get_object_or_404
@@ -15,6 +17,13 @@ def edit_question_view(request, question_id):
         form = QuestionForm(request.POST, instance=question)
         if form.is_valid():
             form.save()
+            if 'correct_answer' in form.changed_data:
+                report = regrade_question(question)
+                messages.success(
+                    request,
+                    f"Answer key changed: {report.answers_changed} answers re-marked, "
+                    f"{report.attempts_rescored} attempts rescored in {report.seconds}s."
+                )
             return redirect('question_list')
     else:
         form = QuestionForm(instance=question)